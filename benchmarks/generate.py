@@ -0,0 +1,231 @@
+import os
+import zipfile
+from collections import OrderedDict
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+from elifearticle.article import Article, Contributor, Role
+from tests.helpers import pdf_fixture
+
+# default counts of the parts of a synthetic package
+DEFAULT_SPEC = OrderedDict(
+    [
+        ("figures", 20),
+        ("pdf_figures", 4),
+        ("pdf_pages", 3),
+        ("videos", 2),
+        ("code_files", 4),
+        ("paragraphs", 200),
+        ("sub_articles", 4),
+        ("sub_article_paragraphs", 50),
+        ("sub_article_figures", 5),
+        ("sub_article_tables", 3),
+        ("sub_article_equations", 5),
+        ("file_size", 64 * 1024),
+    ]
+)
+
+ARTICLE_ID = "99999"
+
+ZIP_FILE_NAME = "01-01-2024-RA-eLife-%s" % ARTICLE_ID
+
+# paragraph text which includes some of the assessment terms
+PARAGRAPH_TEXT = (
+    "This is an important study providing convincing evidence, the fundamental "
+    "findings are solid and the methods are incomplete in places."
+)
+
+
+def spec(**counts):
+    "the default spec with counts replaced by any supplied values"
+    package_spec = OrderedDict(DEFAULT_SPEC)
+    for key, value in counts.items():
+        if key not in package_spec:
+            raise KeyError("Unknown benchmark spec key %s" % key)
+        package_spec[key] = value
+    return package_spec
+
+
+def file_bytes(file_size, seed):
+    "file content of file_size bytes which does not compress to nothing"
+    block = bytes((seed * 31 + index * 7) % 251 for index in range(251))
+    return (block * (file_size // len(block) + 1))[:file_size]
+
+
+def manifest_file_xml(file_type, file_name, order, meta=None):
+    "XML of a file tag in the manifest"
+    xml = "<file file-type='%s' id='%s'>" % (file_type, 1000 + order)
+    xml += "<upload_file_nm>%s</upload_file_nm>" % escape(file_name)
+    xml += "<order>%s</order>" % order
+    for meta_name, meta_value in (meta or {}).items():
+        xml += (
+            "<custom-meta><meta-name>%s</meta-name><meta-value>%s</meta-value>"
+            "</custom-meta>" % (escape(meta_name), escape(meta_value))
+        )
+    xml += "</file>"
+    return xml
+
+
+def package_files(package_spec):
+    "list of (file_type, file_name, meta, content) of the files in a package"
+    files = [
+        ("merged_pdf", "%s.pdf" % ZIP_FILE_NAME, None, pdf_fixture(1)),
+        (
+            "art_file",
+            "eLife%s_manuscript.docx" % ARTICLE_ID,
+            None,
+            file_bytes(package_spec["file_size"], 0),
+        ),
+    ]
+    for index in range(1, package_spec["figures"] + 1):
+        meta = OrderedDict([("Figure number", "Figure %s" % index)])
+        if index <= package_spec["pdf_figures"]:
+            files.append(
+                (
+                    "figure",
+                    "eLife%s_figure%s.pdf" % (ARTICLE_ID, index),
+                    meta,
+                    pdf_fixture(package_spec["pdf_pages"]),
+                )
+            )
+        else:
+            files.append(
+                (
+                    "figure",
+                    "eLife%s_figure%s.png" % (ARTICLE_ID, index),
+                    meta,
+                    file_bytes(package_spec["file_size"], index),
+                )
+            )
+    for index in range(1, package_spec["videos"] + 1):
+        files.append(
+            (
+                "video",
+                "Video %s.mp4" % index,
+                OrderedDict([("Title", "Video %s" % index)]),
+                file_bytes(package_spec["file_size"], index),
+            )
+        )
+    for index in range(1, package_spec["code_files"] + 1):
+        files.append(
+            (
+                "aux_file",
+                "Figure 1source code %s.c" % index,
+                OrderedDict([("Title", "Figure 1-source code %s" % index)]),
+                ("int main() { return %s; }\n" % index).encode("utf-8") * 100,
+            )
+        )
+    return files
+
+
+def article_xml(package_spec, files=None):
+    "article XML string with a manifest of the package files"
+    if files is None:
+        files = package_files(package_spec)
+    paragraphs = "".join(
+        "<p>%s %s</p>" % (index, PARAGRAPH_TEXT)
+        for index in range(package_spec["paragraphs"])
+    )
+    manifest = "".join(
+        manifest_file_xml(file_type, file_name, order, meta)
+        for order, (file_type, file_name, meta, content) in enumerate(files, 1)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<!DOCTYPE article PUBLIC "-//NLM//DTD Journal Archiving and Interchange '
+        'DTD v3.0 20080202//EN" "archivearticle3.dtd">'
+        '<article article-type="research-article">'
+        "<front><article-meta>"
+        '<article-id pub-id-type="publisher-id">%s</article-id>'
+        '<article-id pub-id-type="doi">https://doi.org/10.7554/eLife.%s</article-id>'
+        "<article-categories>"
+        '<subj-group subj-group-type="display-channel">'
+        "<subject>Research Article</subject></subj-group>"
+        "</article-categories>"
+        "<title-group><article-title>Synthetic benchmark article</article-title>"
+        "</title-group>"
+        "<files>%s</files>"
+        "</article-meta></front>"
+        "<body>%s</body>"
+        "</article>" % (ARTICLE_ID, ARTICLE_ID, manifest, paragraphs)
+    )
+
+
+def generate_zip(output_dir, package_spec=None):
+    "write a synthetic ejp zip file to output_dir and return its path"
+    if package_spec is None:
+        package_spec = spec()
+    files = package_files(package_spec)
+    zip_file_path = os.path.join(output_dir, "%s.zip" % ZIP_FILE_NAME)
+    with zipfile.ZipFile(zip_file_path, "w", zipfile.ZIP_DEFLATED) as open_zip:
+        open_zip.writestr(
+            "%s/%s.xml" % (ZIP_FILE_NAME, ZIP_FILE_NAME),
+            article_xml(package_spec, files),
+        )
+        for file_type, file_name, meta, content in files:
+            open_zip.writestr("%s/%s" % (ZIP_FILE_NAME, file_name), content)
+    return zip_file_path
+
+
+def sub_article_body_xml(package_spec, sub_article_id="sa1"):
+    "XML of a sub-article body with paragraphs, figures, tables and equations"
+    xml = ""
+    for index in range(package_spec["sub_article_paragraphs"]):
+        xml += "<p>%s %s</p>" % (index, PARAGRAPH_TEXT)
+    graphic_index = 1
+    for index in range(1, package_spec["sub_article_figures"] + 1):
+        xml += (
+            "<p><bold>Review image %s.</bold></p><p>Caption of image %s.</p>"
+            '<p><inline-graphic xlink:href="elife-%s-%s-inf%s.jpg"/></p>'
+            % (index, index, ARTICLE_ID, sub_article_id, graphic_index)
+        )
+        graphic_index += 1
+    for index in range(1, package_spec["sub_article_tables"] + 1):
+        xml += (
+            "<p><bold>Review table %s.</bold></p>"
+            '<p><inline-graphic xlink:href="elife-%s-%s-inf%s.jpg"/></p>'
+            % (index, ARTICLE_ID, sub_article_id, graphic_index)
+        )
+        graphic_index += 1
+    for index in range(1, package_spec["sub_article_equations"] + 1):
+        xml += (
+            "<p>An inline equation"
+            ' <inline-graphic xlink:href="elife-%s-%s-inf%s.jpg"/> in text.</p>'
+            % (ARTICLE_ID, sub_article_id, graphic_index)
+        )
+        graphic_index += 1
+    return "<body>%s</body>" % xml
+
+
+def sub_article_root(package_spec, sub_article_id="sa1"):
+    "a sub-article Element as used by the fig, table and equation transforms"
+    return ElementTree.fromstring(
+        '<sub-article id="%s" article-type="referee-report"'
+        ' xmlns:xlink="http://www.w3.org/1999/xlink">'
+        "<front-stub/>%s</sub-article>"
+        % (sub_article_id, sub_article_body_xml(package_spec, sub_article_id))
+    )
+
+
+def sub_article_data(package_spec):
+    "list of article and xml_root data as passed to sub_article.generate()"
+    data = []
+    for index in range(package_spec["sub_articles"]):
+        sub_article_id = "sa%s" % index
+        article = Article("10.7554/eLife.%s.1.%s" % (ARTICLE_ID, sub_article_id))
+        article.id = sub_article_id
+        if index == 0:
+            article.article_type = "editor-report"
+            article.title = "eLife assessment"
+        else:
+            article.article_type = "referee-report"
+            article.title = "Reviewer #%s (Public Review):" % index
+            reviewer = Contributor("author", None, None)
+            reviewer.roles = [Role("Reviewer", "referee")]
+            reviewer.anonymous = True
+            article.add_contributor(reviewer)
+        xml_root = ElementTree.fromstring(
+            '<root xmlns:xlink="http://www.w3.org/1999/xlink">%s</root>'
+            % sub_article_body_xml(package_spec, sub_article_id)
+        )
+        data.append({"article": article, "xml_root": xml_root})
+    return data
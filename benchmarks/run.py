@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from elifecleaner import (
+    assessment_terms,
+    equation,
+    fig,
+    parse,
+    sub_article,
+    table,
+    transform,
+)
+from benchmarks import generate
+
+
+# number of times each benchmark is run
+REPEAT = 3
+
+# a benchmark is a regression if its median time is this fraction slower than baseline
+THRESHOLD = 0.2
+
+# differences in median time of fewer seconds than this are not a regression
+MIN_DIFFERENCE = 0.001
+
+IDENTIFIER = "benchmark"
+
+
+class Benchmark:
+    "a function to time, setup is called before each run and returns its arguments"
+
+    def __init__(self, name, function, setup=None):
+        self.name = name
+        self.function = function
+        self.setup = setup
+
+    def __repr__(self):
+        return 'Benchmark("%s")' % self.name
+
+    def run(self, repeat=REPEAT):
+        "list of the seconds taken by each run of the function"
+        times = []
+        for index in range(repeat):
+            args = self.setup() if self.setup else ()
+            start_time = time.perf_counter()
+            self.function(*args)
+            times.append(time.perf_counter() - start_time)
+        return times
+
+
+def empty_folder(folder):
+    "delete the folder if it exists and make it again"
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+    return folder
+
+
+def benchmarks(package_spec, work_dir):
+    "list of Benchmark for a synthetic package written to work_dir"
+    zip_file = generate.generate_zip(work_dir, package_spec)
+    tmp_dir = os.path.join(work_dir, "tmp")
+    output_dir = os.path.join(work_dir, "output")
+
+    def zip_setup():
+        return zip_file, empty_folder(tmp_dir)
+
+    def transform_setup():
+        return zip_file, empty_folder(tmp_dir), empty_folder(output_dir)
+
+    def sub_article_root_setup():
+        return generate.sub_article_root(package_spec), IDENTIFIER
+
+    def assessment_terms_setup():
+        root = generate.sub_article_root(package_spec)
+        root.set("article-type", "editor-report")
+        return (root,)
+
+    return [
+        Benchmark("check_ejp_zip", parse.check_ejp_zip, zip_setup),
+        Benchmark("transform_ejp_zip", transform.transform_ejp_zip, transform_setup),
+        Benchmark(
+            "sub_article.generate",
+            sub_article.generate,
+            lambda: (generate.sub_article_data(package_spec),),
+        ),
+        Benchmark(
+            "assessment_terms.add_assessment_terms",
+            assessment_terms.add_assessment_terms,
+            assessment_terms_setup,
+        ),
+        Benchmark("fig.transform_fig", fig.transform_fig, sub_article_root_setup),
+        Benchmark(
+            "table.transform_table", table.transform_table, sub_article_root_setup
+        ),
+        Benchmark(
+            "equation.transform_equations",
+            equation.transform_equations,
+            sub_article_root_setup,
+        ),
+        Benchmark(
+            "equation.transform_inline_equations",
+            equation.transform_inline_equations,
+            sub_article_root_setup,
+        ),
+    ]
+
+
+def run_benchmarks(package_spec=None, repeat=REPEAT, names=None, work_dir=None):
+    """
+    run the benchmarks, or only those in names, on a synthetic package and return
+    a dict of the spec and the timings which can be saved as JSON
+    """
+    if package_spec is None:
+        package_spec = generate.spec()
+    work_dir = tempfile.mkdtemp(prefix="elifecleaner_benchmark_", dir=work_dir)
+    results = OrderedDict()
+    try:
+        for benchmark in benchmarks(package_spec, work_dir):
+            if names and benchmark.name not in names:
+                continue
+            times = benchmark.run(repeat)
+            results[benchmark.name] = OrderedDict(
+                [
+                    ("min", min(times)),
+                    ("median", statistics.median(times)),
+                    ("repeat", repeat),
+                ]
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return OrderedDict(
+        [
+            ("python", platform.python_version()),
+            ("spec", package_spec),
+            ("results", results),
+        ]
+    )
+
+
+def save_baseline(run, file_path):
+    "save the benchmark run as JSON"
+    with open(file_path, "w") as open_file:
+        json.dump(run, open_file, indent=4)
+
+
+def load_baseline(file_path):
+    "load a benchmark run saved as JSON"
+    with open(file_path, "r") as open_file:
+        return json.load(open_file)
+
+
+def compare(run, baseline, threshold=THRESHOLD, min_difference=MIN_DIFFERENCE):
+    """
+    compare the median times of a run to the baseline, return a list of the
+    benchmarks which are more than threshold slower and at least min_difference
+    seconds slower
+    """
+    regressions = []
+    if run.get("spec") != baseline.get("spec"):
+        raise ValueError("Benchmark spec does not match the baseline spec")
+    for name, result in run.get("results").items():
+        baseline_result = baseline.get("results", {}).get(name)
+        if not baseline_result or not baseline_result.get("median"):
+            continue
+        ratio = result.get("median") / baseline_result.get("median")
+        difference = result.get("median") - baseline_result.get("median")
+        if ratio > 1 + threshold and difference >= min_difference:
+            regressions.append(
+                OrderedDict(
+                    [
+                        ("name", name),
+                        ("baseline", baseline_result.get("median")),
+                        ("median", result.get("median")),
+                        ("ratio", round(ratio, 3)),
+                    ]
+                )
+            )
+    return regressions
+
+
+def main(args=None):
+    "command line interface to run the benchmarks and compare them to a baseline"
+    parser = argparse.ArgumentParser(
+        description="Time elifecleaner functions on a synthetic package."
+    )
+    for key, value in generate.DEFAULT_SPEC.items():
+        parser.add_argument("--%s" % key.replace("_", "-"), type=int, default=value)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--benchmark", action="append", help="name to run")
+    parser.add_argument("--save", help="path to save the results as a baseline")
+    parser.add_argument("--compare", help="path of a baseline to compare to")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    arguments = parser.parse_args(args)
+    package_spec = generate.spec(
+        **{key: getattr(arguments, key) for key in generate.DEFAULT_SPEC}
+    )
+    run = run_benchmarks(package_spec, arguments.repeat, arguments.benchmark)
+    for name, result in run.get("results").items():
+        print("%s: median %.4fs, min %.4fs" % (name, result["median"], result["min"]))
+    if arguments.save:
+        save_baseline(run, arguments.save)
+    if arguments.compare:
+        regressions = compare(
+            run, load_baseline(arguments.compare), arguments.threshold
+        )
+        for regression in regressions:
+            print(
+                "regression %s: median %.4fs, baseline %.4fs"
+                % (regression["name"], regression["median"], regression["baseline"])
+            )
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+import argparse
+import contextlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from elifecleaner import LOGGER, memory, parse, transform
+
+# number of zip files to process at the same time, each in its own process
+BATCH_WORKERS = 1
+
+ACTIONS = ["check", "transform"]
+
+
+class WarningCollector(logging.Handler):
+    "logging handler to collect the messages of warnings logged during a job"
+
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def zip_file_list(paths):
+    "list of zip files from a list of zip file paths and folders containing zip files"
+    zip_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            zip_files += [
+                os.path.join(path, file_name)
+                for file_name in sorted(os.listdir(path))
+                if file_name.lower().endswith(".zip")
+            ]
+        else:
+            zip_files.append(path)
+    return zip_files
+
+
+def run_job(
+    zip_file, action="check", output_dir=None, tmp_dir=None, memory_profile=False
+):
+    """
+    check or transform one zip file using its own temporary folder,
+    return a dict of the result, duration and warnings which can be saved as JSON,
+    if memory_profile is True the peak memory of each stage is included
+    """
+    result = OrderedDict()
+    result["zip_file"] = zip_file
+    result["action"] = action
+    result["status"] = "ok"
+    result["result"] = None
+    result["error"] = None
+    job_tmp_dir = tempfile.mkdtemp(prefix="elifecleaner_", dir=tmp_dir)
+    warning_collector = WarningCollector()
+    LOGGER.addHandler(warning_collector)
+    profiler = None
+    start_time = time.monotonic()
+    try:
+        with contextlib.ExitStack() as stack:
+            if memory_profile:
+                profiler = stack.enter_context(memory.profiling())
+            result["result"] = run_action(zip_file, action, output_dir, job_tmp_dir)
+    except Exception as exception:
+        result["status"] = "error"
+        result["error"] = "%s: %s" % (exception.__class__.__name__, exception)
+    finally:
+        result["duration"] = round(time.monotonic() - start_time, 3)
+        LOGGER.removeHandler(warning_collector)
+        shutil.rmtree(job_tmp_dir, ignore_errors=True)
+    result["warnings"] = warning_collector.messages
+    if profiler is not None:
+        result["memory"] = profiler.report()
+    return result
+
+
+def run_action(zip_file, action, output_dir, job_tmp_dir):
+    "check or transform the zip file and return the result"
+    if action == "check":
+        report = parse.check_ejp_zip(zip_file, job_tmp_dir, lazy=True)
+        return [check_result.to_dict() for check_result in report]
+    if action == "transform":
+        # write to folders of the job then move the new zip to the output folder
+        job_unzip_dir = os.path.join(job_tmp_dir, "unzip")
+        job_output_dir = os.path.join(job_tmp_dir, "output")
+        os.mkdir(job_unzip_dir)
+        os.mkdir(job_output_dir)
+        new_zip_file_path = transform.transform_ejp_zip(
+            zip_file, job_unzip_dir, job_output_dir
+        )
+        return shutil.move(
+            new_zip_file_path,
+            os.path.join(output_dir, os.path.basename(new_zip_file_path)),
+        )
+    raise ValueError("Unknown batch action %s" % action)
+
+
+def duplicate_file_names(zip_files):
+    "list of the file names used by more than one of the zip files"
+    file_name_counts = OrderedDict()
+    for zip_file in zip_files:
+        file_name = os.path.basename(zip_file)
+        file_name_counts[file_name] = file_name_counts.get(file_name, 0) + 1
+    return [file_name for file_name, count in file_name_counts.items() if count > 1]
+
+
+def run_batch(
+    zip_files,
+    action="check",
+    output_dir=None,
+    tmp_dir=None,
+    report_file=None,
+    max_workers=None,
+    memory_profile=False,
+):
+    """
+    run the action for each zip file using a pool of max_workers processes, the
+    results are returned in the same order as zip_files and written as JSON lines
+    to report_file if it is specified
+    """
+    if max_workers is None:
+        max_workers = BATCH_WORKERS
+    if action == "transform" and not output_dir:
+        raise ValueError("output_dir is required to transform zip files")
+    if action == "transform" and duplicate_file_names(zip_files):
+        # the transformed zip files are all moved to output_dir by file name
+        raise ValueError(
+            "zip files to transform have the same file names: %s"
+            % ", ".join(duplicate_file_names(zip_files))
+        )
+    job = partial(
+        run_job,
+        action=action,
+        output_dir=output_dir,
+        tmp_dir=tmp_dir,
+        memory_profile=memory_profile,
+    )
+    results = []
+    open_report = open(report_file, "w") if report_file else None
+    try:
+        if max_workers and max_workers > 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                for result in executor.map(job, zip_files):
+                    results.append(write_report_line(result, open_report))
+        else:
+            for result in map(job, zip_files):
+                results.append(write_report_line(result, open_report))
+    finally:
+        if open_report:
+            open_report.close()
+    return results
+
+
+def write_report_line(result, open_report):
+    "write the result to the open report file as a line of JSON"
+    if open_report:
+        open_report.write(json.dumps(result) + "\n")
+        open_report.flush()
+    return result
+
+
+def main(args=None):
+    "command line interface to check or transform a batch of zip files"
+    parser = argparse.ArgumentParser(
+        description="Check or transform a batch of article submission zip files."
+    )
+    parser.add_argument("paths", nargs="+", help="zip files or folders of zip files")
+    parser.add_argument("--action", choices=ACTIONS, default="check")
+    parser.add_argument("--output-dir", help="folder for transformed zip files")
+    parser.add_argument("--tmp-dir", help="folder in which to make job folders")
+    parser.add_argument("--report", help="path of the JSON lines report file")
+    parser.add_argument(
+        "--workers", type=int, default=BATCH_WORKERS, help="number of processes"
+    )
+    parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="report the peak memory of each stage, processing is slower",
+    )
+    arguments = parser.parse_args(args)
+    if arguments.action == "transform" and not arguments.output_dir:
+        parser.error("--output-dir is required to transform zip files")
+    zip_files = zip_file_list(arguments.paths)
+    if arguments.action == "transform" and duplicate_file_names(zip_files):
+        parser.error(
+            "zip files to transform have the same file names: %s"
+            % ", ".join(duplicate_file_names(zip_files))
+        )
+    results = run_batch(
+        zip_files,
+        action=arguments.action,
+        output_dir=arguments.output_dir,
+        tmp_dir=arguments.tmp_dir,
+        report_file=arguments.report,
+        max_workers=arguments.workers,
+        memory_profile=arguments.memory,
+    )
+    error_count = len([result for result in results if result["status"] != "ok"])
+    print(
+        "%s zip files, %s errors, %s warnings"
+        % (
+            len(results),
+            error_count,
+            sum(len(result["warnings"]) for result in results),
+        )
+    )
+    return 1 if error_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from elifecleaner import LOGGER
+
+
+# read files in blocks of this many bytes when calculating a hash
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# scan the cache directory for its size after this many writes, between scans the
+# size is estimated from the writes of this DiskCache
+SCAN_WRITES = 100
+
+
+def file_sha256(file_path):
+    "SHA-256 hex digest of the file contents"
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as open_file:
+        for block in iter(lambda: open_file.read(HASH_BLOCK_SIZE), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def string_sha256(string):
+    "SHA-256 hex digest of the string encoded as UTF-8"
+    return hashlib.sha256(string.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    cache of JSON values saved in a directory as one file per key, when the size of
+    the files exceeds max_size bytes the least recently used entries are deleted
+    """
+
+    def __init__(self, directory, max_size=None):
+        self.directory = directory
+        self.max_size = max_size
+        # estimated size of the directory, None until it is scanned
+        self.size_estimate = None
+        self.writes = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return 'DiskCache("%s", %s)' % (self.directory, self.max_size)
+
+    def entry_path(self, key):
+        "path to the file holding the entry for key, keys are expected to be hex digests"
+        return os.path.join(self.directory, "%s.json" % key)
+
+    def get(self, key):
+        "return the cached value for key, or None if it is not found"
+        entry_path = self.entry_path(key)
+        try:
+            with open(entry_path, "r") as open_file:
+                value = json.load(open_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            LOGGER.exception("Exception reading cache entry %s", entry_path)
+            return None
+        # update the modified time to mark it as recently used
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value):
+        "save the value for key, then evict entries if the cache is too large"
+        os.makedirs(self.directory, exist_ok=True)
+        entry_path = self.entry_path(key)
+        try:
+            old_size = os.path.getsize(entry_path)
+        except OSError:
+            old_size = 0
+        # write to a temporary file first so a partial entry is never read
+        file_handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(file_handle, "w") as open_file:
+                json.dump(value, open_file)
+            new_size = os.path.getsize(temp_path)
+            os.replace(temp_path, entry_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        if self.max_size is None:
+            return
+        with self.lock:
+            self.writes += 1
+            if self.size_estimate is not None:
+                self.size_estimate += new_size - old_size
+            scan = (
+                self.size_estimate is None
+                or self.size_estimate > self.max_size
+                or self.writes % SCAN_WRITES == 0
+            )
+        if scan:
+            self.evict()
+
+    def update(self, key, values):
+        "merge the dict of values into the cached dict for key"
+        entry = self.get(key)
+        if not isinstance(entry, dict):
+            entry = {}
+        entry.update(values)
+        self.set(key, entry)
+
+    def delete(self, key):
+        "remove the entry for key"
+        try:
+            os.remove(self.entry_path(key))
+        except FileNotFoundError:
+            pass
+
+    def entries(self):
+        "list of (modified time, size, path) of cache entries, oldest first"
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for dir_entry in os.scandir(self.directory):
+            if not dir_entry.name.endswith(".json"):
+                continue
+            try:
+                stat = dir_entry.stat()
+            except FileNotFoundError:
+                # deleted by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+        return sorted(entries)
+
+    def size(self):
+        "total size in bytes of the cache entries"
+        return sum(entry[1] for entry in self.entries())
+
+    def evict(self):
+        "delete the least recently used entries until the size is not above max_size"
+        if self.max_size is None:
+            return
+        entries = self.entries()
+        total_size = sum(entry[1] for entry in entries)
+        for modified_time, size, entry_path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+        with self.lock:
+            self.size_estimate = total_size
+
+    def clear(self):
+        "delete all the cache entries"
+        for modified_time, size, entry_path in self.entries():
+            try:
+                os.remove(entry_path)
+            except FileNotFoundError:
+                pass
+        with self.lock:
+            self.size_estimate = None
@@ -0,0 +1,138 @@
+import threading
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+from elifecleaner import trace
+
+
+# number of allocation sites to include in the report
+TOP_ALLOCATION_SITES = 10
+
+# number of frames to store for each allocation, more frames are slower
+TRACEBACK_LIMIT = 1
+
+# spans at this depth or less are stages, depth 0 is the entry point
+STAGE_DEPTH = 1
+
+# allocations by these files are not included in the allocation sites
+IGNORE_FILE_PATTERNS = [
+    tracemalloc.__file__,
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+    "<unknown>",
+]
+
+
+class MemoryProfiler(trace.MemoryRecorder):
+    """
+    recorder of spans which measures the peak memory allocated in each span, a
+    snapshot of allocations is kept from the end of the stage when the most memory
+    is allocated to find the top allocation sites, only spans in the thread which
+    created the profiler are measured, the memory allocated by other threads is
+    included in the peak of the span which is open in that thread
+    """
+
+    def __init__(self, top=TOP_ALLOCATION_SITES, stage_depth=STAGE_DEPTH):
+        super().__init__()
+        self.top = top
+        self.stage_depth = stage_depth
+        self.thread_id = threading.get_ident()
+        self.peak = 0
+        self.snapshot = None
+        self.snapshot_size = 0
+        self.snapshot_stage = None
+
+    def __repr__(self):
+        return "MemoryProfiler(%s spans, peak %s)" % (len(self.spans), self.peak)
+
+    @property
+    def memory(self):
+        "measure memory of spans in the thread which created the profiler"
+        return threading.get_ident() == self.thread_id
+
+    def record(self, span):
+        super().record(span)
+        if span.memory_peak is None:
+            return
+        self.peak = max(self.peak, span.memory_peak)
+        if span.depth <= self.stage_depth:
+            current = tracemalloc.get_traced_memory()[0]
+            if current > self.snapshot_size:
+                self.snapshot = tracemalloc.take_snapshot()
+                self.snapshot_size = current
+                self.snapshot_stage = span.name
+
+    def stages(self):
+        "dict of the number of calls and peak memory in bytes by span name"
+        stages = OrderedDict()
+        for span in self.spans:
+            if span.memory_peak is None:
+                continue
+            if span.name not in stages:
+                stages[span.name] = OrderedDict(
+                    [("calls", 0), ("peak", 0), ("increase", 0)]
+                )
+            stage = stages[span.name]
+            stage["calls"] += 1
+            stage["peak"] = max(stage["peak"], span.memory_peak)
+            stage["increase"] = max(
+                stage["increase"], span.memory_peak - span.memory_start
+            )
+        return stages
+
+    def allocation_sites(self):
+        "list of the top allocation sites in the snapshot, largest first"
+        if self.snapshot is None:
+            return []
+        snapshot = self.snapshot.filter_traces(
+            [
+                tracemalloc.Filter(False, file_pattern)
+                for file_pattern in IGNORE_FILE_PATTERNS
+            ]
+        )
+        allocation_sites = []
+        for statistic in snapshot.statistics("lineno")[: self.top]:
+            frame = statistic.traceback[0]
+            allocation_sites.append(
+                OrderedDict(
+                    [
+                        ("file", frame.filename),
+                        ("line", frame.lineno),
+                        ("size", statistic.size),
+                        ("count", statistic.count),
+                    ]
+                )
+            )
+        return allocation_sites
+
+    def report(self):
+        "the peak memory, peak of each stage and top allocation sites as a dict"
+        return OrderedDict(
+            [
+                ("peak", self.peak),
+                ("stages", self.stages()),
+                ("snapshot_stage", self.snapshot_stage),
+                ("snapshot_size", self.snapshot_size),
+                ("allocation_sites", self.allocation_sites()),
+            ]
+        )
+
+
+@contextmanager
+def profiling(top=TOP_ALLOCATION_SITES, traceback_limit=TRACEBACK_LIMIT):
+    """
+    trace memory allocations of the traced functions called inside the context,
+    tracing slows down the code so it is only done when asked for
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(traceback_limit)
+    trace.reset_peak_memory()
+    profiler = MemoryProfiler(top)
+    try:
+        with trace.recording(profiler):
+            yield profiler
+    finally:
+        profiler.peak = max(profiler.peak, tracemalloc.get_traced_memory()[1])
+        if started:
+            tracemalloc.stop()
@@ -1,17 +1,15 @@
 from io import BytesIO
 import os
 import re
+import time
 from collections import OrderedDict
 from xml.etree import ElementTree
 from xml.parsers.expat import ExpatError
 import html
-from wand.image import Image
-from wand.exceptions import PolicyError, WandRuntimeError
 from elifearticle import parse as articleparse
 from elifetools import xmlio
 from elifetools.utils import escape_ampersand
-from elifecleaner import LOGGER, pdf_utils, utils, zip_lib
-
+from elifecleaner import LOGGER, pdf_utils, trace, utils, zip_lib
 
 # flag for whether to try and repair XML if it encounters a ParseError
 REPAIR_XML = True
@@ -19,120 +17,415 @@ REPAIR_XML = True
 # acceptable file extensions for an art_file
 ART_FILE_EXTENSIONS = ["doc", "docx", "tex"]
 
+# number of figure PDF files to inspect at the same time
+PDF_INSPECTION_WORKERS = 1
+
+# seconds to wait for pdfimages to inspect one figure PDF file, None to wait until done
+PDF_INSPECTION_TIMEOUT = None
+
+# codes of the warnings which can be found when checking the files of a zip
+CHECK_MULTI_PAGE_FIGURE_PDF = "multi_page_figure_pdf"
+CHECK_MISSING_FILE = "missing_file"
+CHECK_EXTRA_FILE = "extra_file"
+CHECK_MISSING_FILE_BY_NAME = "missing_file_by_name"
+CHECK_ART_FILE = "art_file"
+
 
 def article_from_xml(xml_file_path):
     "parse using elifearticle library into an Article object"
     return articleparse.build_article_from_xml(xml_file_path)
 
 
-def check_ejp_zip(zip_file, tmp_dir):
-    "check contents of ejp zip file"
-    asset_file_name_map = zip_lib.unzip_zip(zip_file, tmp_dir)
+def article_and_root_from_xml(xml_file_path):
+    """
+    parse the XML file into an Article object, its error count, and an ElementTree
+    root, elifearticle reads the file itself so the file is parsed twice
+    """
+    article, error_count = article_from_xml(xml_file_path)
+    return article, error_count, parse_article_xml(xml_file_path)
+
+
+class ManifestIndex(list):
+    """
+    list of file details from the manifest, as returned by file_list(), with indexes
+    for finding files by file type, file name, id and custom meta name without
+    scanning the whole list, the indexes are built once and not updated if the list
+    is changed afterwards
+    """
+
+    def __init__(self, files=None):
+        super().__init__(files or [])
+        self.file_type_map = {}
+        self.upload_file_nm_map = {}
+        self.id_map = {}
+        self.meta_name_map = {}
+        self.positions = {}
+        for position, file_data in enumerate(self):
+            if not isinstance(file_data, dict):
+                continue
+            self.positions[id(file_data)] = position
+            self.file_type_map.setdefault(file_data.get("file_type"), []).append(
+                file_data
+            )
+            # keep the first file found for each file name and id
+            if file_data.get("upload_file_nm") is not None:
+                self.upload_file_nm_map.setdefault(
+                    file_data.get("upload_file_nm"), file_data
+                )
+            if file_data.get("id") is not None:
+                self.id_map.setdefault(file_data.get("id"), file_data)
+            meta_names = []
+            for custom_meta in file_data.get("custom_meta") or []:
+                meta_name = custom_meta.get("meta_name")
+                if meta_name and meta_name not in meta_names:
+                    meta_names.append(meta_name)
+                    self.meta_name_map.setdefault(meta_name, []).append(file_data)
+
+    def in_manifest_order(self, file_data_list):
+        "sort the file details into the order they are in the manifest"
+        return sorted(
+            file_data_list, key=lambda file_data: self.positions.get(id(file_data))
+        )
+
+    def by_file_type(self, file_type):
+        "list of files with the file_type"
+        return list(self.file_type_map.get(file_type, []))
+
+    def by_file_types(self, file_types):
+        "list of files with any of the file_types, in manifest order"
+        file_types = list(dict.fromkeys(file_types))
+        if len(file_types) == 1:
+            return self.by_file_type(file_types[0])
+        file_data_list = []
+        for file_type in file_types:
+            file_data_list += self.file_type_map.get(file_type, [])
+        return self.in_manifest_order(file_data_list)
+
+    def by_upload_file_nm(self, upload_file_nm):
+        "the file with the upload_file_nm, or None if not found"
+        return self.upload_file_nm_map.get(upload_file_nm)
+
+    def by_id(self, file_id):
+        "the file with the id, or None if not found"
+        return self.id_map.get(file_id)
+
+    def by_meta_name(self, meta_name):
+        "list of files having a custom meta with the meta_name"
+        return list(self.meta_name_map.get(meta_name, []))
+
+    def upload_file_names(self):
+        "set of the file names in the manifest"
+        return set(self.upload_file_nm_map)
+
+
+def manifest_index(files):
+    "return files as a ManifestIndex, if it is not one already"
+    if isinstance(files, ManifestIndex):
+        return files
+    return ManifestIndex(files)
+
+
+class CheckResult:
+    "a warning found when checking the files of a zip"
+
+    __slots__ = ["code", "identifier", "file_name", "duration", "detail"]
+
+    def __init__(self, code, identifier, file_name=None, duration=None, detail=None):
+        self.code = code
+        self.identifier = identifier
+        self.file_name = file_name
+        # seconds taken by the check which found the warning
+        self.duration = duration
+        # more about the warning, such as the exception which caused it
+        self.detail = detail
+
+    def __repr__(self):
+        return 'CheckResult("%s", "%s", "%s", %s)' % (
+            self.code,
+            self.identifier,
+            self.file_name,
+            self.duration,
+        )
+
+    def __eq__(self, other):
+        if not isinstance(other, CheckResult):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def to_dict(self):
+        "the result as a dict which can be saved as JSON, detail is only added if set"
+        result_dict = OrderedDict(
+            [
+                ("code", self.code),
+                ("identifier", self.identifier),
+                ("file_name", self.file_name),
+                ("duration", self.duration),
+            ]
+        )
+        if self.detail is not None:
+            result_dict["detail"] = self.detail
+        return result_dict
+
+
+class CheckReport:
+    """
+    the CheckResult warnings found by each check of a zip and the seconds taken by
+    each check, a report is always truthy whether or not warnings were found
+    """
+
+    def __init__(self, identifier):
+        self.identifier = identifier
+        self.results = []
+        self.durations = OrderedDict()
+
+    def __repr__(self):
+        return 'CheckReport("%s", %s)' % (self.identifier, self.results)
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+    def __bool__(self):
+        return True
+
+    def run(self, check_name, check_function, *args, **kwargs):
+        "call the check function, add the results it returns and the time it took"
+        start_time = time.monotonic()
+        results = check_function(*args, **kwargs)
+        self.add(check_name, results, time.monotonic() - start_time)
+        return results
+
+    def add(self, check_name, results, duration):
+        "add results of a check and set the duration of each result"
+        duration = round(duration, 6)
+        self.durations[check_name] = duration
+        for result in results:
+            result.duration = duration
+            self.results.append(result)
+
+    def by_code(self, code):
+        "list of results having the warning code"
+        return [result for result in self.results if result.code == code]
+
+    def to_dict(self):
+        "the report as a dict which can be saved as JSON"
+        return OrderedDict(
+            [
+                ("identifier", self.identifier),
+                ("results", [result.to_dict() for result in self.results]),
+                ("durations", self.durations),
+            ]
+        )
+
+
+@trace.traced()
+def check_ejp_zip(zip_file, tmp_dir, lazy=False, log=True):
+    """
+    check contents of ejp zip file and return a CheckReport, all files are extracted
+    to tmp_dir unless lazy is True, then only the article XML and the PDF figures are
+    extracted, the warnings are also logged if log is True
+    """
+    trace.count_file_size(trace.current_span(), "bytes_read", zip_file)
+    if not lazy:
+        asset_file_name_map = zip_lib.unzip_zip(zip_file, tmp_dir)
+        return check_asset_file_name_map(zip_file, asset_file_name_map, log)
+    with zip_lib.LazyZipMap(zip_file, tmp_dir) as asset_file_name_map:
+        return check_asset_file_name_map(zip_file, asset_file_name_map, log)
+
+
+def check_asset_file_name_map(zip_file, asset_file_name_map, log=True):
+    "parse the article XML in the map of zip files and check the files"
     xml_asset = article_xml_asset(asset_file_name_map)
     root = parse_article_xml(xml_asset[1])
     files = file_list(root)
     # use the zip file name as the identifier for log messages
     identifer = zip_file.split(os.sep)[-1]
-    return check_files(files, asset_file_name_map, identifer)
+    return check_files(files, asset_file_name_map, identifer, log)
 
 
-def check_files(files, asset_file_name_map, identifier):
-    figures = figure_list(files, asset_file_name_map)
+@trace.traced()
+def check_files(files, asset_file_name_map, identifier, log=True):
+    """
+    check the files from the manifest and the zip, return a CheckReport of the
+    warnings found, the warnings are also logged if log is True
+    """
+    # index the manifest files and zip files once for all the checks
+    files = manifest_index(files)
+    asset_index = zip_lib.AssetIndex(asset_file_name_map)
+    report = CheckReport(identifier)
+    figures = figure_list(files, asset_file_name_map, asset_index, identifier)
     figures = set_figure_pdf_pages_count(figures)
     # check for multiple page PDF figures
-    check_multi_page_figure_pdf(figures, identifier)
+    report.run(
+        CHECK_MULTI_PAGE_FIGURE_PDF,
+        check_multi_page_figure_pdf,
+        figures,
+        identifier,
+        log=log,
+    )
     # check for missing files
-    check_missing_files(files, asset_file_name_map, identifier)
+    report.run(
+        CHECK_MISSING_FILE,
+        check_missing_files,
+        files,
+        asset_file_name_map,
+        identifier,
+        asset_index,
+        log=log,
+    )
     # check for file not listed in the manifest
-    extra_files = check_extra_files(files, asset_file_name_map, identifier)
+    report.run(
+        CHECK_EXTRA_FILE,
+        check_extra_files,
+        files,
+        asset_file_name_map,
+        identifier,
+        asset_index,
+        log=log,
+    )
     # check for out of sequence files by name
-    check_missing_files_by_name(files, identifier)
+    report.run(
+        CHECK_MISSING_FILE_BY_NAME,
+        check_missing_files_by_name,
+        files,
+        identifier,
+        log=log,
+    )
     # check the art file type
-    check_art_file(files, identifier)
-    return True
+    report.run(CHECK_ART_FILE, check_art_file, files, identifier, log=log)
+    return report
 
 
-def check_multi_page_figure_pdf(figures, identifier):
+def check_multi_page_figure_pdf(
+    figures, identifier, max_workers=None, timeout=None, log=True
+):
+    """
+    check PDF figures having more than one page for images on pages after the first,
+    the PDF files are inspected concurrently by up to max_workers threads, return a
+    list of CheckResult for the multiple page figures
+    """
+    if max_workers is None:
+        max_workers = PDF_INSPECTION_WORKERS
+    if timeout is None:
+        timeout = PDF_INSPECTION_TIMEOUT
     pdfimages_available = pdf_utils.pdfimages_exists()
-    for pdf in [pdf for pdf in figures if pdf.get("pages") and pdf.get("pages") > 1]:
+    multi_page_pdfs = [
+        pdf for pdf in figures if pdf.get("pages") and pdf.get("pages") > 1
+    ]
+    image_pages_futures = []
+    results = []
+    if pdfimages_available:
+        image_pages_futures = pdf_utils.map_pdf_files(
+            pdf_utils.pdf_image_pages,
+            [pdf.get("file_path") for pdf in multi_page_pdfs],
+            max_workers,
+            cache_keys=[pdf.get("cache_key") for pdf in multi_page_pdfs],
+            timeout=timeout,
+        )
+    for index, pdf in enumerate(multi_page_pdfs):
         is_multi_page = False
+        detail = None
         if pdfimages_available:
-            LOGGER.info(
-                "%s using pdfimages to check PDF figure file: %s",
-                identifier,
-                pdf.get("file_name"),
-            )
-            try:
-                image_pages = pdf_utils.pdf_image_pages(pdf.get("file_path"))
+            if log:
                 LOGGER.info(
-                    "%s pdfimages found images on pages %s in PDF figure file: %s",
+                    "%s using pdfimages to check PDF figure file: %s",
                     identifier,
-                    image_pages,
                     pdf.get("file_name"),
                 )
+            try:
+                image_pages = image_pages_futures[index].result()
+                if log:
+                    LOGGER.info(
+                        "%s pdfimages found images on pages %s in PDF figure file: %s",
+                        identifier,
+                        image_pages,
+                        pdf.get("file_name"),
+                    )
                 is_multi_page = bool([page for page in image_pages if page > 1])
-            except:
-                LOGGER.exception(
-                    "%s exception using pdfimages to check PDF figure file: %s",
-                    identifier,
-                    pdf.get("file_name"),
-                )
+            except Exception as exception:
+                if log:
+                    LOGGER.exception(
+                        "%s exception using pdfimages to check PDF figure file: %s",
+                        identifier,
+                        pdf.get("file_name"),
+                    )
                 # consider it multi page in the case pdfimages raises an exception
                 is_multi_page = True
+                detail = "%s: %s" % (exception.__class__.__name__, exception)
         else:
             is_multi_page = True
         if is_multi_page:
-            LOGGER.warning(
-                "%s multiple page PDF figure file: %s",
-                identifier,
-                pdf.get("file_name"),
+            results.append(
+                CheckResult(
+                    CHECK_MULTI_PAGE_FIGURE_PDF,
+                    identifier,
+                    pdf.get("file_name"),
+                    detail=detail,
+                )
             )
+            if log:
+                LOGGER.warning(
+                    "%s multiple page PDF figure file: %s",
+                    identifier,
+                    pdf.get("file_name"),
+                )
+    return results
 
 
-def check_missing_files(files, asset_file_name_map, identifier):
-    "check for missing files and log a warning if missing"
-    missing_files = find_missing_files(files, asset_file_name_map)
+def check_missing_files(
+    files, asset_file_name_map, identifier, asset_index=None, log=True
+):
+    "check for missing files, return a list of CheckResult and log a warning if missing"
+    results = []
+    missing_files = find_missing_files(files, asset_file_name_map, asset_index)
     for missing_file in missing_files:
-        LOGGER.warning(
-            "%s does not contain a file in the manifest: %s",
-            identifier,
-            missing_file,
-        )
+        results.append(CheckResult(CHECK_MISSING_FILE, identifier, missing_file))
+        if log:
+            LOGGER.warning(
+                "%s does not contain a file in the manifest: %s",
+                identifier,
+                missing_file,
+            )
+    return results
 
 
-def find_missing_files(files, asset_file_name_map):
+def find_missing_files(files, asset_file_name_map, asset_index=None):
     "for each file name from the manifest XML file, check for missing files in the zip contents"
     missing_files = []
-    asset_file_name_keys = [
-        asset_file_key.split("/")[-1] for asset_file_key in asset_file_name_map
-    ]
+    asset_file_name_keys = zip_lib.asset_index(
+        asset_file_name_map, asset_index
+    ).zip_file_name_set
     for manifest_file in files:
         if manifest_file.get("upload_file_nm") not in asset_file_name_keys:
             missing_files.append(manifest_file.get("upload_file_nm"))
     return missing_files
 
 
-def check_extra_files(files, asset_file_name_map, identifier):
-    "check for extra files and log them as a warning if present"
-    extra_files = find_extra_files(files, asset_file_name_map)
+def check_extra_files(
+    files, asset_file_name_map, identifier, asset_index=None, log=True
+):
+    "check for extra files, return a list of CheckResult and log them as a warning"
+    results = []
+    extra_files = find_extra_files(files, asset_file_name_map, asset_index)
     for extra_file in extra_files:
-        LOGGER.warning(
-            "%s has file not listed in the manifest: %s", identifier, extra_file
-        )
+        results.append(CheckResult(CHECK_EXTRA_FILE, identifier, extra_file))
+        if log:
+            LOGGER.warning(
+                "%s has file not listed in the manifest: %s", identifier, extra_file
+            )
+    return results
 
 
-def find_extra_files(files, asset_file_name_map):
+def find_extra_files(files, asset_file_name_map, asset_index=None):
     "check if any file names are missing from the manifest XML"
     extra_files = []
 
-    asset_file_name_keys = [
-        asset_file_key.split("/")[-1] for asset_file_key in asset_file_name_map
-    ]
-    manifest_file_names = [
-        manifest_file.get("upload_file_nm")
-        for manifest_file in files
-        if manifest_file.get("upload_file_nm")
-    ]
+    asset_file_name_keys = zip_lib.asset_index(
+        asset_file_name_map, asset_index
+    ).zip_file_names
+    manifest_file_names = manifest_index(files).upload_file_names()
 
     # get the name of the article XML file for later
     xml_asset_file_name = None
@@ -149,15 +442,24 @@ def find_extra_files(files, asset_file_name_map):
     return extra_files
 
 
-def check_missing_files_by_name(files, identifier):
-    "check for files numbered out of sequence and log a warning when found"
+def check_missing_files_by_name(files, identifier, log=True):
+    """
+    check for files numbered out of sequence, return a list of CheckResult and log
+    a warning when found
+    """
+    results = []
     missing_files_by_name = find_missing_files_by_name(files)
     for missing_file in missing_files_by_name:
-        LOGGER.warning(
-            "%s has file missing from expected numeric sequence: %s",
-            identifier,
-            missing_file,
+        results.append(
+            CheckResult(CHECK_MISSING_FILE_BY_NAME, identifier, missing_file)
         )
+        if log:
+            LOGGER.warning(
+                "%s has file missing from expected numeric sequence: %s",
+                identifier,
+                missing_file,
+            )
+    return results
 
 
 def find_missing_files_by_name(files):
@@ -191,9 +493,15 @@ def find_missing_files_by_name(files):
 
 def find_file_detail_values(files, file_types, meta_names):
     file_detail_values = []
-    file_types = list(file_types)
-    for file_data in files:
-        if file_data.get("file_type") in file_types and file_data.get("custom_meta"):
+    files = manifest_index(files)
+    # only files having one of the meta names can match
+    meta_name_file_ids = {
+        id(file_data)
+        for meta_name in meta_names
+        for file_data in files.by_meta_name(meta_name)
+    }
+    for file_data in files.by_file_types(file_types):
+        if id(file_data) in meta_name_file_ids:
             for custom_meta in file_data.get("custom_meta"):
                 if (
                     custom_meta.get("meta_name")
@@ -247,11 +555,13 @@ def find_missing_value_by_sequence(values, match_pattern):
     return missing_files
 
 
-def check_art_file(files, identifier):
-    "check for an art file and it is an acceptable type"
-    art_files = [
-        file_data for file_data in files if file_data.get("file_type") == "art_file"
-    ]
+def check_art_file(files, identifier, log=True):
+    """
+    check for an art file and it is an acceptable type, return a list of
+    CheckResult and log a warning if not
+    """
+    results = []
+    art_files = manifest_index(files).by_file_type("art_file")
     file_extensions = [
         utils.file_extension(file_data.get("upload_file_nm"))
         for file_data in art_files
@@ -264,10 +574,13 @@ def check_art_file(files, identifier):
         if extension.lower() in ART_FILE_EXTENSIONS
     ]
     if not art_files or not good_file_extensions:
-        LOGGER.warning(
-            "%s could not find a word or latex article file in the package",
-            identifier,
-        )
+        results.append(CheckResult(CHECK_ART_FILE, identifier))
+        if log:
+            LOGGER.warning(
+                "%s could not find a word or latex article file in the package",
+                identifier,
+            )
+    return results
 
 
 def article_xml_asset(asset_file_name_map):
@@ -277,56 +590,69 @@ def article_xml_asset(asset_file_name_map):
     """
     if not asset_file_name_map:
         return None
-    xml_asset = None
+    # match on the keys only so a lazy map only extracts the XML file
+    asset_file_name = article_xml_file_name(asset_file_name_map)
+    if asset_file_name is None:
+        return None
+    return (asset_file_name, asset_file_name_map[asset_file_name])
+
+
+def article_xml_file_name(asset_file_names):
+    "find the article XML file name from the zip file names"
     match_pattern = re.compile(r"^(.*)/\1.xml$")
-    for asset in asset_file_name_map.items():
-        if re.match(match_pattern, asset[0]):
-            xml_asset = asset
-            break
-    return xml_asset
-
-
-def parse_article_xml(xml_file):
-    with open(xml_file, "r") as open_file:
-        xml_string = open_file.read()
-        # unescape any HTML entities to avoid undefined entity XML exceptions later
-        xml_string = html_entity_unescape(xml_string)
-        # fix XML-incompatible character entities
-        if utils.match_control_character_entities(xml_string):
-            LOGGER.info(
-                "Replacing character entities in the XML string: %s"
-                % utils.match_control_character_entities(xml_string)
-            )
-            xml_string = utils.replace_control_character_entities(xml_string)
-        # also replace unescaped control characters
-        if utils.match_control_characters(xml_string):
-            LOGGER.info(
-                "Replacing control characters in the XML string (ASCII codes): %s"
-                % [ord(char) for char in utils.match_control_characters(xml_string)]
-            )
-            xml_string = utils.replace_control_characters(xml_string)
+    for asset_file_name in asset_file_names:
+        if re.match(match_pattern, asset_file_name):
+            return asset_file_name
+    return None
 
-        try:
-            return xmlio.parse(
+
+@trace.traced()
+def parse_article_xml(xml_file, xml_string=None):
+    "parse the article XML file, or xml_string if it is supplied, into an ElementTree"
+    span = trace.current_span()
+    if xml_string is None:
+        trace.count_file_size(span, "bytes_read", xml_file)
+        with open(xml_file, "r") as open_file:
+            xml_string = open_file.read()
+    # in one pass, unescape any HTML entities to avoid undefined entity XML
+    # exceptions later, and replace XML-incompatible character entities and
+    # unescaped control characters
+    xml_string, sanitize_result = utils.sanitize_xml_string(xml_string)
+    if sanitize_result.control_character_entities:
+        LOGGER.info(
+            "Replacing character entities in the XML string: %s"
+            % sanitize_result.control_character_entities
+        )
+    if sanitize_result.control_characters:
+        LOGGER.info(
+            "Replacing control characters in the XML string (ASCII codes): %s"
+            % [ord(char) for char in sanitize_result.control_characters]
+        )
+
+    try:
+        root = xmlio.parse(
+            BytesIO(bytes(xml_string, encoding="utf-8")),
+            insert_pis=True,
+            insert_comments=True,
+        )
+    except (ElementTree.ParseError, ExpatError):
+        if REPAIR_XML:
+            # fix ampersands
+            xml_string = escape_ampersand(xml_string)
+            # try to repair the xml namespaces
+            xml_string = repair_article_xml(xml_string)
+
+            root = xmlio.parse(
                 BytesIO(bytes(xml_string, encoding="utf-8")),
                 insert_pis=True,
                 insert_comments=True,
             )
-        except (ElementTree.ParseError, ExpatError):
-            if REPAIR_XML:
-                # fix ampersands
-                xml_string = escape_ampersand(xml_string)
-                # try to repair the xml namespaces
-                xml_string = repair_article_xml(xml_string)
-
-                return xmlio.parse(
-                    BytesIO(bytes(xml_string, encoding="utf-8")),
-                    insert_pis=True,
-                    insert_comments=True,
-                )
-            else:
-                LOGGER.exception("ParseError raised because REPAIR_XML flag is False")
-                raise
+        else:
+            LOGGER.exception("ParseError raised because REPAIR_XML flag is False")
+            raise
+    if span.recording:
+        span.count("elements", sum(1 for element in root.iter()))
+    return root
 
 
 def replace_entity(match):
@@ -382,6 +708,23 @@ def xml_journal_title(root):
     return title
 
 
+def xml_article_type(root):
+    "parse the article-type attribute of the article tag from the XML ElementTree"
+    for article_tag in root.iter("article"):
+        return article_tag.get("article-type")
+    return None
+
+
+def xml_display_channel(root):
+    "parse the display-channel subject values from the XML ElementTree"
+    return [
+        "".join(subject_tag.itertext())
+        for subject_tag in root.findall(
+            './/subj-group[@subj-group-type="display-channel"]/subject'
+        )
+    ]
+
+
 def xml_publisher_name(root):
     "parse the publisher name from the XML ElementTree"
     name = None
@@ -429,33 +772,55 @@ def file_list(root):
     return file_list
 
 
-def figure_list(files, asset_file_name_map):
+def figure_list(files, asset_file_name_map, asset_index=None, identifier=None):
     "identify which files are a figure and collect some data about them"
     figures = []
+    asset_index = zip_lib.asset_index(asset_file_name_map, asset_index)
 
-    figure_files = [
-        file_data for file_data in files if file_data.get("file_type") == "figure"
-    ]
+    figure_files = manifest_index(files).by_file_type("figure")
 
     for file_data in figure_files:
         figure_detail = OrderedDict()
         figure_detail["upload_file_nm"] = file_data.get("upload_file_nm")
         figure_detail["extension"] = file_extension(file_data.get("upload_file_nm"))
-        # collect file name data
-        for asset_file_name in asset_file_name_map.items():
-            if asset_file_name[1].endswith(file_data.get("upload_file_nm")):
-                figure_detail["file_name"] = asset_file_name[0]
-                figure_detail["file_path"] = asset_file_name[1]
-                break
+        # collect file name data, only a PDF is extracted from a lazy map
+        file_name, file_path = asset_index.find(
+            file_data.get("upload_file_nm"),
+            identifier,
+            extract=figure_detail["extension"] == "pdf",
+        )
+        if file_name is not None:
+            figure_detail["file_name"] = file_name
+            figure_detail["file_path"] = file_path
         figures.append(figure_detail)
     return figures
 
 
-def set_figure_pdf_pages_count(figure_assets):
+def set_figure_pdf_pages_count(figure_assets, max_workers=None):
     "for the pdf files count the number of pages and set the property"
-    for figure_detail in figure_assets:
-        if figure_detail["extension"] == "pdf":
-            figure_detail["pages"] = pdf_page_count(figure_detail.get("file_path"))
+    if max_workers is None:
+        max_workers = PDF_INSPECTION_WORKERS
+    pdf_figures = [
+        figure_detail
+        for figure_detail in figure_assets
+        if figure_detail["extension"] == "pdf"
+    ]
+    key_futures = pdf_utils.map_pdf_files(
+        pdf_utils.pdf_cache_key,
+        [figure_detail.get("file_path") for figure_detail in pdf_figures],
+        max_workers,
+    )
+    # hash each PDF once, the key is used again when the PDF images are checked
+    for figure_detail, key_future in zip(pdf_figures, key_futures):
+        figure_detail["cache_key"] = key_future.result()
+    pages_futures = pdf_utils.map_pdf_files(
+        pdf_page_count,
+        [figure_detail.get("file_path") for figure_detail in pdf_figures],
+        max_workers,
+        cache_keys=[figure_detail.get("cache_key") for figure_detail in pdf_figures],
+    )
+    for figure_detail, pages_future in zip(pdf_figures, pages_futures):
+        figure_detail["pages"] = pages_future.result()
     return figure_assets
 
 
@@ -463,24 +828,48 @@ def file_extension(file_name):
     return file_name.split(".")[-1].lower() if file_name and "." in file_name else None
 
 
-def pdf_page_count(file_path):
-    "open PDF as an image and count the number of pages"
+@trace.traced()
+def pdf_page_count(file_path, cache_key=None):
+    """
+    count the number of pages by parsing the PDF, or if it cannot be parsed
+    open the PDF as an image and count the number of pages, cache_key is the
+    pdf_utils.pdf_cache_key() of the file if it is already known
+    """
     if file_path:
+        if cache_key is None:
+            cache_key = pdf_utils.pdf_cache_key(file_path)
+        page_count = pdf_utils.pdf_cache_get(cache_key, "pages")
+        if page_count is not None:
+            return page_count
         try:
-            with Image(filename=file_path) as img:
-                return len(img.sequence)
-        except WandRuntimeError:
-            LOGGER.exception(
-                "WandRuntimeError in pdf_page_count(), "
-                "imagemagick may not be installed"
-            )
-            raise
-        except PolicyError:
-            LOGGER.exception(
-                "PolicyError in pdf_page_count(), "
-                "imagemagick policy.xml may not allow reading PDF files"
+            page_count = pdf_utils.pdf_page_count(file_path)
+        except ValueError as exception:
+            LOGGER.info(
+                "Unable to parse PDF page count, opening it as an image instead: %s",
+                str(exception),
             )
-            raise
+        if page_count is None:
+            # import wand only when it is needed, it requires imagemagick to be installed
+            from wand.image import Image
+            from wand.exceptions import PolicyError, WandRuntimeError
+
+            try:
+                with Image(filename=file_path) as img:
+                    page_count = len(img.sequence)
+            except WandRuntimeError:
+                LOGGER.exception(
+                    "WandRuntimeError in pdf_page_count(), "
+                    "imagemagick may not be installed"
+                )
+                raise
+            except PolicyError:
+                LOGGER.exception(
+                    "PolicyError in pdf_page_count(), "
+                    "imagemagick policy.xml may not allow reading PDF files"
+                )
+                raise
+        pdf_utils.pdf_cache_set(cache_key, "pages", page_count)
+        return page_count
     return None
 
 
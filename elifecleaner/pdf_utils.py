@@ -1,6 +1,56 @@
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import mmap
 import re
 import shutil
 import subprocess
+import threading
+import zlib
+from elifecleaner import disk_cache, trace
+
+
+# directory for caching PDF inspection results by file content hash, None to disable
+PDF_CACHE_DIR = None
+# maximum size in bytes of the PDF cache directory
+PDF_CACHE_MAX_SIZE = 16 * 1024 * 1024
+
+# DiskCache instances by directory and maximum size, shared by all the threads
+PDF_CACHES = {}
+PDF_CACHES_LOCK = threading.Lock()
+
+
+def pdf_cache():
+    "DiskCache for PDF inspection results, or None if caching is disabled"
+    if not PDF_CACHE_DIR:
+        return None
+    with PDF_CACHES_LOCK:
+        cache_settings = (PDF_CACHE_DIR, PDF_CACHE_MAX_SIZE)
+        if cache_settings not in PDF_CACHES:
+            PDF_CACHES[cache_settings] = disk_cache.DiskCache(*cache_settings)
+        return PDF_CACHES[cache_settings]
+
+
+def pdf_cache_key(pdf):
+    "key for caching results about the PDF file, or None if caching is disabled"
+    if PDF_CACHE_DIR and pdf:
+        return disk_cache.file_sha256(pdf)
+    return None
+
+
+def pdf_cache_get(cache_key, name):
+    "get the named value from the cache entry, or None if it is not cached"
+    if not cache_key:
+        return None
+    entry = pdf_cache().get(cache_key)
+    if isinstance(entry, dict):
+        return entry.get(name)
+    return None
+
+
+def pdf_cache_set(cache_key, name, value):
+    "save the named value in the cache entry"
+    if cache_key:
+        pdf_cache().update(cache_key, {name: value})
 
 
 def pdfimages_exists():
@@ -8,19 +58,30 @@ def pdfimages_exists():
     return shutil.which("pdfimages")
 
 
-def pdfimages_output(pdf):
-    "invoke pdfimages utility"
+def pdfimages_output(pdf, timeout=None):
+    "invoke pdfimages utility, raises subprocess.TimeoutExpired after timeout seconds"
     return subprocess.run(
         ["pdfimages", "-list", pdf],
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         check=False,
+        timeout=timeout,
     )
 
 
-def pdf_image_pages(pdf):
-    "return pdf pages on which images are found from pdfimages output"
-    result = pdfimages_output(pdf)
+@trace.traced()
+def pdf_image_pages(pdf, timeout=None, cache_key=None):
+    """
+    return pdf pages on which images are found from pdfimages output, cache_key is
+    the pdf_cache_key() of the PDF if it is already known
+    """
+    trace.count_file_size(trace.current_span(), "bytes_read", pdf)
+    if cache_key is None:
+        cache_key = pdf_cache_key(pdf)
+    cached_page_list = pdf_cache_get(cache_key, "image_pages")
+    if cached_page_list is not None:
+        return set(cached_page_list)
+    result = pdfimages_output(pdf, timeout)
     page_list = []
     if result.stdout:
         page_line_match_pattern = re.compile(r"\s+(\d+)\s.*")
@@ -31,4 +92,352 @@ def pdf_image_pages(pdf):
                 if match_result:
                     page_list.append(int(match_result.group(1)))
     # de-dupe page list into a set of unique values
-    return set(page_list)
+    page_set = set(page_list)
+    # only cache the result if pdfimages ran successfully
+    if cache_key and result.returncode == 0:
+        pdf_cache_set(cache_key, "image_pages", sorted(page_set))
+    return page_set
+
+
+def map_pdf_files(function, pdf_list, max_workers=1, cache_keys=None, **kwargs):
+    """
+    call function for each PDF file using a pool of max_workers threads, waits until
+    all are done and returns the futures in the same order as pdf_list, calling
+    result() on a future returns the value or raises the exception from the function,
+    if cache_keys is a list the cache key of each PDF is passed as cache_key
+    """
+    if not pdf_list:
+        return []
+    with ThreadPoolExecutor(max_workers=max_workers or 1) as executor:
+        if cache_keys is None:
+            return [executor.submit(function, pdf, **kwargs) for pdf in pdf_list]
+        return [
+            executor.submit(function, pdf, cache_key=cache_key, **kwargs)
+            for pdf, cache_key in zip(pdf_list, cache_keys)
+        ]
+
+
+# reference to an indirect object in a PDF, e.g. 12 0 R
+PdfReference = namedtuple("PdfReference", ["number", "generation"])
+
+PDF_WHITESPACE_MATCH_PATTERN = re.compile(rb"(?:[\x00\t\n\x0c\r ]|%[^\r\n]*)*")
+PDF_NUMBER_MATCH_PATTERN = re.compile(rb"[+-]?(?:\d+\.?\d*|\.\d+)")
+PDF_REFERENCE_MATCH_PATTERN = re.compile(
+    rb"(\d+)(?:[\x00\t\n\x0c\r ])+(\d+)(?:[\x00\t\n\x0c\r ])+R(?![^\x00\t\n\x0c\r ()<>\[\]{}/%])"
+)
+PDF_NAME_MATCH_PATTERN = re.compile(rb"/([^\x00\t\n\x0c\r ()<>\[\]{}/%]*)")
+PDF_KEYWORD_MATCH_PATTERN = re.compile(rb"[A-Za-z]+")
+PDF_OBJECT_HEADER_MATCH_PATTERN = re.compile(rb"\s*(\d+)\s+(\d+)\s+obj")
+PDF_XREF_SUBSECTION_MATCH_PATTERN = re.compile(rb"\s*(\d+)\s+(\d+)[ \t]*[\r\n]")
+PDF_XREF_ENTRY_MATCH_PATTERN = re.compile(rb"\s*(\d{10})\s+(\d{5})\s+([nf])")
+PDF_KEYWORD_VALUES = {b"true": True, b"false": False, b"null": None}
+
+# most arrays and dictionaries nested in one object, deeper nesting is not parsed
+PDF_MAX_NESTING = 64
+
+
+def pdf_skip_whitespace(data, position):
+    "return the position of the next non-whitespace and non-comment byte"
+    return PDF_WHITESPACE_MATCH_PATTERN.match(data, position).end()
+
+
+def pdf_literal_string(data, position):
+    "parse a literal string starting at the open parenthesis"
+    depth = 0
+    start = position
+    while True:
+        char = data[position : position + 1]
+        if not char:
+            raise ValueError("unterminated PDF string at %s" % start)
+        if char == b"\\":
+            position += 2
+            continue
+        if char == b"(":
+            depth += 1
+        elif char == b")":
+            depth -= 1
+            if depth == 0:
+                return data[start + 1 : position], position + 1
+        position += 1
+
+
+def pdf_object(data, position, depth=0):
+    """
+    parse one direct object starting at position, return the object as a Python value
+    and the position after it, dictionaries are returned as a dict keyed by name,
+    raises ValueError if arrays and dictionaries are nested too deeply
+    """
+    if depth > PDF_MAX_NESTING:
+        raise ValueError("PDF object nested too deeply at %s" % position)
+    position = pdf_skip_whitespace(data, position)
+    char = data[position : position + 1]
+    if data[position : position + 2] == b"<<":
+        value = {}
+        position += 2
+        while True:
+            position = pdf_skip_whitespace(data, position)
+            if data[position : position + 2] == b">>":
+                return value, position + 2
+            key, position = pdf_object(data, position, depth + 1)
+            if not isinstance(key, str):
+                raise ValueError("PDF dictionary key is not a name at %s" % position)
+            value[key], position = pdf_object(data, position, depth + 1)
+    if char == b"[":
+        value = []
+        position += 1
+        while True:
+            position = pdf_skip_whitespace(data, position)
+            if data[position : position + 1] == b"]":
+                return value, position + 1
+            item, position = pdf_object(data, position, depth + 1)
+            value.append(item)
+    if char == b"(":
+        return pdf_literal_string(data, position)
+    if char == b"<":
+        end = data.find(b">", position)
+        if end < 0:
+            raise ValueError("unterminated PDF hex string at %s" % position)
+        return data[position + 1 : end], end + 1
+    if char == b"/":
+        match = PDF_NAME_MATCH_PATTERN.match(data, position)
+        return match.group(1).decode("latin-1"), match.end()
+    match = PDF_REFERENCE_MATCH_PATTERN.match(data, position)
+    if match:
+        return PdfReference(int(match.group(1)), int(match.group(2))), match.end()
+    match = PDF_NUMBER_MATCH_PATTERN.match(data, position)
+    if match:
+        number = match.group(0)
+        if b"." in number:
+            return float(number), match.end()
+        return int(number), match.end()
+    match = PDF_KEYWORD_MATCH_PATTERN.match(data, position)
+    if match and match.group(0) in PDF_KEYWORD_VALUES:
+        return PDF_KEYWORD_VALUES.get(match.group(0)), match.end()
+    raise ValueError("unexpected PDF token at %s" % position)
+
+
+def png_predictor_decode(data, columns):
+    "reverse the PNG predictor filters applied to rows of the data, one byte per pixel"
+    rows = []
+    previous_row = bytearray(columns)
+    row_size = columns + 1
+    for row_start in range(0, len(data), row_size):
+        filter_type = data[row_start]
+        row = bytearray(data[row_start + 1 : row_start + row_size])
+        for index, value in enumerate(row):
+            left = row[index - 1] if index else 0
+            up = previous_row[index] if index < len(previous_row) else 0
+            if filter_type == 1:
+                row[index] = (value + left) & 0xFF
+            elif filter_type == 2:
+                row[index] = (value + up) & 0xFF
+            elif filter_type == 3:
+                row[index] = (value + ((left + up) >> 1)) & 0xFF
+            elif filter_type == 4:
+                up_left = previous_row[index - 1] if index else 0
+                estimate = left + up - up_left
+                distances = (
+                    abs(estimate - left),
+                    abs(estimate - up),
+                    abs(estimate - up_left),
+                )
+                if distances[0] <= distances[1] and distances[0] <= distances[2]:
+                    predictor = left
+                elif distances[1] <= distances[2]:
+                    predictor = up
+                else:
+                    predictor = up_left
+                row[index] = (value + predictor) & 0xFF
+        rows.append(bytes(row))
+        previous_row = row
+    return b"".join(rows)
+
+
+class PdfFile:
+    "read objects from the cross-reference data of a PDF without rendering it"
+
+    def __init__(self, data):
+        self.data = data
+        self.xref = {}
+        self.trailer = {}
+        self.object_streams = {}
+        self.read_xref()
+
+    def read_xref(self):
+        "populate the cross-reference entries and trailer, newest entries first"
+        startxref = self.data.rfind(b"startxref")
+        if startxref < 0:
+            raise ValueError("PDF startxref not found")
+        offset, position = pdf_object(self.data, startxref + len(b"startxref"))
+        visited = set()
+        while offset is not None and offset not in visited:
+            visited.add(offset)
+            if self.data[offset : offset + 4] == b"xref":
+                trailer = self.read_xref_table(offset + 4)
+                if trailer.get("XRefStm") is not None:
+                    self.read_xref_stream(trailer.get("XRefStm"))
+            else:
+                trailer = self.read_xref_stream(offset)
+            for key, value in trailer.items():
+                self.trailer.setdefault(key, value)
+            offset = trailer.get("Prev")
+
+    def read_xref_table(self, position):
+        "read a cross-reference table section and return its trailer dictionary"
+        while True:
+            match = PDF_XREF_SUBSECTION_MATCH_PATTERN.match(self.data, position)
+            if not match:
+                break
+            start, count = int(match.group(1)), int(match.group(2))
+            position = match.end()
+            for number in range(start, start + count):
+                entry = PDF_XREF_ENTRY_MATCH_PATTERN.match(self.data, position)
+                if not entry:
+                    raise ValueError("malformed PDF xref entry at %s" % position)
+                position = entry.end()
+                if entry.group(3) == b"n":
+                    self.xref.setdefault(number, (1, int(entry.group(1)), 0))
+                else:
+                    self.xref.setdefault(number, (0, 0, 0))
+        position = pdf_skip_whitespace(self.data, position)
+        if self.data[position : position + 7] != b"trailer":
+            raise ValueError("PDF trailer not found at %s" % position)
+        trailer, position = pdf_object(self.data, position + 7)
+        return trailer
+
+    def read_xref_stream(self, offset):
+        "read a cross-reference stream and return its dictionary"
+        stream_dict, stream_data = self.object_at(offset)
+        if stream_dict.get("Type") != "XRef":
+            raise ValueError("PDF xref stream not found at %s" % offset)
+        widths = stream_dict.get("W")
+        index = stream_dict.get("Index") or [0, stream_dict.get("Size")]
+        entry_size = sum(widths)
+        position = 0
+        for section_start, section_count in zip(index[::2], index[1::2]):
+            for number in range(section_start, section_start + section_count):
+                fields = []
+                for width in widths:
+                    fields.append(
+                        int.from_bytes(stream_data[position : position + width], "big")
+                    )
+                    position += width
+                if widths[0] == 0:
+                    # type defaults to 1 if the field is not present
+                    fields[0] = 1
+                self.xref.setdefault(number, tuple(fields))
+        if position > len(stream_data) or not entry_size:
+            raise ValueError("PDF xref stream at %s is too short" % offset)
+        return stream_dict
+
+    def object_at(self, offset):
+        "read the indirect object at the offset, returning its value and stream data"
+        match = PDF_OBJECT_HEADER_MATCH_PATTERN.match(self.data, offset)
+        if not match:
+            raise ValueError("PDF object not found at offset %s" % offset)
+        value, position = pdf_object(self.data, match.end())
+        position = pdf_skip_whitespace(self.data, position)
+        if isinstance(value, dict) and self.data[position : position + 6] == b"stream":
+            position += 6
+            # stream data starts after the end of line
+            if self.data[position : position + 2] == b"\r\n":
+                position += 2
+            elif self.data[position : position + 1] in [b"\n", b"\r"]:
+                position += 1
+            length = self.resolve(value.get("Length"))
+            return value, self.decode_stream(
+                value, self.data[position : position + length]
+            )
+        return value, None
+
+    def decode_stream(self, stream_dict, stream_data):
+        "decompress the stream data, only FlateDecode is supported"
+        filters = stream_dict.get("Filter")
+        if not filters:
+            return bytes(stream_data)
+        if not isinstance(filters, list):
+            filters = [filters]
+        if filters != ["FlateDecode"]:
+            raise ValueError("unsupported PDF stream filter %s" % filters)
+        decoded = zlib.decompress(stream_data)
+        decode_parms = stream_dict.get("DecodeParms") or {}
+        if isinstance(decode_parms, list):
+            decode_parms = decode_parms[0] or {}
+        predictor = decode_parms.get("Predictor", 1)
+        if predictor >= 10:
+            decoded = png_predictor_decode(decoded, decode_parms.get("Columns", 1))
+        elif predictor != 1:
+            raise ValueError("unsupported PDF predictor %s" % predictor)
+        return decoded
+
+    def resolve(self, value):
+        "return the object a reference points to, other values are returned unchanged"
+        visited = set()
+        while isinstance(value, PdfReference):
+            if value.number in visited:
+                raise ValueError("PDF reference loop for object %s" % value.number)
+            visited.add(value.number)
+            value = self.indirect_object(value.number)
+        return value
+
+    def indirect_object(self, number):
+        "find the indirect object by its object number"
+        entry = self.xref.get(number)
+        if not entry or entry[0] == 0:
+            raise ValueError("PDF object %s not found" % number)
+        if entry[0] == 1:
+            return self.object_at(entry[1])[0]
+        # object is compressed inside an object stream
+        stream_number, index = entry[1], entry[2]
+        if stream_number not in self.object_streams:
+            stream_entry = self.xref.get(stream_number)
+            if not stream_entry or stream_entry[0] != 1:
+                raise ValueError("PDF object stream %s not found" % stream_number)
+            self.object_streams[stream_number] = self.object_at(stream_entry[1])
+        stream_dict, stream_data = self.object_streams.get(stream_number)
+        position = 0
+        offsets = []
+        for _ in range(stream_dict.get("N")):
+            object_number, position = pdf_object(stream_data, position)
+            object_offset, position = pdf_object(stream_data, position)
+            offsets.append(object_offset)
+        return pdf_object(stream_data, stream_dict.get("First") + offsets[index])[0]
+
+    def page_count(self):
+        "the /Count value of the root page tree node"
+        catalog = self.resolve(self.trailer.get("Root"))
+        pages = self.resolve(catalog.get("Pages"))
+        count = self.resolve(pages.get("Count"))
+        if not isinstance(count, int) or isinstance(count, bool) or count < 0:
+            raise ValueError("PDF page tree /Count is not valid: %s" % count)
+        return count
+
+
+@trace.traced()
+def pdf_page_count(pdf):
+    """
+    count the pages of a PDF by reading its trailer, cross-reference data and page tree,
+    raises ValueError if the file cannot be parsed
+    """
+    trace.count_file_size(trace.current_span(), "bytes_read", pdf)
+    with open(pdf, "rb") as open_file:
+        try:
+            data = mmap.mmap(open_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ValueError("PDF file %s is empty" % pdf)
+        try:
+            return PdfFile(data).page_count()
+        except (
+            AttributeError,
+            IndexError,
+            KeyError,
+            TypeError,
+            OverflowError,
+            RecursionError,
+            zlib.error,
+        ) as exception:
+            raise ValueError(
+                "failed to parse PDF file %s: %s" % (pdf, str(exception))
+            ) from exception
+        finally:
+            data.close()
@@ -1,10 +1,13 @@
+import copy
+import threading
 import time
+from collections import OrderedDict
 from xml.etree.ElementTree import Element, SubElement
 from docmaptools import parse as docmap_parse
 from elifearticle.article import Affiliation, Contributor, Role
 from elifetools import xmlio
 from jatsgenerator import build as jats_build
-from elifecleaner import LOGGER
+from elifecleaner import disk_cache, LOGGER
 
 # for each ISSN, values for journal-id-type tag text
 ISSN_JOURNAL_ID_MAP = {
@@ -137,19 +140,201 @@ def add_prc_custom_meta_tags(root, identifier=None):
     return root
 
 
+class DocmapContext:
+    """
+    a docmap parsed once, with its steps indexed by version DOI and each value
+    derived from it remembered, it can be passed to the *_from_docmap() functions
+    in place of the docmap string when more than one value is needed, the values
+    are shared so the methods return copies of lists and dicts
+    """
+
+    def __init__(self, docmap_string):
+        self.docmap_string = docmap_string
+        self.cache = {}
+
+    def __repr__(self):
+        return "DocmapContext(%s values)" % len(self.cache)
+
+    def memoize(self, key, function, *args):
+        "return the value for key, calling function(*args) only the first time"
+        if key not in self.cache:
+            self.cache[key] = function(*args)
+        return self.cache[key]
+
+    def shared_json(self):
+        "the parsed docmap JSON shared by the cached values, it must not be changed"
+        return self.memoize("d_json", docmap_parse.docmap_json, self.docmap_string)
+
+    @property
+    def d_json(self):
+        "a copy of the parsed docmap JSON"
+        return copy.deepcopy(self.shared_json())
+
+    @property
+    def step_map(self):
+        "preprint steps grouped by version DOI, shared so it must not be changed"
+        return self.memoize(
+            "step_map", docmap_parse.preprint_version_doi_step_map, self.shared_json()
+        )
+
+    def shared_latest_preprint(self, published=True):
+        "the most recent preprint output shared by the cached values"
+        return self.memoize(
+            ("latest_preprint", published),
+            docmap_parse.docmap_latest_preprint,
+            self.shared_json(),
+            published,
+        )
+
+    def latest_preprint(self, published=True):
+        "the most recent preprint output, only published ones if published is True"
+        return copy.deepcopy(self.shared_latest_preprint(published))
+
+    def shared_preprint_output(self, version_doi=None):
+        "the preprint output shared by the cached values"
+        if not version_doi:
+            return self.shared_latest_preprint(published=False)
+        return self.memoize(
+            ("preprint_output", version_doi), self.version_doi_output, version_doi
+        )
+
+    def preprint_output(self, version_doi=None):
+        "the preprint output matching version_doi, or the latest preprint output"
+        return copy.deepcopy(self.shared_preprint_output(version_doi))
+
+    def version_doi_output(self, version_doi):
+        "the last preprint output in the steps of version_doi, or None if not found"
+        output = None
+        for step_json in self.step_map.get(version_doi, []):
+            for action_json in docmap_parse.step_actions(step_json):
+                for output_json in docmap_parse.action_outputs(action_json):
+                    if output_json.get("type") == "preprint":
+                        output = output_json
+        return output
+
+    def partof_field(self, field_name, version_doi=None, identifier=None):
+        "value from the partOf data of the preprint output, or None if it is empty"
+        field_value = docmap_parse.output_partof(
+            self.shared_preprint_output(version_doi)
+        ).get(field_name)
+        if not field_value:
+            # logged by the docmaptools logger, as preprint_partof_field() does
+            docmap_parse.LOGGER.warning(
+                "%s no %s found in the docmap", identifier, field_name
+            )
+            return None
+        return copy.deepcopy(field_value)
+
+    def elocation_id(self, version_doi=None, identifier=None):
+        "elocation-id of the preprint"
+        return self.partof_field("electronicArticleIdentifier", version_doi, identifier)
+
+    def volume(self, version_doi=None, identifier=None):
+        "volume of the preprint, as in the docmap"
+        return self.partof_field("volumeIdentifier", version_doi, identifier)
+
+    def article_categories(self, version_doi=None, identifier=None):
+        "subject disciplines of the preprint"
+        return self.partof_field("subjectDisciplines", version_doi, identifier)
+
+    def article_id(self, version_doi=None):
+        "identifier of the preprint, the article_id"
+        return self.shared_preprint_output(version_doi).get("identifier")
+
+    def license(self, version_doi=None):
+        "license URL of the preprint"
+        return self.shared_preprint_output(version_doi).get("license")
+
+    def review_date(self):
+        "under-review date of the first preprint"
+        return self.memoize(
+            "review_date", docmap_parse.preprint_review_date, self.shared_json()
+        )
+
+    def editor_data(self, version_doi):
+        "participants of the evaluation-summary action in the steps of version_doi"
+        participants = []
+        for step_json in self.step_map.get(version_doi):
+            for action_json in docmap_parse.step_actions(step_json):
+                for output_json in docmap_parse.action_outputs(action_json):
+                    if output_json.get("type") == "evaluation-summary":
+                        participants = action_json.get("participants")
+        return copy.deepcopy(participants)
+
+
+# number of docmaps to keep parsed, workers often process versions of one article
+DOCMAP_CACHE_SIZE = 16
+
+# DocmapContext by SHA-256 of the docmap string, least recently used first
+DOCMAP_CACHE = OrderedDict()
+DOCMAP_CACHE_LOCK = threading.Lock()
+DOCMAP_CACHE_COUNTS = {"hits": 0, "misses": 0}
+
+
+def docmap_context(docmap):
+    """
+    DocmapContext of a docmap string, or the docmap if it is already a context,
+    contexts are shared from a process-wide cache so their values must not be changed
+    """
+    if isinstance(docmap, DocmapContext):
+        return docmap
+    if not isinstance(docmap, str) or not DOCMAP_CACHE_SIZE:
+        return DocmapContext(docmap)
+    key = disk_cache.string_sha256(docmap)
+    with DOCMAP_CACHE_LOCK:
+        context = DOCMAP_CACHE.get(key)
+        if context is not None:
+            DOCMAP_CACHE_COUNTS["hits"] += 1
+            DOCMAP_CACHE.move_to_end(key)
+            return context
+        DOCMAP_CACHE_COUNTS["misses"] += 1
+        context = DocmapContext(docmap)
+        DOCMAP_CACHE[key] = context
+        while len(DOCMAP_CACHE) > DOCMAP_CACHE_SIZE:
+            DOCMAP_CACHE.popitem(last=False)
+    return context
+
+
+def invalidate_docmap(docmap_string):
+    "remove the docmap from the cache, return True if it was cached"
+    with DOCMAP_CACHE_LOCK:
+        return (
+            DOCMAP_CACHE.pop(disk_cache.string_sha256(docmap_string), None) is not None
+        )
+
+
+def clear_docmap_cache():
+    "remove all docmaps from the cache and reset the hit and miss counts"
+    with DOCMAP_CACHE_LOCK:
+        DOCMAP_CACHE.clear()
+        DOCMAP_CACHE_COUNTS["hits"] = 0
+        DOCMAP_CACHE_COUNTS["misses"] = 0
+
+
+def docmap_cache_info():
+    "hits, misses, size and max_size of the docmap cache"
+    with DOCMAP_CACHE_LOCK:
+        return OrderedDict(
+            [
+                ("hits", DOCMAP_CACHE_COUNTS["hits"]),
+                ("misses", DOCMAP_CACHE_COUNTS["misses"]),
+                ("size", len(DOCMAP_CACHE)),
+                ("max_size", DOCMAP_CACHE_SIZE),
+            ]
+        )
+
+
 def elocation_id_from_docmap(docmap_string, version_doi=None, identifier=None):
     "from the docmap get the elocation-id volume"
     LOGGER.info("Parse docmap json")
-    d_json = docmap_parse.docmap_json(docmap_string)
-    if not d_json:
+    context = docmap_context(docmap_string)
+    if not context.shared_json():
         LOGGER.warning(
             "%s parsing docmap returned None",
             identifier,
         )
         return None
-    elocation_id = docmap_parse.preprint_electronic_article_identifier(
-        d_json, version_doi=version_doi, identifier=identifier
-    )
+    elocation_id = context.elocation_id(version_doi, identifier)
     if not elocation_id:
         LOGGER.warning(
             "%s no elocation_id found in the docmap",
@@ -163,15 +348,15 @@ def version_doi_from_docmap(docmap_string, identifier=None, published=True):
     "find the latest preprint DOI from docmap"
     doi = None
     LOGGER.info("Parse docmap json")
-    d_json = docmap_parse.docmap_json(docmap_string)
-    if not d_json:
+    context = docmap_context(docmap_string)
+    if not context.shared_json():
         LOGGER.warning(
             "%s parsing docmap returned None",
             identifier,
         )
         return doi
     LOGGER.info("Get latest preprint data from the docmap")
-    preprint_data = docmap_parse.docmap_latest_preprint(d_json, published=published)
+    preprint_data = context.latest_preprint(published=published)
     if not preprint_data:
         LOGGER.warning(
             "%s no preprint data was found in the docmap",
@@ -264,15 +449,15 @@ def review_date_from_docmap(docmap_string, identifier=None):
     "find the under-review date for the first preprint from the docmap"
     date_string = None
     LOGGER.info("Parse docmap json")
-    d_json = docmap_parse.docmap_json(docmap_string)
-    if not d_json:
+    context = docmap_context(docmap_string)
+    if not context.shared_json():
         LOGGER.warning(
             "%s parsing docmap returned None",
             identifier,
         )
         return date_string
     LOGGER.info("Get first under-review happened date from the docmap")
-    date_string = docmap_parse.preprint_review_date(d_json)
+    date_string = context.review_date()
     if not date_string:
         LOGGER.warning(
             "%s no under-review happened date was found in the docmap",
@@ -284,16 +469,14 @@ def review_date_from_docmap(docmap_string, identifier=None):
 def volume_from_docmap(docmap_string, version_doi=None, identifier=None):
     "from the docmap get the volume"
     LOGGER.info("Parse docmap json")
-    d_json = docmap_parse.docmap_json(docmap_string)
-    if not d_json:
+    context = docmap_context(docmap_string)
+    if not context.shared_json():
         LOGGER.warning(
             "%s parsing docmap returned None",
             identifier,
         )
         return None
-    volume = docmap_parse.preprint_volume(
-        d_json, version_doi=version_doi, identifier=identifier
-    )
+    volume = context.volume(version_doi, identifier)
     if volume:
         try:
             volume = int(volume)
@@ -315,16 +498,14 @@ def volume_from_docmap(docmap_string, version_doi=None, identifier=None):
 def article_id_from_docmap(docmap_string, version_doi=None, identifier=None):
     "from the docmap get the article_id"
     LOGGER.info("Parse docmap json")
-    d_json = docmap_parse.docmap_json(docmap_string)
-    if not d_json:
+    context = docmap_context(docmap_string)
+    if not context.shared_json():
         LOGGER.warning(
             "%s parsing docmap returned None",
             identifier,
         )
         return None
-    article_id = docmap_parse.preprint_identifier(
-        d_json, version_doi=version_doi, identifier=identifier
-    )
+    article_id = context.article_id(version_doi)
     if not article_id:
         LOGGER.warning(
             "%s no article_id found in the docmap",
@@ -337,16 +518,14 @@ def article_id_from_docmap(docmap_string, version_doi=None, identifier=None):
 def license_from_docmap(docmap_string, version_doi=None, identifier=None):
     "from the docmap get the license"
     LOGGER.info("Parse docmap json")
-    d_json = docmap_parse.docmap_json(docmap_string)
-    if not d_json:
+    context = docmap_context(docmap_string)
+    if not context.shared_json():
         LOGGER.warning(
             "%s parsing docmap returned None",
             identifier,
         )
         return None
-    license_url = docmap_parse.preprint_license(
-        d_json, version_doi=version_doi, identifier=identifier
-    )
+    license_url = context.license(version_doi)
     if not license_url:
         LOGGER.warning(
             "%s no license found in the docmap",
@@ -359,16 +538,14 @@ def license_from_docmap(docmap_string, version_doi=None, identifier=None):
 def article_categories_from_docmap(docmap_string, version_doi=None, identifier=None):
     "from the docmap get the article category subject disciplines"
     LOGGER.info("Parse docmap json")
-    d_json = docmap_parse.docmap_json(docmap_string)
-    if not d_json:
+    context = docmap_context(docmap_string)
+    if not context.shared_json():
         LOGGER.warning(
             "%s parsing docmap returned None",
             identifier,
         )
         return None
-    article_categories = docmap_parse.preprint_subject_disciplines(
-        d_json, version_doi=version_doi, identifier=identifier
-    )
+    article_categories = context.article_categories(version_doi, identifier)
     if not article_categories:
         LOGGER.warning(
             "%s no article_categories found in the docmap",
@@ -560,7 +737,7 @@ def editor_contributors(docmap_string, version_doi):
     "populate Contributor objects with editor data from a docmap"
     editors = []
 
-    data = docmap_parse.docmap_editor_data(docmap_string, version_doi)
+    data = docmap_context(docmap_string).editor_data(version_doi)
 
     for data_item in data:
         contrib_type = data_item.get("role", "").replace("-", "_")
@@ -1,9 +1,8 @@
 import time
 from xml.etree.ElementTree import Element, SubElement
-from docmaptools import parse as docmap_parse
 from jatsgenerator import build as jats_build
 from elifetools.utils import doi_to_doi_uri
-from elifecleaner import sub_article, LOGGER
+from elifecleaner import prc, sub_article, LOGGER
 from elifecleaner.prc import date_struct_from_string
 
 
@@ -147,26 +146,46 @@ def history_event_self_uri_list(
     version_doi,
     user_agent=None,
 ):
-    "a list of self-uri tag data for a history event"
+    """
+    a list of self-uri tag data for a history event, remembered for each version
+    DOI in the cached DocmapContext of the docmap once all the web content downloads
+    """
+    context = prc.docmap_context(docmap_string)
+    key = ("self_uri_list", version_doi)
+    self_uri_list = context.cache.get(key)
+    if self_uri_list is None:
+        self_uri_list, complete = docmap_self_uri_list(context, version_doi, user_agent)
+        if complete:
+            context.cache[key] = self_uri_list
+    return [dict(self_uri_data) for self_uri_data in self_uri_list]
+
+
+def docmap_self_uri_list(context, version_doi, user_agent=None):
+    """
+    self-uri tag data for the sub-articles of the version DOI from the docmap, and
+    whether the HTML of every web-content URL was downloaded
+    """
     self_uri_list = []
-    d_json = docmap_parse.docmap_json(docmap_string)
-    step_map = docmap_parse.preprint_version_doi_step_map(d_json)
-    if step_map.get(version_doi):
-        generate_dois = False
-        data = sub_article.sub_article_data(
-            docmap_string,
+    complete = True
+    if context.step_map.get(version_doi):
+        content_json = sub_article.docmap_web_content(
+            context,
             version_doi=version_doi,
-            generate_dois=generate_dois,
             user_agent=user_agent,
         )
-        for data_item in data:
+        complete = all(
+            content_item.get("html")
+            for content_item in content_json
+            if content_item.get("web-content")
+        )
+        for metadata_item in sub_article.content_metadata(content_json):
             self_uri_data = {}
-            if data_item.get("article").article_type:
-                self_uri_data["content_type"] = data_item.get("article").article_type
-            self_uri_data["uri"] = doi_to_doi_uri(data_item.get("article").doi)
-            self_uri_data["title"] = str(data_item.get("article").title)
+            if metadata_item.get("article_type"):
+                self_uri_data["content_type"] = metadata_item.get("article_type")
+            self_uri_data["uri"] = doi_to_doi_uri(metadata_item.get("doi"))
+            self_uri_data["title"] = str(metadata_item.get("title"))
             self_uri_list.append(self_uri_data)
-    return self_uri_list
+    return self_uri_list, complete
 
 
 def collect_history_event_data(
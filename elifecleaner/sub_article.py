@@ -3,9 +3,9 @@ import re
 from xml.etree import ElementTree
 from xml.etree.ElementTree import Element, SubElement
 from elifearticle.article import Article, Contributor, Role
-from docmaptools import parse as docmap_parse
+from docmaptools import convert as docmap_convert, parse as docmap_parse
 from jatsgenerator import build
-from elifecleaner import assessment_terms, LOGGER, parse, utils
+from elifecleaner import assessment_terms, LOGGER, parse, prc, utils, web_content
 
 XML_NAMESPACES = {
     "ali": "http://www.niso.org/schemas/ali/1.0/",
@@ -21,19 +21,28 @@ ARTICLE_TYPE_MAP = {
 }
 
 
+# match the reviewer number in an article title, e.g. Reviewer #1 (Public Review):
+TITLE_NUMBER_MATCH = re.compile(r".*\s+#(\d+)\s+")
+
+
+def title_number(title):
+    "the reviewer number from the article title, or 0 if there is none"
+    matches = TITLE_NUMBER_MATCH.match(title) if title else None
+    return int(matches[1]) if matches else 0
+
+
+def content_title_number(content):
+    "the reviewer number of the content, matched in the xml if it is not parsed"
+    if "title_number" in content:
+        return content.get("title_number")
+    number_match = re.compile(rb".*<article-title>.*\s+#(\d+)\s+.*")
+    matches = number_match.match(content.get("xml"))
+    return int(matches[1]) if matches else 0
+
+
 def reorder_review_articles(content_list):
     "reorder content based on the article-title, if present"
-    number_match = re.compile(rb".*<article-title>.*\s+#(\d+)\s+.*")
-    content_to_sort = []
-    for content in content_list:
-        matches = number_match.match(content.get("xml"))
-        if matches:
-            content_map = {"num": int(matches[1]), "content": content}
-        else:
-            content_map = {"num": 0, "content": content}
-        content_to_sort.append(content_map)
-    sorted_content = sorted(content_to_sort, key=lambda item: item.get("num"))
-    return [content_item.get("content") for content_item in sorted_content]
+    return sorted(content_list, key=content_title_number)
 
 
 def reorder_content_json(content_json):
@@ -66,9 +75,8 @@ def add_sub_article_xml(
 ):
     "parse content from docmap and add sub-article tags to the article XML"
     LOGGER.info("Parsing article XML into root Element")
-    root = parse.parse_article_xml(article_xml)
     LOGGER.info("Parsing article XML into an Article object")
-    article, error_count = parse.article_from_xml(article_xml)
+    article, error_count, root = parse.article_and_root_from_xml(article_xml)
     LOGGER.info("Populate sub article data")
     data = sub_article_data(
         docmap_string,
@@ -94,17 +102,82 @@ def sub_article_data(
 ):
     "parse docmap, get the HTML for each article, and format the content"
     LOGGER.info("Parsing docmap json")
-    d_json = docmap_parse.docmap_json(docmap_string)
+    d_json = prc.docmap_context(docmap_string).d_json
     LOGGER.info("Collecting content_json")
     content_json = docmap_parse.docmap_content(d_json, version_doi)
     LOGGER.info("Downloading HTML for each web-content URL")
-    content_json = docmap_parse.populate_docmap_content(
+    content_json = web_content.populate_docmap_content(
         content_json, user_agent=user_agent
     )
     LOGGER.info("Formatting content json into article and XML data")
     return format_content_json(content_json, article, generate_dois)
 
 
+def sub_article_metadata(docmap, version_doi=None, user_agent=None):
+    """
+    type, DOI and title of each sub-article in the same order as sub_article_data()
+    without building the Article objects and XML, docmap is a docmap string or a
+    DocmapContext, the HTML is still downloaded because the titles and the order of
+    the reviews are taken from it
+    """
+    content_json = docmap_web_content(docmap, version_doi, user_agent)
+    return content_metadata(content_json)
+
+
+def docmap_web_content(docmap, version_doi=None, user_agent=None):
+    """
+    content items of the version DOI from the docmap, with the downloaded HTML of
+    each web-content URL, docmap is a docmap string or a DocmapContext
+    """
+    LOGGER.info("Parsing docmap json")
+    d_json = prc.docmap_context(docmap).d_json
+    LOGGER.info("Collecting content_json")
+    content_json = docmap_parse.docmap_content(d_json, version_doi)
+    LOGGER.info("Downloading HTML for each web-content URL")
+    return web_content.populate_docmap_content(content_json, user_agent=user_agent)
+
+
+def html_title(html):
+    """
+    the article-title which converting the HTML to XML would give, or None, the HTML
+    is parsed and only the title tag is converted, the same as in docmaptools where
+    a first p tag which starts with a bold tag is the title
+    """
+    root = docmap_convert.html_string_to_element(html)
+    p_tag = root.find("p")
+    if p_tag is None or len(p_tag) == 0 or p_tag.text or p_tag[0].tag != "strong":
+        return None
+    title_tag = p_tag[0]
+    title_root = Element("root")
+    SubElement(SubElement(title_root, "front-stub"), "title-group").append(title_tag)
+    docmap_convert.replace_tags(title_root)
+    title_tag.tag = "article-title"
+    return article_title(title_root)
+
+
+def content_metadata(content_json):
+    "type, DOI and title of each content item which has HTML, in sub-article order"
+    content_json = [
+        dict(content, title=html_title(content.get("html")))
+        for content in content_json
+        if content.get("html")
+    ]
+    for content in content_json:
+        content["title_number"] = title_number(content.get("title"))
+    metadata = []
+    for content in reorder_content_json(content_json):
+        metadata.append(
+            {
+                "article_type": ARTICLE_TYPE_MAP.get(
+                    content.get("type"), content.get("type")
+                ),
+                "doi": content.get("doi"),
+                "title": content.get("title"),
+            }
+        )
+    return metadata
+
+
 def sub_article_id(index):
     "generate an id attribute for a sub article"
     return "sa%s" % index
@@ -188,17 +261,23 @@ def build_sub_article_object(
             article_object, sub_article_object, content.get("participants")
         )
     # take the article title from the XML
-    article_title_tag = xml_root.find(".//front-stub/title-group/article-title")
-    if article_title_tag is not None:
-        # handle inline tags
-        tag_text = ElementTree.tostring(article_title_tag).decode("utf8")
-        # remove article-title tag
-        sub_article_object.title = tag_text.replace("<article-title>", "").replace(
-            "</article-title>", ""
-        )
+    title = article_title(xml_root)
+    if title is not None:
+        sub_article_object.title = title
     return sub_article_object
 
 
+def article_title(xml_root):
+    "the article-title from the front-stub, including inline tags, or None"
+    article_title_tag = xml_root.find(".//front-stub/title-group/article-title")
+    if article_title_tag is None:
+        return None
+    # handle inline tags
+    tag_text = ElementTree.tostring(article_title_tag).decode("utf8")
+    # remove article-title tag
+    return tag_text.replace("<article-title>", "").replace("</article-title>", "")
+
+
 def list_tag_start_value(tag):
     "determine a start value of a list tag"
     try:
@@ -225,9 +304,69 @@ def copy_list_item_content(from_tag, to_tag, item_prefix):
         to_tag.insert(content_tag_index, content_child_tag)
 
 
+def parse_content_xml(content_json):
+    """
+    parse the XML of each content item once into xml_root, and record its title and
+    title_number for ordering, the later stages change xml_root and not the xml
+    """
+    for content in content_json:
+        try:
+            content["xml_root"] = ElementTree.fromstring(content.get("xml"))
+        except Exception as exception:
+            LOGGER.exception(
+                "Exception raised parsing XML for type %s, DOI %s, xml %s: %s"
+                % (
+                    content.get("type"),
+                    content.get("doi"),
+                    content.get("xml"),
+                    str(exception),
+                )
+            )
+            raise
+        content["title"] = article_title(content.get("xml_root"))
+        content["title_number"] = title_number(content.get("title"))
+    return content_json
+
+
+def transform_ordered_list_tags(xml_root):
+    "convert each list-item of a list-type order list to a p tag"
+    for list_tag_parent in xml_root.findall(".//list[@list-type='order']/.."):
+        for tag_index, child_tag in enumerate(list_tag_parent.iterfind("*")):
+            if child_tag.tag == "list" and child_tag.get("list-type") == "order":
+                start_value = list_tag_start_value(child_tag)
+                for item_index, list_item_tag in enumerate(
+                    child_tag.findall("list-item")
+                ):
+                    # new p tag to hold the content
+                    p_tag = Element("p")
+
+                    list_item_p_tag = list_item_tag.find("p")
+
+                    if list_item_p_tag is not None:
+                        content_tag = list_item_p_tag
+                    else:
+                        # if there is no p tag, take content from the list_item_tag
+                        content_tag = list_item_tag
+
+                    copy_list_item_content(content_tag, p_tag, start_value + item_index)
+
+                    # insert the new p tag into the parent tree
+                    list_tag_parent.insert(tag_index + item_index, p_tag)
+
+                # remove the old list tag
+                list_tag_parent.remove(child_tag)
+    return xml_root
+
+
 def transform_ordered_lists(content_json):
-    "list of list-type order convert each list-item to a p tag"
+    """
+    list of list-type order convert each list-item to a p tag, in the xml_root if
+    the content has been parsed, otherwise the xml is parsed and replaced
+    """
     for index, content in enumerate(content_json):
+        if content.get("xml_root") is not None:
+            transform_ordered_list_tags(content.get("xml_root"))
+            continue
         try:
             xml_root = ElementTree.fromstring(content.get("xml"))
         except Exception as exception:
@@ -244,34 +383,7 @@ def transform_ordered_lists(content_json):
                 )
             )
             continue
-        for list_tag_parent in xml_root.findall(".//list[@list-type='order']/.."):
-            for tag_index, child_tag in enumerate(list_tag_parent.iterfind("*")):
-                if child_tag.tag == "list" and child_tag.get("list-type") == "order":
-                    start_value = list_tag_start_value(child_tag)
-                    for item_index, list_item_tag in enumerate(
-                        child_tag.findall("list-item")
-                    ):
-                        # new p tag to hold the content
-                        p_tag = Element("p")
-
-                        list_item_p_tag = list_item_tag.find("p")
-
-                        if list_item_p_tag is not None:
-                            content_tag = list_item_p_tag
-                        else:
-                            # if there is no p tag, take content from the list_item_tag
-                            content_tag = list_item_tag
-
-                        copy_list_item_content(
-                            content_tag, p_tag, start_value + item_index
-                        )
-
-                        # insert the new p tag into the parent tree
-                        list_tag_parent.insert(tag_index + item_index, p_tag)
-
-                    # remove the old list tag
-                    list_tag_parent.remove(child_tag)
-
+        transform_ordered_list_tags(xml_root)
         # replace the xml content
         content_json[index]["xml"] = ElementTree.tostring(xml_root)
     return content_json
@@ -290,6 +402,8 @@ def format_content_json(content_json, article_object=None, generate_dois=True):
             )
     # only keep items which have html
     content_json = [content for content in content_json if content.get("html")]
+    # parse the XML once, the stages after this change the xml_root
+    content_json = parse_content_xml(content_json)
     # modify the XML
     content_json = transform_ordered_lists(content_json)
     # reorder the articles
@@ -297,9 +411,8 @@ def format_content_json(content_json, article_object=None, generate_dois=True):
     # create an article for each
     for index, content in enumerate(content_json):
 
-        xml_root = ElementTree.fromstring(content.get("xml"))
         # remove hr tags
-        xml_root = utils.remove_tags(xml_root, "hr")
+        xml_root = utils.remove_tags(content.get("xml_root"), "hr")
 
         sub_article_object = build_sub_article_object(
             article_object, xml_root, content, index, generate_dois
@@ -0,0 +1,303 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+
+class Span:
+    "a timed stage of processing, with counts such as bytes read and written"
+
+    recording = True
+
+    def __init__(self, name, parent=None, attributes=None, depth=0):
+        self.name = name
+        self.parent = parent
+        self.attributes = OrderedDict(attributes or {})
+        self.counts = OrderedDict()
+        self.depth = depth
+        self.start_time = None
+        self.duration = None
+        self.error = None
+        # bytes allocated when the span started and the most allocated during it,
+        # only measured if the recorder measures memory and tracemalloc is tracing
+        self.memory_start = None
+        self.memory_peak = None
+
+    def __repr__(self):
+        return 'Span("%s", %s)' % (self.name, self.duration)
+
+    def count(self, name, value=1):
+        "add value to a count, e.g. bytes_read, bytes_written, files or elements"
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def set(self, name, value):
+        "set an attribute of the span"
+        self.attributes[name] = value
+
+    def to_dict(self):
+        "the span as a dict which can be saved as JSON"
+        return OrderedDict(
+            [
+                ("name", self.name),
+                ("parent", self.parent),
+                ("start_time", self.start_time),
+                ("duration", self.duration),
+                ("attributes", self.attributes),
+                ("counts", self.counts),
+                ("error", self.error),
+                ("memory_start", self.memory_start),
+                ("memory_peak", self.memory_peak),
+            ]
+        )
+
+
+class NullSpan:
+    "span which records nothing, used when spans are not being recorded"
+
+    recording = False
+
+    def __repr__(self):
+        return "NullSpan()"
+
+    def count(self, name, value=1):
+        pass
+
+    def set(self, name, value):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class NullRecorder:
+    "recorder which discards the spans, it is the default"
+
+    enabled = False
+    memory = False
+
+    def __repr__(self):
+        return "NullRecorder()"
+
+    def record(self, span):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryRecorder:
+    "recorder which keeps the spans in a list"
+
+    enabled = True
+    memory = False
+
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "MemoryRecorder(%s spans)" % len(self.spans)
+
+    def record(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    def by_name(self, name):
+        "list of spans having the name"
+        return [span for span in self.spans if span.name == name]
+
+    def summary(self):
+        "dict of the number of calls, total duration and total counts by span name"
+        summary = OrderedDict()
+        for span in self.spans:
+            if span.name not in summary:
+                summary[span.name] = OrderedDict(
+                    [("calls", 0), ("duration", 0), ("counts", OrderedDict())]
+                )
+            span_summary = summary[span.name]
+            span_summary["calls"] += 1
+            span_summary["duration"] += span.duration
+            for name, value in span.counts.items():
+                span_summary["counts"][name] = (
+                    span_summary["counts"].get(name, 0) + value
+                )
+        return summary
+
+    def close(self):
+        pass
+
+
+class JsonLinesRecorder:
+    "recorder which appends each span to a file as a line of JSON"
+
+    enabled = True
+    memory = False
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.open_file = None
+
+    def __repr__(self):
+        return 'JsonLinesRecorder("%s")' % self.file_path
+
+    def record(self, span):
+        line = json.dumps(span.to_dict()) + "\n"
+        with self.lock:
+            if self.open_file is None:
+                self.open_file = open(self.file_path, "a")
+            self.open_file.write(line)
+            self.open_file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.open_file is not None:
+                self.open_file.close()
+                self.open_file = None
+
+
+# recorder of the spans, replace it using set_recorder() to record spans
+RECORDER = NullRecorder()
+
+# stack of the open spans in each thread, to record the parent of a span
+LOCAL = threading.local()
+
+
+def set_recorder(recorder=None):
+    "set the recorder of spans, or stop recording if None, return the previous one"
+    global RECORDER
+    previous_recorder = RECORDER
+    RECORDER = recorder if recorder is not None else NullRecorder()
+    return previous_recorder
+
+
+@contextmanager
+def recording(recorder):
+    "record spans using recorder inside the context, then restore the previous one"
+    previous_recorder = set_recorder(recorder)
+    try:
+        yield recorder
+    finally:
+        set_recorder(previous_recorder)
+        recorder.close()
+
+
+def span_stack():
+    "open spans of the current thread"
+    if not hasattr(LOCAL, "stack"):
+        LOCAL.stack = []
+    return LOCAL.stack
+
+
+def current_span():
+    "the innermost open span of the current thread, or NULL_SPAN"
+    if not RECORDER.enabled:
+        return NULL_SPAN
+    stack = span_stack()
+    return stack[-1] if stack else NULL_SPAN
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    time the code inside the context and give it to the recorder as a Span,
+    if no recorder is set a NullSpan is used and nothing is recorded
+    """
+    recorder = RECORDER
+    if not recorder.enabled:
+        yield NULL_SPAN
+        return
+    stack = span_stack()
+    parent_span = stack[-1] if stack else None
+    new_span = Span(
+        name, parent_span.name if parent_span else None, attributes, len(stack)
+    )
+    measure_memory = recorder.memory and tracemalloc.is_tracing()
+    if measure_memory:
+        start_memory(new_span, parent_span)
+    stack.append(new_span)
+    new_span.start_time = time.time()
+    start_time = time.perf_counter()
+    try:
+        yield new_span
+    except BaseException as exception:
+        new_span.error = exception.__class__.__name__
+        raise
+    finally:
+        new_span.duration = time.perf_counter() - start_time
+        stack.pop()
+        if measure_memory:
+            end_memory(new_span, parent_span)
+        recorder.record(new_span)
+
+
+def reset_peak_memory():
+    "reset the peak traced memory to the current size, if the Python version can"
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+
+
+def start_memory(new_span, parent_span):
+    """
+    record the memory allocated when a span starts, the peak so far is kept by the
+    parent span before the peak is reset to measure the new span
+    """
+    current, peak = tracemalloc.get_traced_memory()
+    if parent_span is not None and parent_span.memory_peak is not None:
+        parent_span.memory_peak = max(parent_span.memory_peak, peak)
+    reset_peak_memory()
+    new_span.memory_start = current
+    new_span.memory_peak = current
+
+
+def end_memory(new_span, parent_span):
+    "record the peak memory of a span when it ends and include it in the parent peak"
+    peak = tracemalloc.get_traced_memory()[1]
+    new_span.memory_peak = max(new_span.memory_peak, peak)
+    if parent_span is not None and parent_span.memory_peak is not None:
+        parent_span.memory_peak = max(parent_span.memory_peak, new_span.memory_peak)
+    reset_peak_memory()
+
+
+def traced(name=None):
+    """
+    decorator to record each call of the function as a span, named module.function
+    unless name is specified, use current_span() in the function to add counts
+    """
+
+    def decorator(function):
+        span_name = name or "%s.%s" % (
+            function.__module__.rsplit(".", 1)[-1],
+            function.__name__,
+        )
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not RECORDER.enabled:
+                return function(*args, **kwargs)
+            with span(span_name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def file_size(file_path):
+    "size of the file in bytes, or None if it does not exist"
+    try:
+        return os.path.getsize(file_path)
+    except (OSError, TypeError):
+        return None
+
+
+def count_file_size(span, name, file_path):
+    "add the size of the file to the count, if the span is recording"
+    if span.recording:
+        size = file_size(file_path)
+        if size is not None:
+            span.count(name, size)
@@ -1,12 +1,51 @@
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
 import copy
 from xml.etree.ElementTree import SubElement
 import os
+import shutil
 import string
+import tempfile
+import time
 import zipfile
 from elifetools import xmlio
 from elifetools import parseJATS as parser
-from elifecleaner import LOGGER, parse, prc, zip_lib
-
+from elifecleaner import LOGGER, parse, prc, trace, zip_lib
+
+# file extensions of formats which are already compressed, they are stored in a zip
+# without compressing them again
+ZIP_STORED_FILE_EXTENSIONS = [
+    "7z",
+    "avi",
+    "bz2",
+    "docx",
+    "gif",
+    "gz",
+    "jpeg",
+    "jpg",
+    "m4v",
+    "mkv",
+    "mov",
+    "mp3",
+    "mp4",
+    "mpeg",
+    "mpg",
+    "png",
+    "pptx",
+    "rar",
+    "webm",
+    "webp",
+    "xlsx",
+    "xz",
+    "zip",
+]
+
+# number of files to compress at the same time when writing a zip
+ZIP_COMPRESSION_WORKERS = 4
+
+# number of code files to zip at the same time
+CODE_FILE_ZIP_WORKERS = 1
 
 WELLCOME_FUNDING_STATEMENT = "For the purpose of Open Access, the authors have applied a CC BY public copyright license to any Author Accepted Manuscript version arising from this submission."
 
@@ -27,6 +66,84 @@ class ArticleZipFile:
         )
 
 
+class FileTransformPlan:
+    """
+    list of (from_file, to_file) ArticleZipFile pairs of planned file changes, it
+    is made without reading or writing any files so it can be checked in a dry run
+    before the changes are made
+    """
+
+    def __init__(self, file_transformations=None):
+        self.file_transformations = list(file_transformations or [])
+
+    def append(self, file_transformation):
+        self.file_transformations.append(file_transformation)
+
+    def __iter__(self):
+        return iter(self.file_transformations)
+
+    def __len__(self):
+        return len(self.file_transformations)
+
+    def __getitem__(self, index):
+        return self.file_transformations[index]
+
+    def __eq__(self, other):
+        if not isinstance(other, (FileTransformPlan, list)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return "FileTransformPlan(%s)" % self.file_transformations
+
+
+class ArticleDocument:
+    """
+    data structure for holding the parsed article XML while it is transformed,
+    the XML file is parsed once, modified in memory, and written once when done,
+    xml_string can be supplied instead of reading the XML from xml_asset_path
+    """
+
+    def __init__(
+        self, xml_asset_path=None, identifier=None, root=None, xml_string=None
+    ):
+        self.xml_asset_path = xml_asset_path
+        self.identifier = identifier
+        self.xml_string = xml_string
+        self._root = root
+
+    @property
+    def root(self):
+        "the ElementTree root, parsing the XML the first time it is requested"
+        if self._root is None:
+            self._root = parse.parse_article_xml(
+                self.xml_asset_path, xml_string=self.xml_string
+            )
+        return self._root
+
+    @root.setter
+    def root(self, root):
+        self._root = root
+
+    def soup(self):
+        "parse the original XML using BeautifulSoup"
+        if self.xml_string is not None:
+            return parser.parse_xml(self.xml_string)
+        return parser.parse_document(self.xml_asset_path)
+
+    def to_string(self):
+        "serialise the root to a string"
+        return xml_element_to_string(self.root)
+
+    def write(self):
+        "serialise the root and write it to the XML file"
+        write_xml_file(self.root, self.xml_asset_path, self.identifier)
+
+    def __repr__(self):
+        return 'ArticleDocument("%s", "%s")' % (self.xml_asset_path, self.identifier)
+
+
+@trace.traced()
 def transform_ejp_zip(zip_file, tmp_dir, output_dir):
     "transform ejp zip file and write a new zip file output"
 
@@ -42,31 +159,154 @@ def transform_ejp_zip(zip_file, tmp_dir, output_dir):
         asset_file_name_map, output_dir, zip_file_name
     )
 
-    # write new zip file
-    new_zip_file_path = rezip(new_asset_file_name_map, output_dir, zip_file_name)
+    # write new zip file, files other than the article XML are unchanged
+    # and can be copied from the original zip without compressing them again
+    xml_asset = parse.article_xml_asset(new_asset_file_name_map)
+    modified_file_names = [xml_asset[0]] if xml_asset else []
+    new_zip_file_path = rezip(
+        new_asset_file_name_map,
+        output_dir,
+        zip_file_name,
+        source_zip=zip_file,
+        modified_file_names=modified_file_names,
+    )
 
+    span = trace.current_span()
+    trace.count_file_size(span, "bytes_read", zip_file)
+    trace.count_file_size(span, "bytes_written", new_zip_file_path)
     return new_zip_file_path
 
 
+@trace.traced()
+def transform_ejp_zip_stream(zip_file, output_dir):
+    """
+    transform ejp zip file and write a new zip file output, files are read from the
+    zip and written to the new zip without extracting them to a temporary folder,
+    only the article XML and new code zip files are kept in memory or spooled files
+    """
+    zip_file_name = zip_file.split(os.sep)[-1]
+    new_zip_file_path = os.path.join(output_dir, zip_file_name)
+
+    # profile the zip contents
+    zip_asset_infos = zip_lib.profile_zip(zip_file)
+    asset_file_names = [zip_asset_info.filename for zip_asset_info in zip_asset_infos]
+
+    # start logging
+    LOGGER.info("%s starting to transform", zip_file_name)
+
+    with contextlib.ExitStack() as stack:
+        open_source_zip = stack.enter_context(zipfile.ZipFile(zip_file, "r"))
+        open_source_file = stack.enter_context(open(zip_file, "rb"))
+
+        xml_asset_name = parse.article_xml_file_name(asset_file_names)
+        xml_string = open_source_zip.read(xml_asset_name).decode("utf-8")
+        document = ArticleDocument(identifier=zip_file_name, xml_string=xml_string)
+
+        # zip file names are used in place of file paths to find the code files
+        file_transformations = code_file_transformations(
+            document.root,
+            OrderedDict((file_name, file_name) for file_name in asset_file_names),
+            None,
+            zip_file_name,
+        )
+        xml_rewrite_file_tags(None, file_transformations, zip_file_name, document)
+        transform_xml(None, zip_file_name, document)
+
+        LOGGER.info("%s writing new zip file %s", zip_file_name, new_zip_file_path)
+        open_zip = stack.enter_context(
+            zipfile.ZipFile(
+                new_zip_file_path, "w", zipfile.ZIP_DEFLATED, allowZip64=True
+            )
+        )
+        transformed_file_names = {
+            from_file.zip_name for from_file, to_file in file_transformations
+        }
+        for zip_asset_info in zip_asset_infos:
+            if zip_asset_info.filename == xml_asset_name:
+                LOGGER.info(
+                    "%s writing xml to zip %s", zip_file_name, zip_asset_info.filename
+                )
+                open_zip.writestr(zip_asset_info.filename, document.to_string())
+            elif zip_asset_info.filename not in transformed_file_names:
+                zip_lib.copy_raw_member(open_source_file, zip_asset_info, open_zip)
+        # new code zip files are added after the other files, as done by rezip()
+        for from_file, to_file in file_transformations:
+            LOGGER.info(
+                "%s zipping from_file: %s, to_file: %s",
+                zip_file_name,
+                from_file,
+                to_file,
+            )
+            stream_code_file_zip(
+                open_source_zip,
+                open_source_zip.getinfo(from_file.zip_name),
+                to_file,
+                open_zip,
+            )
+
+    span = trace.current_span()
+    trace.count_file_size(span, "bytes_read", zip_file)
+    trace.count_file_size(span, "bytes_written", new_zip_file_path)
+    return new_zip_file_path
+
+
+def stream_code_file_zip(open_source_zip, zip_asset_info, to_file, open_zip):
+    "zip a code file read from the source zip and write the zip file to open_zip"
+    force_zip64 = zip_asset_info.file_size > zipfile.ZIP64_LIMIT
+    with tempfile.SpooledTemporaryFile(
+        max_size=zip_lib.SPOOLED_FILE_MAX_SIZE
+    ) as code_zip_file:
+        with zipfile.ZipFile(code_zip_file, "w", allowZip64=True) as code_zip:
+            code_zip_info = zipfile.ZipInfo(
+                zip_asset_info.filename, zip_asset_info.date_time
+            )
+            with open_source_zip.open(zip_asset_info) as open_file, code_zip.open(
+                code_zip_info, "w", force_zip64=force_zip64
+            ) as open_code_file:
+                shutil.copyfileobj(open_file, open_code_file)
+        code_zip_size = code_zip_file.tell()
+        code_zip_file.seek(0)
+        new_zip_info = zipfile.ZipInfo(to_file.zip_name, time.localtime()[:6])
+        new_zip_info.compress_type = zip_compress_type(to_file.zip_name)
+        with open_zip.open(
+            new_zip_info, "w", force_zip64=code_zip_size > zipfile.ZIP64_LIMIT
+        ) as open_new_file:
+            shutil.copyfileobj(code_zip_file, open_new_file)
+
+
+@trace.traced()
 def transform_ejp_files(asset_file_name_map, output_dir, identifier):
     "transform ejp files and XML"
     xml_asset = parse.article_xml_asset(asset_file_name_map)
     xml_asset_path = xml_asset[1]
 
+    # parse the XML once, each transformation modifies it in memory
+    document = ArticleDocument(xml_asset_path, identifier)
+
     new_asset_file_name_map = transform_code_files(
-        asset_file_name_map, output_dir, identifier
+        asset_file_name_map, output_dir, identifier, document
     )
 
-    transform_xml(xml_asset_path, identifier)
+    transform_xml(xml_asset_path, identifier, document)
+
+    # write the XML file once
+    document.write()
     return new_asset_file_name_map
 
 
-def transform_code_files(asset_file_name_map, output_dir, identifier):
-    "zip code files if they are not already a zip file"
+def transform_code_files(asset_file_name_map, output_dir, identifier, document=None):
+    """
+    zip code files if they are not already a zip file,
+    if document is supplied the XML changes are made to it and not written to disk
+    """
     # parse XML file
-    xml_asset = parse.article_xml_asset(asset_file_name_map)
-    xml_asset_path = xml_asset[1]
-    root = parse.parse_article_xml(xml_asset_path)
+    if document is not None:
+        xml_asset_path = document.xml_asset_path
+        root = document.root
+    else:
+        xml_asset = parse.article_xml_asset(asset_file_name_map)
+        xml_asset_path = xml_asset[1]
+        root = parse.parse_article_xml(xml_asset_path)
 
     file_transformations = code_file_transformations(
         root, asset_file_name_map, output_dir, identifier
@@ -78,21 +318,22 @@ def transform_code_files(asset_file_name_map, output_dir, identifier):
         asset_file_name_map, file_transformations
     )
 
-    xml_rewrite_file_tags(xml_asset_path, file_transformations, identifier)
+    xml_rewrite_file_tags(xml_asset_path, file_transformations, identifier, document)
     return new_asset_file_name_map
 
 
 def code_file_transformations(root, asset_file_name_map, output_dir, identifier):
-    # zip code files
+    "plan which code files to zip, returns a FileTransformPlan and does not zip files"
     code_files = code_file_list(root)
-    file_transformations = []
+    asset_index = zip_lib.AssetIndex(asset_file_name_map)
+    file_transformations = FileTransformPlan()
     for file_data in code_files:
         code_file_name = file_data.get("upload_file_nm")
 
         LOGGER.info("%s code_file_name: %s", identifier, code_file_name)
         # collect file name data
         original_code_file_name, original_code_file_path = find_in_file_name_map(
-            code_file_name, asset_file_name_map
+            code_file_name, asset_file_name_map, asset_index, identifier
         )
 
         from_file = ArticleZipFile(
@@ -100,7 +341,7 @@ def code_file_transformations(root, asset_file_name_map, output_dir, identifier)
         )
         LOGGER.info("%s from_file: %s", identifier, from_file)
 
-        to_file = zip_code_file(from_file, output_dir)
+        to_file = code_file_zip_to_file(from_file, output_dir)
         LOGGER.info("%s to_file: %s", identifier, to_file)
 
         # save the from file to file transformation
@@ -108,24 +349,37 @@ def code_file_transformations(root, asset_file_name_map, output_dir, identifier)
     return file_transformations
 
 
-def code_file_zip(file_transformations, output_dir, identifier):
+@trace.traced()
+def code_file_zip(file_transformations, output_dir, identifier, max_workers=None):
+    "zip the code files planned by code_file_transformations using max_workers threads"
+    if max_workers is None:
+        max_workers = CODE_FILE_ZIP_WORKERS
     for from_file, to_file in file_transformations:
         LOGGER.info(
             "%s zipping from_file: %s, to_file: %s", identifier, from_file, to_file
         )
-        to_file = zip_code_file(from_file, output_dir)
+    if not file_transformations:
+        return
+    trace.current_span().count("files", len(file_transformations))
+    with ThreadPoolExecutor(max_workers or 1) as executor:
+        futures = [
+            executor.submit(write_code_file_zip, from_file, to_file)
+            for from_file, to_file in file_transformations
+        ]
+    # raise any exception from zipping the files
+    for future in futures:
+        future.result()
 
 
-def cover_art_file_list(root):
+def cover_art_file_list(root, files=None):
     'get a list of cover_art from the XML with @file-type="cover_art"'
-    files = parse.file_list(root)
-    return [
-        file_data for file_data in files if file_data.get("file_type") == "cover_art"
-    ]
+    if files is None:
+        files = parse.file_list(root)
+    return parse.manifest_index(files).by_file_type("cover_art")
 
 
 def transform_cover_art_files(
-    xml_file_path, asset_file_name_map, file_transformations, identifier
+    xml_file_path, asset_file_name_map, file_transformations, identifier, document=None
 ):
     "rename cover art files"
     # create a new asset map
@@ -133,7 +387,7 @@ def transform_cover_art_files(
         asset_file_name_map, file_transformations
     )
 
-    xml_rewrite_file_tags(xml_file_path, file_transformations, identifier)
+    xml_rewrite_file_tags(xml_file_path, file_transformations, identifier, document)
     return new_asset_file_name_map
 
 
@@ -153,6 +407,7 @@ def striking_image_file_name(file_name, article_id, index):
 def cover_art_file_transformations(
     cover_art_files, asset_file_name_map, article_id, identifier
 ):
+    asset_index = zip_lib.AssetIndex(asset_file_name_map)
     file_transformations = []
     for index, cover_art_file in enumerate(cover_art_files):
         # list of old file names
@@ -161,7 +416,7 @@ def cover_art_file_transformations(
         LOGGER.info("%s cover_art file name: %s", identifier, previous_href)
         # collect file name data
         original_file_name, original_file_path = find_in_file_name_map(
-            previous_href, asset_file_name_map
+            previous_href, asset_file_name_map, asset_index, identifier
         )
 
         from_file = ArticleZipFile(
@@ -180,26 +435,51 @@ def cover_art_file_transformations(
     return file_transformations
 
 
-def xml_rewrite_file_tags(xml_asset_path, file_transformations, identifier):
-    root = parse.parse_article_xml(xml_asset_path)
+@trace.traced()
+def xml_rewrite_file_tags(
+    xml_asset_path, file_transformations, identifier, document=None
+):
+    "rewrite file tags in the XML, and write the file unless a document is supplied"
+    if document is not None:
+        root = document.root
+    else:
+        root = parse.parse_article_xml(xml_asset_path)
     # rewrite the XML tags
     LOGGER.info("%s rewriting xml tags", identifier)
+    trace.current_span().count("files", len(file_transformations))
     root = transform_xml_file_tags(root, file_transformations)
-    write_xml_file(root, xml_asset_path, identifier)
-
-
-def transform_xml(xml_asset_path, identifier):
-    "modify the XML"
+    if document is None:
+        write_xml_file(root, xml_asset_path, identifier)
+
+
+@trace.traced()
+def transform_xml(xml_asset_path, identifier, document=None, use_soup=False):
+    """
+    modify the XML, and write the file unless a document is supplied,
+    if use_soup is True values are read from the XML parsed by BeautifulSoup
+    """
+    if document is not None:
+        root = document.root
+    else:
+        root = parse.parse_article_xml(xml_asset_path)
     # remove history tags from XML for certain article types
-    root = parse.parse_article_xml(xml_asset_path)
-    soup = parser.parse_document(xml_asset_path)
+    soup = None
+    if use_soup:
+        if document is not None:
+            soup = document.soup()
+        else:
+            soup = parser.parse_document(xml_asset_path)
+    # read the values before the subject tags are changed
+    history_values = history_article_type_values(root, soup)
     root = transform_subject_tags(root, identifier)
     root = transform_kwd_tags(root, identifier)
-    root = transform_xml_history_tags(root, soup, identifier)
+    root = transform_xml_history_tags(root, soup, identifier, history_values)
     root = transform_xml_funding(root, identifier)
-    write_xml_file(root, xml_asset_path, identifier)
+    if document is None:
+        write_xml_file(root, xml_asset_path, identifier)
 
 
+@trace.traced()
 def write_xml_file(
     root,
     xml_asset_path,
@@ -224,6 +504,7 @@ def write_xml_file(
     LOGGER.info("%s writing xml to file %s", identifier, xml_asset_path)
     with open(xml_asset_path, "w") as open_file:
         open_file.write(xml_string)
+    trace.count_file_size(trace.current_span(), "bytes_written", xml_asset_path)
 
 
 def xml_element_to_string(
@@ -238,15 +519,14 @@ def xml_element_to_string(
     )
 
 
-def code_file_list(root):
+def code_file_list(root, files=None):
     "get a list of code files from the file tags in the ElementTree"
     code_files = []
 
-    files = parse.file_list(root)
+    if files is None:
+        files = parse.file_list(root)
 
-    aux_files = [
-        file_data for file_data in files if file_data.get("file_type") == "aux_file"
-    ]
+    aux_files = parse.manifest_index(files).by_file_type("aux_file")
 
     for file_data in aux_files:
         if file_data.get("upload_file_nm").endswith(".zip"):
@@ -257,28 +537,38 @@ def code_file_list(root):
     return code_files
 
 
-def find_in_file_name_map(file_name, file_name_map):
+def find_in_file_name_map(file_name, file_name_map, asset_index=None, identifier=None):
     "find the item in the map matching the file_name"
-    for asset_file_name, file_name_path in file_name_map.items():
-        if file_name_path.endswith(file_name):
-            return asset_file_name, file_name_path
-    return None, None
+    return zip_lib.asset_index(file_name_map, asset_index).find(file_name, identifier)
 
 
-def zip_code_file(from_file, output_dir):
-    "zip a code file and put new zip details into an ArticleZipFile struct"
+def code_file_zip_to_file(from_file, output_dir):
+    "details of the zip file for a code file in an ArticleZipFile struct"
     code_file_zip_name = from_file.zip_name + ".zip"
     new_code_file_name = from_file.xml_name + ".zip"
-    code_file_zip_path = os.path.join(output_dir, new_code_file_name)
+    code_file_zip_path = None
+    if output_dir is not None:
+        code_file_zip_path = os.path.join(output_dir, new_code_file_name)
+    return ArticleZipFile(new_code_file_name, code_file_zip_name, code_file_zip_path)
 
-    to_file = ArticleZipFile(new_code_file_name, code_file_zip_name, code_file_zip_path)
-
-    with zipfile.ZipFile(code_file_zip_path, "w") as open_zipfile:
-        open_zipfile.write(from_file.file_path, from_file.zip_name)
 
+def zip_code_file(from_file, output_dir):
+    "zip a code file and put new zip details into an ArticleZipFile struct"
+    to_file = code_file_zip_to_file(from_file, output_dir)
+    write_code_file_zip(from_file, to_file)
     return to_file
 
 
+@trace.traced()
+def write_code_file_zip(from_file, to_file):
+    "write the from_file code file into the to_file zip file"
+    with zipfile.ZipFile(to_file.file_path, "w") as open_zipfile:
+        open_zipfile.write(from_file.file_path, from_file.zip_name)
+    span = trace.current_span()
+    trace.count_file_size(span, "bytes_read", from_file.file_path)
+    trace.count_file_size(span, "bytes_written", to_file.file_path)
+
+
 def from_file_to_file_map(file_transformations):
     "convert a list of file transformations into a dict keyed on their xml file name"
     return {
@@ -336,10 +626,23 @@ def transform_xml_file_tags(root, file_transformations):
 KEEP_HISTORY_DATE_TYPES = ["sent-for-review"]
 
 
-def transform_xml_history_tags(root, soup, zip_file_name):
-    "remove history tags from the XML for particular article types"
-    article_type = parser.article_type(soup)
-    display_channel_list = parser.display_channel(soup)
+def history_article_type_values(root, soup=None):
+    "article type and list of display channels, read from the soup if it is supplied"
+    if soup is not None:
+        return parser.article_type(soup), parser.display_channel(soup)
+    return parse.xml_article_type(root), parse.xml_display_channel(root)
+
+
+def transform_xml_history_tags(root, soup, zip_file_name, history_values=None):
+    """
+    remove history tags from the XML for particular article types, history_values is
+    the article type and display channels from history_article_type_values() if they
+    were read before the XML was changed, otherwise they are read now from the root,
+    or from the soup if it is supplied
+    """
+    if history_values is None:
+        history_values = history_article_type_values(root, soup)
+    article_type, display_channel_list = history_values
     LOGGER.info(
         "%s article_type %s, display_channel %s",
         zip_file_name,
@@ -454,18 +757,118 @@ def transform_asset_file_name_map(asset_file_name_map, file_transformations):
     return new_asset_file_name_map
 
 
-def rezip(asset_file_name_map, output_dir, zip_file_name):
+@trace.traced()
+def rezip(
+    asset_file_name_map,
+    output_dir,
+    zip_file_name,
+    source_zip=None,
+    modified_file_names=None,
+):
     "write new zip file"
     new_zip_file_path = os.path.join(output_dir, zip_file_name)
     LOGGER.info("%s writing new zip file %s", zip_file_name, new_zip_file_path)
-    create_zip_from_file_map(new_zip_file_path, asset_file_name_map)
+    create_zip_from_file_map(
+        new_zip_file_path, asset_file_name_map, source_zip, modified_file_names
+    )
+    span = trace.current_span()
+    span.count("files", len(asset_file_name_map))
+    trace.count_file_size(span, "bytes_written", new_zip_file_path)
     return new_zip_file_path
 
 
-def create_zip_from_file_map(zip_path, file_name_map):
-    "write the files to a zip"
-    with zipfile.ZipFile(
-        zip_path, "w", zipfile.ZIP_DEFLATED, allowZip64=True
-    ) as open_zip:
-        for file_name, file_path in file_name_map.items():
-            open_zip.write(file_path, file_name)
+def zip_compress_type(file_name):
+    "compression for the file in a zip, based on the file extension"
+    if parse.file_extension(file_name) in ZIP_STORED_FILE_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def create_zip_from_file_map(
+    zip_path,
+    file_name_map,
+    source_zip=None,
+    modified_file_names=None,
+    max_workers=None,
+):
+    """
+    write the files to a zip, if source_zip is specified files which are in it and
+    not in modified_file_names are copied from it without compressing them again,
+    files are compressed by up to max_workers threads and written in order
+    """
+    if max_workers is None:
+        max_workers = ZIP_COMPRESSION_WORKERS
+    source_zip_infos = {}
+    if source_zip:
+        with zipfile.ZipFile(source_zip, "r") as open_source_zip:
+            source_zip_infos = open_source_zip.NameToInfo
+    modified_file_names = set(modified_file_names or [])
+    with contextlib.ExitStack() as stack:
+        open_source_file = None
+        if source_zip_infos:
+            open_source_file = stack.enter_context(open(source_zip, "rb"))
+        open_zip = stack.enter_context(
+            zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED, allowZip64=True)
+        )
+        executor = stack.enter_context(ThreadPoolExecutor(max_workers or 1))
+        # files waiting to be written, limited so compressed data is not all kept
+        pending = deque()
+        try:
+            for file_name, file_path in file_name_map.items():
+                zip_info = source_zip_infos.get(file_name)
+                if (
+                    zip_info
+                    and file_name not in modified_file_names
+                    and not zip_info.is_dir()
+                    # in case a file was changed without being listed as modified
+                    and os.path.getsize(file_path) == zip_info.file_size
+                ):
+                    pending.append((file_name, file_path, zip_info, None))
+                elif os.path.isdir(file_path):
+                    pending.append((file_name, file_path, None, None))
+                else:
+                    future = executor.submit(
+                        zip_lib.compress_file,
+                        file_path,
+                        file_name,
+                        zip_compress_type(file_name),
+                    )
+                    pending.append((file_name, file_path, None, future))
+                while len(pending) > (max_workers or 1) * 2:
+                    write_pending_zip_file(
+                        open_zip, open_source_file, *pending.popleft()
+                    )
+            while pending:
+                write_pending_zip_file(open_zip, open_source_file, *pending.popleft())
+        finally:
+            discard_pending_zip_files(pending)
+
+
+def discard_pending_zip_files(pending):
+    """
+    after a failure cancel the compression of the files not written to the zip, and
+    close the compressed data of those which were already compressed
+    """
+    for file_name, file_path, zip_info, future in pending:
+        if future is None or future.cancel():
+            continue
+        try:
+            new_zip_info, compressed_file = future.result()
+        except Exception:
+            continue
+        compressed_file.close()
+    pending.clear()
+
+
+def write_pending_zip_file(
+    open_zip, open_source_file, file_name, file_path, zip_info, future
+):
+    "write a file to the zip by copying it from the source zip or its compressed data"
+    if zip_info:
+        zip_lib.copy_raw_member(open_source_file, zip_info, open_zip)
+    elif future:
+        new_zip_info, compressed_file = future.result()
+        with compressed_file:
+            zip_lib.write_raw_member(open_zip, new_zip_info, compressed_file)
+    else:
+        open_zip.write(file_path, file_name)
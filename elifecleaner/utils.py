@@ -1,3 +1,4 @@
+import html.entities
 import re
 
 
@@ -51,6 +52,82 @@ def replace_control_characters(string):
     return string
 
 
+# match ascii control characters from decimal 0 to 31, except tab, newline and carriage return
+CONTROL_CHARACTER_MATCH_PATTERN = r"[\x00-\x08\x0b\x0c\x0e-\x1f]"
+
+# table for str.translate() to replace control characters
+CONTROL_CHARACTER_TRANSLATE_TABLE = {
+    code: CONTROL_CHARACTER_ENTITY_REPLACEMENT
+    for code in range(32)
+    if code not in [9, 10, 13]
+}
+
+# HTML entities which are not unescaped because they are XML special characters
+XML_ENTITY_NAMES = ["amp", "lt", "gt"]
+
+# one pattern to match HTML entities, control character entities, and control characters
+SANITIZE_XML_MATCH_PATTERN = re.compile(
+    r"&(?P<entity>[^\t\n\f <&#;]{1,32}?);|(?P<control_entity>%s)|(?P<control>%s)"
+    % (CONTROL_CHARACTER_ENTITY_MATCH_PATTERN, CONTROL_CHARACTER_MATCH_PATTERN)
+)
+
+
+class SanitizeResult:
+    "data structure recording what was changed in a string by sanitize_xml_string()"
+
+    def __init__(self):
+        self.entities = []
+        self.control_character_entities = []
+        self.control_characters = []
+
+    @property
+    def changed(self):
+        return bool(
+            self.entities or self.control_character_entities or self.control_characters
+        )
+
+    def __repr__(self):
+        return "SanitizeResult(%s, %s, %s)" % (
+            self.entities,
+            self.control_character_entities,
+            [ord(char) for char in self.control_characters],
+        )
+
+
+def sanitize_xml_string(string):
+    """
+    in a single pass over the string convert HTML entities to unicode characters,
+    except the XML special characters, and replace XML-incompatible control character
+    entities and control characters, returns the new string and a SanitizeResult
+    """
+    result = SanitizeResult()
+
+    def replace_match(match):
+        if match.group("entity") is not None:
+            entity_name = match.group("entity")
+            if (
+                entity_name in html.entities.entitydefs
+                and entity_name not in XML_ENTITY_NAMES
+            ):
+                result.entities.append(match.group(0))
+                return html.entities.entitydefs[entity_name]
+            # keep the entity but replace any control characters found in it
+            entity_string = match.group(0)
+            result.control_characters += [
+                char
+                for char in entity_string
+                if ord(char) in CONTROL_CHARACTER_TRANSLATE_TABLE
+            ]
+            return entity_string.translate(CONTROL_CHARACTER_TRANSLATE_TABLE)
+        if match.group("control_entity") is not None:
+            result.control_character_entities.append(match.group(0))
+        else:
+            result.control_characters.append(match.group(0))
+        return CONTROL_CHARACTER_ENTITY_REPLACEMENT
+
+    return SANITIZE_XML_MATCH_PATTERN.sub(replace_match, string), result
+
+
 def xlink_href(tag):
     "return the xlink:href attribute of the tag"
     return tag.get("{http://www.w3.org/1999/xlink}href")
@@ -1,6 +1,6 @@
 from collections import Counter, OrderedDict
 import re
-from elifecleaner import LOGGER
+from elifecleaner import LOGGER, parse
 from elifecleaner.utils import pad_msid
 
 JOURNAL = "elife"
@@ -24,11 +24,7 @@ IGNORE_TERM = "audio"
 
 def video_file_list(files):
     'get a list of file tags from the XML with @file-type="video"'
-    return [
-        file_data
-        for file_data in files
-        if isinstance(file_data, dict) and file_data.get("file_type") == "video"
-    ]
+    return parse.manifest_index(files).by_file_type("video")
 
 
 def collect_video_data(files):
@@ -128,10 +128,9 @@ def generate_xml(article, journal_data, video_data, pretty=True, indent=""):
 
 def glencoe_xml(xml_file_path, video_data, pretty=True, indent=""):
     "generate XML to be submitted to Glencoe"
-    # build an Article object from the XML
-    article, error_count = parse.article_from_xml(xml_file_path)
+    # build an Article object and the XML elementtree from the XML
+    article, error_count, root = parse.article_and_root_from_xml(xml_file_path)
     # collect journal data from the XML elementtree
-    root = parse.parse_article_xml(xml_file_path)
     journal_ids = parse.xml_journal_id_values(root)
     filtered_journal_ids = {
         key: value for key, value in journal_ids.items() if key in JOURNAL_ID_TYPES
@@ -0,0 +1,247 @@
+import base64
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from elifecleaner import disk_cache, LOGGER, trace
+
+# number of URLs to download at the same time
+WEB_CONTENT_WORKERS = 6
+
+# number of URLs to download at the same time from one host
+WEB_CONTENT_HOST_LIMIT = 3
+
+# number of times to try again after a failed request
+WEB_CONTENT_RETRIES = 2
+
+# seconds to wait before trying again, doubled after each try
+WEB_CONTENT_RETRY_DELAY = 0.5
+
+# seconds to wait for a response to one request
+WEB_CONTENT_TIMEOUT = 30
+
+# seconds allowed for downloading all the URLs, including retries
+WEB_CONTENT_TIMEOUT_BUDGET = 120
+
+# response status codes which are worth trying again
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+# directory for caching downloaded content by URL, None to disable
+WEB_CONTENT_CACHE_DIR = None
+# maximum size in bytes of the web content cache directory
+WEB_CONTENT_CACHE_MAX_SIZE = 64 * 1024 * 1024
+# seconds cached content is used without asking the server if it has changed
+WEB_CONTENT_CACHE_MAX_AGE = 24 * 60 * 60
+# if True only cached content is used and no requests are made
+WEB_CONTENT_OFFLINE = False
+
+
+# DiskCache instances by directory and maximum size, shared so the size of the
+# directory is not scanned again by each WebContentFetcher
+WEB_CONTENT_CACHES = {}
+WEB_CONTENT_CACHES_LOCK = threading.Lock()
+
+
+def web_content_cache():
+    "DiskCache for downloaded content, or None if caching is disabled"
+    if not WEB_CONTENT_CACHE_DIR:
+        return None
+    with WEB_CONTENT_CACHES_LOCK:
+        cache_settings = (WEB_CONTENT_CACHE_DIR, WEB_CONTENT_CACHE_MAX_SIZE)
+        if cache_settings not in WEB_CONTENT_CACHES:
+            WEB_CONTENT_CACHES[cache_settings] = disk_cache.DiskCache(*cache_settings)
+        return WEB_CONTENT_CACHES[cache_settings]
+
+
+def cache_entry_content(entry):
+    "the content bytes of a cache entry"
+    return base64.b64decode(entry.get("content"))
+
+
+class WebContentFetcher:
+    """
+    download the content of URLs using a pooled HTTP session, with a limit on the
+    requests to each host at the same time, retries, and a timeout for all of them
+    """
+
+    def __init__(
+        self,
+        user_agent=None,
+        max_workers=None,
+        host_limit=None,
+        retries=None,
+        timeout=None,
+        timeout_budget=None,
+        cache=None,
+        max_age=None,
+        offline=None,
+    ):
+        self.user_agent = user_agent
+        self.max_workers = max_workers or WEB_CONTENT_WORKERS
+        self.host_limit = host_limit or WEB_CONTENT_HOST_LIMIT
+        self.retries = WEB_CONTENT_RETRIES if retries is None else retries
+        self.timeout = timeout or WEB_CONTENT_TIMEOUT
+        self.timeout_budget = timeout_budget or WEB_CONTENT_TIMEOUT_BUDGET
+        self.cache = cache if cache is not None else web_content_cache()
+        self.max_age = WEB_CONTENT_CACHE_MAX_AGE if max_age is None else max_age
+        self.offline = WEB_CONTENT_OFFLINE if offline is None else offline
+        self.deadline = None
+        self.host_semaphores = {}
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.max_workers, pool_maxsize=self.max_workers
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __repr__(self):
+        return "WebContentFetcher(%s workers, %s per host)" % (
+            self.max_workers,
+            self.host_limit,
+        )
+
+    def host_semaphore(self, url):
+        "semaphore limiting the requests at the same time to the host of the url"
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.host_semaphores:
+                self.host_semaphores[host] = threading.BoundedSemaphore(self.host_limit)
+            return self.host_semaphores[host]
+
+    def remaining_time(self, url):
+        "seconds left in the timeout budget, raise Timeout if there are none"
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise requests.exceptions.Timeout(
+                "Timeout budget of %s seconds exceeded before GET %s"
+                % (self.timeout_budget, url)
+            )
+        return remaining
+
+    def cache_entry(self, url):
+        "the cache entry for the url, or None if it is not cached"
+        if self.cache is None:
+            return None
+        return self.cache.get(disk_cache.string_sha256(url))
+
+    def save_cache_entry(self, url, response):
+        "save the response content and validators in the cache"
+        if self.cache is None:
+            return
+        self.cache.set(
+            disk_cache.string_sha256(url),
+            {
+                "url": url,
+                "content": base64.b64encode(response.content).decode("ascii"),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "time": time.time(),
+            },
+        )
+
+    def is_fresh(self, entry):
+        "check if the cache entry can be used without asking the server"
+        if self.offline:
+            return True
+        return bool(self.max_age) and time.time() - entry.get("time", 0) < self.max_age
+
+    def get(self, url):
+        "content of the url, or None if the response status is not 200"
+        entry = self.cache_entry(url)
+        if entry is not None and self.is_fresh(entry):
+            LOGGER.info("Using cached content for GET %s", url)
+            return cache_entry_content(entry)
+        if self.offline:
+            LOGGER.info("No cached content for GET %s in offline mode", url)
+            return None
+        headers = {}
+        if self.user_agent:
+            headers["user-agent"] = self.user_agent
+        if entry is not None and entry.get("etag"):
+            headers["If-None-Match"] = entry.get("etag")
+        if entry is not None and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry.get("last_modified")
+        response = self.request(url, headers or None)
+        if response.status_code == 304 and entry is not None:
+            LOGGER.info("Cached content is not modified for GET %s", url)
+            self.cache.update(disk_cache.string_sha256(url), {"time": time.time()})
+            return cache_entry_content(entry)
+        if response.status_code == 200:
+            self.save_cache_entry(url, response)
+            return response.content
+        LOGGER.info("Status code %s for GET %s", response.status_code, url)
+        return None
+
+    def request(self, url, headers=None):
+        "GET the url, trying again after a failure, and return the last response"
+        delay = WEB_CONTENT_RETRY_DELAY
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            timeout = min(self.timeout, self.remaining_time(url))
+            try:
+                with self.host_semaphore(url):
+                    response = self.session.get(url, headers=headers, timeout=timeout)
+            except (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+            ) as exception:
+                if last_attempt:
+                    raise
+                LOGGER.info("Retrying GET %s after exception %s", url, exception)
+            else:
+                LOGGER.info("GET %s", url)
+                if last_attempt or response.status_code not in RETRY_STATUS_CODES:
+                    return response
+                LOGGER.info(
+                    "Retrying GET %s after status code %s", url, response.status_code
+                )
+            time.sleep(min(delay, self.remaining_time(url)))
+            delay *= 2
+        return response
+
+    @trace.traced()
+    def fetch(self, urls):
+        "list of the content of each url, in the same order as urls"
+        self.deadline = time.monotonic() + self.timeout_budget
+        unique_urls = list(dict.fromkeys(urls))
+        with ThreadPoolExecutor(
+            min(self.max_workers, len(unique_urls)) or 1
+        ) as executor:
+            contents = dict(zip(unique_urls, executor.map(self.get, unique_urls)))
+        span = trace.current_span()
+        span.count("files", len(unique_urls))
+        span.count(
+            "bytes_read", sum(len(content) for content in contents.values() if content)
+        )
+        return [contents.get(url) for url in urls]
+
+    def close(self):
+        "close the connections of the HTTP session"
+        self.session.close()
+
+
+def fetch_web_content(urls, user_agent=None, **kwargs):
+    "download the content of the URLs at the same time, in the same order as urls"
+    fetcher = WebContentFetcher(user_agent, **kwargs)
+    try:
+        return fetcher.fetch(urls)
+    finally:
+        fetcher.close()
+
+
+def populate_docmap_content(content_json, user_agent=None, **kwargs):
+    "get web-content url content and add the HTML to the data structure"
+    content_items = [
+        content_item for content_item in content_json if content_item.get("web-content")
+    ]
+    contents = fetch_web_content(
+        [content_item.get("web-content") for content_item in content_items],
+        user_agent=user_agent,
+        **kwargs
+    )
+    for content_item, content in zip(content_items, contents):
+        content_item["html"] = content
+    return content_json
@@ -1,6 +1,36 @@
+import copy
 import os
+import shutil
+import struct
+import tempfile
+import threading
 import zipfile
+import zlib
 from collections import OrderedDict
+from collections.abc import Mapping
+from elifecleaner import LOGGER, trace
+
+# zip local file header, see section 4.3.7 of the zip file format APPNOTE.TXT
+LOCAL_FILE_HEADER_STRUCT = struct.Struct("<4s2B4HL2L2H")
+LOCAL_FILE_HEADER_SIGNATURE = b"PK\x03\x04"
+# general purpose flag bit meaning sizes and CRC are in a data descriptor after the data
+DATA_DESCRIPTOR_FLAG = 0x08
+# extra field header id of zip64 sizes and offsets
+ZIP64_EXTRA_HEADER_ID = 0x0001
+# bytes to read at a time when copying compressed data between zip files
+COPY_BLOCK_SIZE = 1024 * 1024
+# compressed data larger than this many bytes is kept in a file instead of in memory
+SPOOLED_FILE_MAX_SIZE = 16 * 1024 * 1024
+# internal ZipFile attributes used to write already compressed data, if one is
+# missing the data is decompressed and written using ZipFile.open() instead
+ZIPFILE_RAW_WRITE_ATTRIBUTES = (
+    "_writecheck",
+    "_didModify",
+    "fp",
+    "start_dir",
+    "filelist",
+    "NameToInfo",
+)
 
 
 def profile_zip(file_name):
@@ -14,26 +44,315 @@ def profile_zip(file_name):
     return zip_asset_infos
 
 
+def asset_file_path(zip_file_name, temp_dir):
+    "local path of a zip member after it is extracted to temp_dir"
+    file_name_parts = zip_file_name.split("/")
+    folder_name = ""
+    if len(file_name_parts) > 1:
+        folder_name = file_name_parts[-2]
+    return os.path.join(temp_dir, folder_name, file_name_parts[-1])
+
+
+def extract_asset(open_zipfile, zip_asset_info, temp_dir):
+    "extract the zip member to temp_dir and return its local path"
+    file_name_parts = zip_asset_info.filename.split("/")
+    if len(file_name_parts) > 1:
+        folder_path = os.path.join(temp_dir, file_name_parts[-2])
+        if not os.path.exists(folder_path):
+            os.makedirs(folder_path, exist_ok=True)
+    open_zipfile.extract(zip_asset_info, path=temp_dir)
+    return asset_file_path(zip_asset_info.filename, temp_dir)
+
+
+@trace.traced()
 def unzip_zip(file_name, temp_dir):
     "unzip certain files and return the local paths"
     asset_file_name_map = OrderedDict()
     zip_asset_infos = profile_zip(file_name)
+    span = trace.current_span()
+    trace.count_file_size(span, "bytes_read", file_name)
 
     # extract the files
     with zipfile.ZipFile(file_name, "r") as open_zipfile:
         for zip_asset_info in zip_asset_infos:
-            file_name_parts = zip_asset_info.filename.split("/")
-            file_name = file_name_parts[-1]
-            folder_name = ""
-            if len(file_name_parts) > 1:
-                folder_name = file_name_parts[-2]
-                folder_path = os.path.join(temp_dir, folder_name)
-                if not os.path.exists(folder_path):
-                    os.mkdir(folder_path)
-            asset_file_name = os.path.join(temp_dir, folder_name, file_name)
-            # extract the file
-            open_zipfile.extract(zip_asset_info, path=temp_dir)
-            # record the file path in the map
-            asset_file_name_map[zip_asset_info.filename] = asset_file_name
+            # extract the file and record the file path in the map
+            asset_file_name_map[zip_asset_info.filename] = extract_asset(
+                open_zipfile, zip_asset_info, temp_dir
+            )
+            span.count("files")
+            span.count("bytes_written", zip_asset_info.file_size)
 
     return asset_file_name_map
+
+
+class LazyZipMap(Mapping):
+    """
+    read-only map of zip member names to local file paths, like the map returned by
+    unzip_zip(), but the zip central directory is read once and a member is only
+    extracted to temp_dir when its path is requested, use open() to read a member
+    without extracting it, and close() when done
+    """
+
+    def __init__(self, file_name, temp_dir):
+        self.file_name = file_name
+        self.temp_dir = temp_dir
+        self.zip_asset_infos = OrderedDict(
+            (zip_asset_info.filename, zip_asset_info)
+            for zip_asset_info in profile_zip(file_name)
+        )
+        self.extracted = {}
+        self._open_zipfile = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return 'LazyZipMap("%s", "%s")' % (self.file_name, self.temp_dir)
+
+    @property
+    def open_zipfile(self):
+        "the open ZipFile, opened the first time it is needed"
+        if self._open_zipfile is None:
+            self._open_zipfile = zipfile.ZipFile(self.file_name, "r")
+        return self._open_zipfile
+
+    def __getitem__(self, zip_file_name):
+        "extract the member if it is not already extracted and return its local path"
+        with self._lock:
+            if zip_file_name not in self.extracted:
+                self.extracted[zip_file_name] = extract_asset(
+                    self.open_zipfile,
+                    self.zip_asset_infos[zip_file_name],
+                    self.temp_dir,
+                )
+            return self.extracted[zip_file_name]
+
+    def __contains__(self, zip_file_name):
+        return zip_file_name in self.zip_asset_infos
+
+    def __iter__(self):
+        return iter(self.zip_asset_infos)
+
+    def __len__(self):
+        return len(self.zip_asset_infos)
+
+    def file_path(self, zip_file_name):
+        "local path of the member once extracted, without extracting it"
+        return asset_file_path(zip_file_name, self.temp_dir)
+
+    def open(self, zip_file_name):
+        "open the member for reading as a file-like object without extracting it"
+        return self.open_zipfile.open(self.zip_asset_infos[zip_file_name])
+
+    def close(self):
+        if self._open_zipfile is not None:
+            self._open_zipfile.close()
+            self._open_zipfile = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class AssetIndex:
+    """
+    index of an asset_file_name_map from unzip_zip() for finding a file by name, a
+    file matches if its path ends with the name, the same as checking each path with
+    endswith, and if more than one file matches the first one in the map is used
+    """
+
+    def __init__(self, asset_file_name_map=None):
+        self.asset_file_name_map = (
+            asset_file_name_map if asset_file_name_map is not None else OrderedDict()
+        )
+        # file names of the zip members, without folder names
+        self.zip_file_names = [
+            asset_file_name.split("/")[-1]
+            for asset_file_name in self.asset_file_name_map
+        ]
+        self.zip_file_name_set = set(self.zip_file_names)
+        # map of each suffix of a file path base name to the asset file names
+        self.suffix_map = {}
+        for asset_file_name, file_path in self.file_paths():
+            base_name = file_path.split("/")[-1]
+            for index in range(len(base_name)):
+                self.suffix_map.setdefault(base_name[index:], []).append(
+                    asset_file_name
+                )
+
+    def __repr__(self):
+        return "AssetIndex(%s files)" % len(self.asset_file_name_map)
+
+    def file_path(self, asset_file_name):
+        "file path of the asset file name, a LazyZipMap member is not extracted"
+        if isinstance(self.asset_file_name_map, LazyZipMap):
+            return self.asset_file_name_map.file_path(asset_file_name)
+        return self.asset_file_name_map.get(asset_file_name)
+
+    def file_paths(self):
+        "list of asset file names and file paths, a LazyZipMap is not extracted"
+        return [
+            (asset_file_name, self.file_path(asset_file_name))
+            for asset_file_name in self.asset_file_name_map
+        ]
+
+    def find_all(self, file_name):
+        "list of asset file names whose file path ends with file_name"
+        if not file_name or "/" in file_name:
+            # names which can span folders are not indexed
+            return [
+                asset_file_name
+                for asset_file_name, file_path in self.file_paths()
+                if file_path.endswith(file_name)
+            ]
+        return list(self.suffix_map.get(file_name, []))
+
+    def find(self, file_name, identifier=None, extract=True):
+        """
+        return the asset file name and file path of the first file path ending with
+        file_name, or None, None if not found, if extract is False a LazyZipMap
+        member is not extracted
+        """
+        matches = self.find_all(file_name)
+        if not matches:
+            return None, None
+        if len(matches) > 1:
+            LOGGER.warning(
+                "%s file name %s matches more than one file, using %s, other matches: %s",
+                identifier,
+                file_name,
+                matches[0],
+                matches[1:],
+            )
+        if not extract:
+            return matches[0], self.file_path(matches[0])
+        return matches[0], self.asset_file_name_map.get(matches[0])
+
+
+def asset_index(asset_file_name_map, index=None):
+    "return index if it is supplied, otherwise build an AssetIndex for the map"
+    if index is not None:
+        return index
+    return AssetIndex(asset_file_name_map)
+
+
+def strip_zip64_extra(extra):
+    "remove zip64 extra fields, they are added again when a header is written"
+    stripped = b""
+    position = 0
+    while position + 4 <= len(extra):
+        header_id, data_size = struct.unpack("<HH", extra[position : position + 4])
+        field_end = position + 4 + data_size
+        if header_id != ZIP64_EXTRA_HEADER_ID:
+            stripped += extra[position:field_end]
+        position = field_end
+    return stripped
+
+
+def raw_member_offset(open_file, zip_info):
+    "position in the open zip file of the compressed data of the member"
+    open_file.seek(zip_info.header_offset)
+    header = open_file.read(LOCAL_FILE_HEADER_STRUCT.size)
+    if len(header) != LOCAL_FILE_HEADER_STRUCT.size:
+        raise zipfile.BadZipFile(
+            "Truncated local file header for %s" % zip_info.filename
+        )
+    fields = LOCAL_FILE_HEADER_STRUCT.unpack(header)
+    if fields[0] != LOCAL_FILE_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile("Bad local file header for %s" % zip_info.filename)
+    # skip the file name and extra field which follow the fixed size header
+    return (
+        zip_info.header_offset + LOCAL_FILE_HEADER_STRUCT.size + fields[10] + fields[11]
+    )
+
+
+def raw_write_supported(open_zip):
+    "check if the ZipFile has the internal attributes used by write_raw_member()"
+    return all(hasattr(open_zip, name) for name in ZIPFILE_RAW_WRITE_ATTRIBUTES)
+
+
+def write_raw_member(open_zip, zip_info, open_file):
+    """
+    write a member to the ZipFile open_zip opened for writing, the zip_info must have
+    its sizes and CRC set, and zip_info.compress_size bytes of already compressed
+    data are read from open_file starting at its current position
+    """
+    if not raw_write_supported(open_zip):
+        LOGGER.info(
+            "Writing %s using ZipFile.open(), the ZipFile internals are missing",
+            zip_info.filename,
+        )
+        # decompress and compress again in blocks, ZipExtFile reads any compression
+        # type supported by zipfile and checks the CRC
+        new_zip_info = copy.copy(zip_info)
+        with zipfile.ZipExtFile(open_file, "r", zip_info) as open_member:
+            with open_zip.open(new_zip_info, "w") as open_new_member:
+                shutil.copyfileobj(open_member, open_new_member, COPY_BLOCK_SIZE)
+        return new_zip_info
+    zip64 = (
+        zip_info.file_size > zipfile.ZIP64_LIMIT
+        or zip_info.compress_size > zipfile.ZIP64_LIMIT
+    )
+    # write using the same ZipFile attributes as ZipFile.write() so the
+    # central directory is written when open_zip is closed
+    open_zip._writecheck(zip_info)
+    open_zip._didModify = True
+    open_zip.fp.seek(open_zip.start_dir)
+    zip_info.header_offset = open_zip.fp.tell()
+    open_zip.fp.write(zip_info.FileHeader(zip64))
+    remaining = zip_info.compress_size
+    while remaining > 0:
+        block = open_file.read(min(remaining, COPY_BLOCK_SIZE))
+        if not block:
+            raise zipfile.BadZipFile("Truncated data for %s" % zip_info.filename)
+        open_zip.fp.write(block)
+        remaining -= len(block)
+    open_zip.filelist.append(zip_info)
+    open_zip.NameToInfo[zip_info.filename] = zip_info
+    open_zip.start_dir = open_zip.fp.tell()
+    return zip_info
+
+
+def copy_raw_member(open_file, zip_info, open_zip):
+    """
+    copy the compressed data and CRC of a member from the open source zip file to the
+    ZipFile open_zip opened for writing, without decompressing and compressing it again
+    """
+    new_zip_info = copy.copy(zip_info)
+    # sizes are written in the local header so there is no data descriptor
+    new_zip_info.flag_bits &= ~DATA_DESCRIPTOR_FLAG
+    new_zip_info.extra = strip_zip64_extra(zip_info.extra)
+    open_file.seek(raw_member_offset(open_file, zip_info))
+    return write_raw_member(open_zip, new_zip_info, open_file)
+
+
+@trace.traced()
+def compress_file(file_path, file_name, compress_type=zipfile.ZIP_DEFLATED):
+    """
+    compress the file for adding to a zip as file_name, return a ZipInfo with its
+    sizes and CRC set, and a temporary file holding the compressed data
+    """
+    zip_info = zipfile.ZipInfo.from_file(file_path, file_name)
+    zip_info.compress_type = compress_type
+    compressor = None
+    if compress_type == zipfile.ZIP_DEFLATED:
+        # the same compressor settings as ZipFile
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    compressed_file = tempfile.SpooledTemporaryFile(max_size=SPOOLED_FILE_MAX_SIZE)
+    crc = 0
+    file_size = 0
+    with open(file_path, "rb") as open_file:
+        for block in iter(lambda: open_file.read(COPY_BLOCK_SIZE), b""):
+            crc = zlib.crc32(block, crc)
+            file_size += len(block)
+            compressed_file.write(compressor.compress(block) if compressor else block)
+    if compressor:
+        compressed_file.write(compressor.flush())
+    zip_info.CRC = crc
+    zip_info.file_size = file_size
+    zip_info.compress_size = compressed_file.tell()
+    compressed_file.seek(0)
+    span = trace.current_span()
+    span.count("bytes_read", file_size)
+    span.count("bytes_written", zip_info.compress_size)
+    return zip_info, compressed_file
@@ -19,8 +19,12 @@ setup(
         "elifearticle>=0.20.0",
         "jatsgenerator>=0.16.0",
         "PyYAML>=5.4.1",
+        "requests",
         "wand >= 0.5.2",
     ],
+    entry_points={
+        "console_scripts": ["elifecleaner-batch=elifecleaner.batch:main"],
+    },
     url="https://github.com/elifesciences/elife-cleaner",
     maintainer="eLife Sciences Publications Ltd.",
     maintainer_email="tech-team@elifesciences.org",
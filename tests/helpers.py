@@ -1,6 +1,7 @@
 import io
 import os
 import importlib
+import zlib
 
 
 def delete_files_in_folder(folder, filter_out=None):
@@ -63,6 +64,62 @@ def sub_article_xml_fixture(
     )
 
 
+def pdf_fixture(page_count, xref_stream=False):
+    """
+    generate bytes of a minimal PDF file with blank pages, the objects are listed in a
+    cross-reference table, or if xref_stream is True, they are compressed in an object
+    stream and listed in a cross-reference stream
+    """
+    kids = " ".join(["%s 0 R" % (number + 3) for number in range(page_count)])
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids.encode(), page_count),
+    ] + [b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>"] * page_count
+    pdf = b"%PDF-1.5\n"
+    if not xref_stream:
+        offsets = []
+        for number, pdf_object in enumerate(objects, 1):
+            offsets.append(len(pdf))
+            pdf += b"%d 0 obj\n%s\nendobj\n" % (number, pdf_object)
+        startxref = len(pdf)
+        pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        for offset in offsets:
+            pdf += b"%010d 00000 n \n" % offset
+        pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\n" % (len(objects) + 1)
+    else:
+        # put all the objects in an object stream
+        header = b""
+        body = b""
+        for index, pdf_object in enumerate(objects):
+            header += b"%d %d " % (index + 1, len(body))
+            body += pdf_object + b"\n"
+        stream = zlib.compress(header + body)
+        object_stream_number = len(objects) + 1
+        object_stream_offset = len(pdf)
+        pdf += (
+            b"%d 0 obj\n<< /Type /ObjStm /N %d /First %d /Filter /FlateDecode"
+            b" /Length %d >>\nstream\n%s\nendstream\nendobj\n"
+            % (object_stream_number, len(objects), len(header), len(stream), stream)
+        )
+        # cross-reference stream entries, each 1 byte type, 4 bytes, 2 bytes
+        xref_number = object_stream_number + 1
+        startxref = len(pdf)
+        entries = b"\x00\x00\x00\x00\x00\xff\xff"
+        for index in range(len(objects)):
+            entries += b"\x02" + object_stream_number.to_bytes(4, "big")
+            entries += index.to_bytes(2, "big")
+        entries += b"\x01" + object_stream_offset.to_bytes(4, "big") + b"\x00\x00"
+        entries += b"\x01" + startxref.to_bytes(4, "big") + b"\x00\x00"
+        stream = zlib.compress(entries)
+        pdf += (
+            b"%d 0 obj\n<< /Type /XRef /Size %d /W [1 4 2] /Root 1 0 R"
+            b" /Filter /FlateDecode /Length %d >>\nstream\n%s\nendstream\nendobj\n"
+            % (xref_number, xref_number + 1, len(stream), stream)
+        )
+    pdf += b"startxref\n%d\n%%%%EOF\n" % startxref
+    return pdf
+
+
 class FakeRequest:
     def __init__(self):
         self.headers = {}
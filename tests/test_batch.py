@@ -0,0 +1,187 @@
+import json
+import os
+import unittest
+import zipfile
+from mock import patch
+from elifecleaner import batch, parse
+from tests.helpers import delete_files_in_folder
+
+
+class TestZipFileList(unittest.TestCase):
+    def test_zip_file_list(self):
+        paths = ["tests/test_data", "tests/other/test.zip"]
+        zip_files = batch.zip_file_list(paths)
+        self.assertTrue("tests/test_data/08-11-2020-FA-eLife-64719.zip" in zip_files)
+        self.assertEqual(zip_files[-1], "tests/other/test.zip")
+        self.assertEqual(
+            [zip_file for zip_file in zip_files if not zip_file.endswith(".zip")], []
+        )
+
+
+class TestRunJob(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+        self.output_dir = "tests/tmp_output"
+        self.zip_file = "tests/test_data/08-11-2020-FA-eLife-64719.zip"
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+        delete_files_in_folder(self.output_dir, filter_out=[".keepme"])
+
+    def test_run_job_check(self):
+        result = batch.run_job(self.zip_file, "check", tmp_dir=self.temp_dir)
+        self.assertEqual(result["zip_file"], self.zip_file)
+        self.assertEqual(result["status"], "ok")
+        self.assertEqual(result["result"], [])
+        self.assertTrue(result["duration"] >= 0)
+        self.assertEqual(result["warnings"], [])
+        # the job folder is removed
+        self.assertEqual(os.listdir(self.temp_dir), [".keepme"])
+
+    def test_run_job_check_warnings(self):
+        "warnings logged by the checks are collected"
+        zip_file = os.path.join(self.output_dir, "test_missing_file.zip")
+        with zipfile.ZipFile(self.zip_file, "r") as input_zipfile:
+            with zipfile.ZipFile(zip_file, "w") as output_zipfile:
+                for zip_info in input_zipfile.infolist():
+                    if not zip_info.filename.endswith(".docx"):
+                        output_zipfile.writestr(
+                            zip_info, input_zipfile.read(zip_info.filename)
+                        )
+        result = batch.run_job(zip_file, "check", tmp_dir=self.temp_dir)
+        self.assertEqual(
+            result["warnings"],
+            [
+                (
+                    "test_missing_file.zip does not contain a file in the manifest: "
+                    "eLife64719_template5.docx"
+                )
+            ],
+        )
+        self.assertEqual(
+            [
+                (check_result["code"], check_result["file_name"])
+                for check_result in result["result"]
+            ],
+            [(parse.CHECK_MISSING_FILE, "eLife64719_template5.docx")],
+        )
+
+    def test_run_job_memory_profile(self):
+        result = batch.run_job(
+            self.zip_file, "check", tmp_dir=self.temp_dir, memory_profile=True
+        )
+        self.assertEqual(result["status"], "ok")
+        self.assertTrue(result["memory"]["peak"] > 0)
+        self.assertTrue("parse.check_ejp_zip" in result["memory"]["stages"])
+        json.dumps(result)
+
+    def test_run_job_transform(self):
+        result = batch.run_job(
+            self.zip_file, "transform", self.output_dir, tmp_dir=self.temp_dir
+        )
+        self.assertEqual(result["status"], "ok")
+        self.assertEqual(
+            result["result"],
+            os.path.join(self.output_dir, "08-11-2020-FA-eLife-64719.zip"),
+        )
+        with zipfile.ZipFile(result["result"], "r") as open_zipfile:
+            self.assertEqual(len(open_zipfile.namelist()), 5)
+        self.assertEqual(os.listdir(self.temp_dir), [".keepme"])
+
+    @patch.object(parse, "check_ejp_zip")
+    def test_run_job_error(self, mock_check_ejp_zip):
+        mock_check_ejp_zip.side_effect = Exception("An exception")
+        result = batch.run_job(self.zip_file, "check", tmp_dir=self.temp_dir)
+        self.assertEqual(result["status"], "error")
+        self.assertEqual(result["error"], "Exception: An exception")
+        self.assertEqual(result["warnings"], [])
+
+
+class TestRunBatch(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+        self.zip_files = [
+            "tests/test_data/08-11-2020-FA-eLife-64719.zip",
+            "tests/test_data/not_a_file.zip",
+        ]
+        self.report_file = os.path.join(self.temp_dir, "report.jsonl")
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    def test_run_batch(self):
+        results = batch.run_batch(
+            self.zip_files,
+            tmp_dir=self.temp_dir,
+            report_file=self.report_file,
+        )
+        self.assertEqual([result["status"] for result in results], ["ok", "error"])
+        with open(self.report_file, "r") as open_file:
+            report = [json.loads(line) for line in open_file]
+        self.assertEqual(report, results)
+
+    def test_run_batch_workers(self):
+        "results from a process pool are in the same order as the zip files"
+        results = batch.run_batch(
+            self.zip_files + self.zip_files,
+            tmp_dir=self.temp_dir,
+            max_workers=2,
+        )
+        self.assertEqual(
+            [result["zip_file"] for result in results], self.zip_files + self.zip_files
+        )
+        self.assertEqual(
+            [result["status"] for result in results], ["ok", "error", "ok", "error"]
+        )
+
+    def test_run_batch_transform_no_output_dir(self):
+        with self.assertRaises(ValueError):
+            batch.run_batch(self.zip_files, action="transform")
+
+    @patch.object(batch, "run_job")
+    def test_run_batch_transform_duplicate_file_names(self, mock_run_job):
+        "zip files with the same file name would overwrite each other in output_dir"
+        zip_files = self.zip_files + ["tests/other/08-11-2020-FA-eLife-64719.zip"]
+        with self.assertRaises(ValueError) as context:
+            batch.run_batch(zip_files, action="transform", output_dir=self.temp_dir)
+        self.assertEqual(
+            str(context.exception),
+            "zip files to transform have the same file names: "
+            "08-11-2020-FA-eLife-64719.zip",
+        )
+        self.assertEqual(mock_run_job.call_count, 0)
+
+    def test_duplicate_file_names(self):
+        self.assertEqual(batch.duplicate_file_names(self.zip_files), [])
+        self.assertEqual(
+            batch.duplicate_file_names(["a/1.zip", "b/2.zip", "c/1.zip", "d/1.zip"]),
+            ["1.zip"],
+        )
+
+
+class TestMain(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+        self.report_file = os.path.join(self.temp_dir, "report.jsonl")
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    @patch("builtins.print")
+    def test_main(self, mock_print):
+        args = [
+            "tests/test_data/08-11-2020-FA-eLife-64719.zip",
+            "--tmp-dir",
+            self.temp_dir,
+            "--report",
+            self.report_file,
+        ]
+        self.assertEqual(batch.main(args), 0)
+        mock_print.assert_called_with("1 zip files, 0 errors, 0 warnings")
+        with open(self.report_file, "r") as open_file:
+            self.assertEqual(len(open_file.readlines()), 1)
+
+    @patch("builtins.print")
+    def test_main_error(self, mock_print):
+        args = ["tests/test_data/not_a_file.zip", "--tmp-dir", self.temp_dir]
+        self.assertEqual(batch.main(args), 1)
@@ -0,0 +1,140 @@
+import json
+import os
+import unittest
+from mock import patch
+from elifecleaner import parse, pdf_utils
+from benchmarks import generate, run
+from tests.helpers import delete_files_in_folder
+
+SMALL_SPEC = generate.spec(
+    figures=3,
+    pdf_figures=1,
+    pdf_pages=2,
+    videos=1,
+    code_files=1,
+    paragraphs=5,
+    sub_articles=2,
+    sub_article_paragraphs=2,
+    sub_article_figures=1,
+    sub_article_tables=1,
+    sub_article_equations=1,
+    file_size=100,
+)
+
+
+class TestGenerate(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    def test_spec(self):
+        self.assertEqual(generate.spec()["figures"], generate.DEFAULT_SPEC["figures"])
+        self.assertEqual(generate.spec(figures=1)["figures"], 1)
+        with self.assertRaises(KeyError):
+            generate.spec(not_a_key=1)
+
+    def test_package_files_pdf(self):
+        "the PDF figures have the number of pages in the spec"
+        pdf_figures = [
+            content
+            for file_type, file_name, meta, content in generate.package_files(
+                SMALL_SPEC
+            )
+            if file_type == "figure" and file_name.endswith(".pdf")
+        ]
+        self.assertEqual(len(pdf_figures), 1)
+        pdf_path = os.path.join(self.temp_dir, "test.pdf")
+        with open(pdf_path, "wb") as open_file:
+            open_file.write(pdf_figures[0])
+        self.assertEqual(pdf_utils.pdf_page_count(pdf_path), 2)
+
+    @patch.object(pdf_utils, "pdfimages_exists")
+    def test_generate_zip(self, mock_pdfimages_exists):
+        "the manifest lists the files in the zip, the PDF figure has two pages"
+        mock_pdfimages_exists.return_value = False
+        zip_file = generate.generate_zip(self.temp_dir, SMALL_SPEC)
+        report = parse.check_ejp_zip(zip_file, self.temp_dir, log=False)
+        self.assertEqual(
+            [check_result.code for check_result in report],
+            [parse.CHECK_MULTI_PAGE_FIGURE_PDF],
+        )
+
+    def test_sub_article_data(self):
+        data = generate.sub_article_data(SMALL_SPEC)
+        self.assertEqual(len(data), 2)
+        self.assertEqual(data[0]["article"].article_type, "editor-report")
+        self.assertEqual(len(data[1]["xml_root"].findall("body/p")), 8)
+
+
+class TestRun(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    def test_run_benchmarks(self):
+        result = run.run_benchmarks(SMALL_SPEC, repeat=1, work_dir=self.temp_dir)
+        self.assertEqual(
+            list(result["results"]),
+            [
+                "check_ejp_zip",
+                "transform_ejp_zip",
+                "sub_article.generate",
+                "assessment_terms.add_assessment_terms",
+                "fig.transform_fig",
+                "table.transform_table",
+                "equation.transform_equations",
+                "equation.transform_inline_equations",
+            ],
+        )
+        self.assertEqual(result["spec"], SMALL_SPEC)
+        self.assertEqual(os.listdir(self.temp_dir), [".keepme"])
+
+    def test_run_benchmarks_names(self):
+        result = run.run_benchmarks(
+            SMALL_SPEC, repeat=2, names=["fig.transform_fig"], work_dir=self.temp_dir
+        )
+        self.assertEqual(list(result["results"]), ["fig.transform_fig"])
+        self.assertEqual(result["results"]["fig.transform_fig"]["repeat"], 2)
+
+    def test_save_baseline(self):
+        file_path = os.path.join(self.temp_dir, "baseline.json")
+        result = run.run_benchmarks(
+            SMALL_SPEC, repeat=1, names=["fig.transform_fig"], work_dir=self.temp_dir
+        )
+        run.save_baseline(result, file_path)
+        self.assertEqual(run.load_baseline(file_path), json.loads(json.dumps(result)))
+
+
+class TestCompare(unittest.TestCase):
+    def setUp(self):
+        self.baseline = {
+            "spec": {"figures": 1},
+            "results": {"fast": {"median": 1.0}, "slow": {"median": 1.0}},
+        }
+
+    def test_compare(self):
+        result = {
+            "spec": {"figures": 1},
+            "results": {
+                "fast": {"median": 1.1},
+                "slow": {"median": 2.0},
+                "new": {"median": 1.0},
+            },
+        }
+        regressions = run.compare(result, self.baseline)
+        self.assertEqual([regression["name"] for regression in regressions], ["slow"])
+        self.assertEqual(regressions[0]["ratio"], 2.0)
+
+    def test_compare_min_difference(self):
+        "small differences in time are not a regression"
+        result = {"spec": {"figures": 1}, "results": {"slow": {"median": 1.5}}}
+        self.assertEqual(run.compare(result, self.baseline, min_difference=1), [])
+
+    def test_compare_spec(self):
+        result = {"spec": {"figures": 2}, "results": {}}
+        with self.assertRaises(ValueError):
+            run.compare(result, self.baseline)
@@ -0,0 +1,100 @@
+import os
+import unittest
+from mock import patch
+from elifecleaner import disk_cache
+from tests.helpers import delete_files_in_folder
+
+
+class TestFileSha256(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    def test_file_sha256(self):
+        file_path = os.path.join(self.temp_dir, "test.txt")
+        with open(file_path, "wb") as open_file:
+            open_file.write(b"test")
+        self.assertEqual(
+            disk_cache.file_sha256(file_path),
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08",
+        )
+
+    def test_string_sha256(self):
+        self.assertEqual(
+            disk_cache.string_sha256("test"),
+            "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08",
+        )
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+        self.cache_dir = os.path.join(self.temp_dir, "cache")
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    def test_disk_cache(self):
+        cache = disk_cache.DiskCache(self.cache_dir)
+        self.assertEqual(str(cache), 'DiskCache("tests/tmp/cache", None)')
+        self.assertIsNone(cache.get("abc"))
+        cache.set("abc", {"pages": 1})
+        self.assertEqual(cache.get("abc"), {"pages": 1})
+        cache.update("abc", {"image_pages": [1]})
+        self.assertEqual(cache.get("abc"), {"pages": 1, "image_pages": [1]})
+        cache.delete("abc")
+        self.assertIsNone(cache.get("abc"))
+
+    def test_corrupt_entry(self):
+        cache = disk_cache.DiskCache(self.cache_dir)
+        cache.set("abc", {"pages": 1})
+        with open(cache.entry_path("abc"), "w") as open_file:
+            open_file.write("{")
+        self.assertIsNone(cache.get("abc"))
+
+    def test_evict(self):
+        "least recently used entries are removed when over the size limit"
+        cache = disk_cache.DiskCache(self.cache_dir)
+        for index, key in enumerate(["a", "b", "c"]):
+            cache.set(key, {"value": key})
+            os.utime(cache.entry_path(key), (index, index))
+        # reading an entry marks it as recently used
+        cache.get("a")
+        entry_size = os.path.getsize(cache.entry_path("a"))
+        cache.max_size = entry_size * 2
+        cache.evict()
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), {"value": "a"})
+        self.assertEqual(cache.get("c"), {"value": "c"})
+        self.assertEqual(cache.size(), entry_size * 2)
+
+    def test_evict_scans(self):
+        "the directory is scanned when the estimated size is above max_size"
+        cache = disk_cache.DiskCache(self.cache_dir, 1000)
+        with patch.object(cache, "entries", wraps=cache.entries) as mock_entries:
+            for index in range(10):
+                cache.set("%s" % index, {"value": index})
+            # scanned on the first write to estimate the size
+            self.assertEqual(mock_entries.call_count, 1)
+            cache.set("large", {"value": "x" * 1000})
+            self.assertEqual(mock_entries.call_count, 2)
+        self.assertTrue(cache.size() <= 1000)
+        self.assertEqual(cache.size_estimate, cache.size())
+
+    @patch.object(disk_cache, "SCAN_WRITES", 5)
+    def test_evict_scan_writes(self):
+        "the directory is scanned again after SCAN_WRITES writes"
+        cache = disk_cache.DiskCache(self.cache_dir, 1000)
+        with patch.object(cache, "entries", wraps=cache.entries) as mock_entries:
+            for index in range(10):
+                cache.set("%s" % index, {"value": index})
+            self.assertEqual(mock_entries.call_count, 3)
+
+    def test_clear(self):
+        cache = disk_cache.DiskCache(self.cache_dir)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.clear()
+        self.assertEqual(cache.entries(), [])
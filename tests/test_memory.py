@@ -0,0 +1,79 @@
+import json
+import tracemalloc
+import unittest
+from elifecleaner import memory, trace, transform
+from tests.helpers import delete_files_in_folder
+
+
+class TestMemoryProfiler(unittest.TestCase):
+    def test_profiling(self):
+        "peak memory of nested spans includes the memory of inner spans"
+        with memory.profiling() as profiler:
+            with trace.span("outer"):
+                with trace.span("inner"):
+                    data = bytearray(1024 * 1024)
+                with trace.span("after"):
+                    del data
+        self.assertFalse(tracemalloc.is_tracing())
+        stages = profiler.stages()
+        self.assertEqual(list(stages), ["inner", "after", "outer"])
+        self.assertTrue(stages["inner"]["increase"] >= 1024 * 1024)
+        self.assertTrue(stages["after"]["increase"] < 1024 * 1024)
+        self.assertTrue(stages["outer"]["peak"] >= stages["inner"]["peak"])
+        self.assertTrue(profiler.peak >= stages["outer"]["peak"])
+        # the snapshot at the end of a stage holding the data finds where it was made
+        self.assertEqual(profiler.snapshot_stage, "inner")
+        self.assertEqual(profiler.allocation_sites()[0]["file"], __file__)
+        # the recorder is restored
+        self.assertFalse(trace.RECORDER.enabled)
+
+    def test_profiling_other_thread(self):
+        "spans of another thread are recorded without measuring their memory"
+        profiler = memory.MemoryProfiler()
+        self.assertTrue(profiler.memory)
+        profiler.thread_id = None
+        self.assertFalse(profiler.memory)
+
+    def test_memory_not_measured(self):
+        "memory is not measured by other recorders"
+        recorder = trace.MemoryRecorder()
+        tracemalloc.start()
+        try:
+            with trace.recording(recorder):
+                with trace.span("test"):
+                    pass
+        finally:
+            tracemalloc.stop()
+        self.assertIsNone(recorder.spans[0].memory_peak)
+
+
+class TestProfileTransform(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+        self.output_dir = "tests/tmp_output"
+        self.zip_file = "tests/test_data/08-11-2020-FA-eLife-64719.zip"
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+        delete_files_in_folder(self.output_dir, filter_out=[".keepme"])
+
+    def test_transform_ejp_zip(self):
+        with memory.profiling(top=3) as profiler:
+            transform.transform_ejp_zip(self.zip_file, self.temp_dir, self.output_dir)
+        report = json.loads(json.dumps(profiler.report()))
+        self.assertTrue(report["peak"] > 0)
+        for name in [
+            "zip_lib.unzip_zip",
+            "parse.parse_article_xml",
+            "transform.rezip",
+            "transform.transform_ejp_zip",
+        ]:
+            self.assertTrue(report["stages"][name]["peak"] > 0, name)
+        # worker threads add to the peak of the stage which started them
+        self.assertEqual(
+            report["stages"]["transform.transform_ejp_zip"]["peak"], report["peak"]
+        )
+        self.assertEqual(len(report["allocation_sites"]), 3)
+        self.assertEqual(
+            sorted(report["allocation_sites"][0]), ["count", "file", "line", "size"]
+        )
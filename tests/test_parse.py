@@ -1,14 +1,22 @@
+import json
 import os
+import subprocess
 import unittest
 import zipfile
 from collections import OrderedDict
 from xml.etree import ElementTree
 from xml.parsers.expat import ExpatError
 from mock import patch
-import wand
+import wand.exceptions
+import wand.image
 from elifecleaner import LOGGER, configure_logging, parse, pdf_utils, zip_lib
 from elifecleaner.utils import CONTROL_CHARACTER_ENTITY_REPLACEMENT
-from tests.helpers import delete_files_in_folder, read_fixture, read_log_file_lines
+from tests.helpers import (
+    delete_files_in_folder,
+    pdf_fixture,
+    read_fixture,
+    read_log_file_lines,
+)
 
 
 class TestParse(unittest.TestCase):
@@ -40,7 +48,7 @@ class TestCheckEjpZip(unittest.TestCase):
     def test_check_ejp_zip(
         self, mock_pdfimages_exists, mock_pdf_image_pages, fake_check_art_file
     ):
-        fake_check_art_file.return_value = True
+        fake_check_art_file.return_value = []
         mock_pdfimages_exists.return_value = True
         mock_pdf_image_pages.return_value = {1, 2}
         zip_file = "tests/test_data/30-01-2019-RA-eLife-45644.zip"
@@ -77,7 +85,7 @@ class TestCheckEjpZip(unittest.TestCase):
 
     @patch.object(parse, "check_art_file")
     def test_check_ejp_zip_missing_file(self, fake_check_art_file):
-        fake_check_art_file.return_value = True
+        fake_check_art_file.return_value = []
         zip_file = "tests/test_data/08-11-2020-FA-eLife-64719.zip"
         # remove a file from a copy of the zip file for testing
         test_zip_file_name = os.path.join(self.temp_dir, "test_missing_file.zip")
@@ -104,10 +112,52 @@ class TestCheckEjpZip(unittest.TestCase):
         result = parse.check_ejp_zip(test_zip_file_name, self.temp_dir)
         self.assertTrue(result)
         self.assertEqual(read_log_file_lines(self.log_file), expected)
+        self.assertEqual(
+            list(result),
+            [
+                parse.CheckResult(
+                    parse.CHECK_MISSING_FILE,
+                    zip_file_name,
+                    "eLife64719_figure2_classB.png",
+                    result.durations[parse.CHECK_MISSING_FILE],
+                )
+            ],
+        )
+
+    @patch.object(parse, "check_art_file")
+    def test_check_ejp_zip_missing_file_no_log(self, fake_check_art_file):
+        "results are returned without logging the warnings"
+        fake_check_art_file.return_value = []
+        zip_file = "tests/test_data/08-11-2020-FA-eLife-64719.zip"
+        test_zip_file_name = os.path.join(self.temp_dir, "test_missing_file.zip")
+        remove_files = ["08-11-2020-FA-eLife-64719/eLife64719_figure2_classB.png"]
+        with zipfile.ZipFile(zip_file, "r") as input_zipfile:
+            with zipfile.ZipFile(test_zip_file_name, "w") as output_zipfile:
+                for zip_info in input_zipfile.infolist():
+                    if zip_info.filename not in remove_files:
+                        output_zipfile.writestr(
+                            zip_info, input_zipfile.read(zip_info.filename)
+                        )
+        result = parse.check_ejp_zip(test_zip_file_name, self.temp_dir, log=False)
+        self.assertEqual(
+            [check_result.file_name for check_result in result],
+            ["eLife64719_figure2_classB.png"],
+        )
+        self.assertEqual(
+            list(result.durations),
+            [
+                parse.CHECK_MULTI_PAGE_FIGURE_PDF,
+                parse.CHECK_MISSING_FILE,
+                parse.CHECK_EXTRA_FILE,
+                parse.CHECK_MISSING_FILE_BY_NAME,
+                parse.CHECK_ART_FILE,
+            ],
+        )
+        self.assertEqual(read_log_file_lines(self.log_file), [])
 
     @patch.object(parse, "check_art_file")
     def test_check_ejp_zip_extra_file(self, fake_check_art_file):
-        fake_check_art_file.return_value = True
+        fake_check_art_file.return_value = []
         zip_file = "tests/test_data/08-11-2020-FA-eLife-64719.zip"
         # alter the manifest XML in the zip file for testing
         test_zip_file_name = os.path.join(self.temp_dir, "test_missing_file.zip")
@@ -150,7 +200,7 @@ class TestCheckEjpZip(unittest.TestCase):
 
     @patch.object(parse, "check_art_file")
     def test_check_ejp_zip_missing_file_by_name(self, fake_check_art_file):
-        fake_check_art_file.return_value = True
+        fake_check_art_file.return_value = []
         zip_file = "tests/test_data/08-11-2020-FA-eLife-64719.zip"
         # alter the manifest XML in the zip file for testing
         test_zip_file_name = os.path.join(self.temp_dir, "test_missing_file.zip")
@@ -186,6 +236,28 @@ class TestCheckEjpZip(unittest.TestCase):
         self.assertTrue(result)
         self.assertEqual(read_log_file_lines(self.log_file), expected)
 
+    @patch.object(parse, "check_art_file")
+    def test_check_ejp_zip_lazy(self, fake_check_art_file):
+        "all files are extracted unless lazy is True"
+        fake_check_art_file.return_value = []
+        zip_file = "tests/test_data/08-11-2020-FA-eLife-64719.zip"
+        folder_path = os.path.join(self.temp_dir, "08-11-2020-FA-eLife-64719")
+        self.assertTrue(parse.check_ejp_zip(zip_file, self.temp_dir))
+        self.assertEqual(len(os.listdir(folder_path)), 5)
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme", "test.log"])
+        self.assertTrue(parse.check_ejp_zip(zip_file, self.temp_dir, lazy=True))
+        self.assertEqual(os.listdir(folder_path), ["08-11-2020-FA-eLife-64719.xml"])
+        self.assertEqual(read_log_file_lines(self.log_file), [])
+
+
+class TestArticleXmlFileName(unittest.TestCase):
+    def test_article_xml_file_name(self):
+        file_names = ["folder/Figure 1.pdf", "folder/folder.xml", "folder/other.xml"]
+        self.assertEqual(parse.article_xml_file_name(file_names), "folder/folder.xml")
+
+    def test_article_xml_file_name_not_found(self):
+        self.assertIsNone(parse.article_xml_file_name(["folder/other.xml"]))
+
 
 class TestArticleXmlAsset(unittest.TestCase):
     def setUp(self):
@@ -222,24 +294,62 @@ class TestPdfPageCount(unittest.TestCase):
         delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
 
     @patch.object(wand.image.Image, "allocate")
-    def test_pdf_page_count_wand_runtime_error(self, mock_image_allocate):
+    def test_pdf_page_count(self, mock_image_allocate):
+        "page count is parsed from the PDF without opening it as an image"
+        pdf_path = os.path.join(self.temp_dir, "figure.pdf")
+        with open(pdf_path, "wb") as open_file:
+            open_file.write(pdf_fixture(3))
+        self.assertEqual(parse.pdf_page_count(pdf_path), 3)
+        self.assertEqual(mock_image_allocate.call_count, 0)
+
+    @patch.object(pdf_utils, "PDF_CACHE_DIR", "tests/tmp/pdf_cache")
+    @patch.object(pdf_utils, "pdf_page_count")
+    def test_pdf_page_count_cached(self, mock_pdf_page_count):
+        "page count is read from the cache for a PDF with the same content"
+        mock_pdf_page_count.return_value = 3
+        pdf_path = os.path.join(self.temp_dir, "figure.pdf")
+        with open(pdf_path, "wb") as open_file:
+            open_file.write(pdf_fixture(3))
+        self.assertEqual(parse.pdf_page_count(pdf_path), 3)
+        renamed_pdf_path = os.path.join(self.temp_dir, "figure_v2.pdf")
+        os.rename(pdf_path, renamed_pdf_path)
+        self.assertEqual(parse.pdf_page_count(renamed_pdf_path), 3)
+        self.assertEqual(mock_pdf_page_count.call_count, 1)
+
+    @patch.object(pdf_utils, "pdf_page_count")
+    @patch.object(wand.image.Image, "allocate")
+    def test_pdf_page_count_wand_runtime_error(
+        self, mock_image_allocate, mock_pdf_page_count
+    ):
         mock_image_allocate.side_effect = wand.exceptions.WandRuntimeError()
+        mock_pdf_page_count.side_effect = ValueError("PDF startxref not found")
         zip_lib.unzip_zip(
             "tests/test_data/30-01-2019-RA-eLife-45644.zip", self.temp_dir
         )
         pdf_path = "tests/tmp/30-01-2019-RA-eLife-45644/Appendix 1figure 10.pdf"
         with self.assertRaises(wand.exceptions.WandRuntimeError):
             self.assertIsNone(parse.pdf_page_count(pdf_path))
-        expected = (
-            "ERROR elifecleaner:parse:pdf_page_count: "
-            "WandRuntimeError in pdf_page_count(), imagemagick may not be installed\n"
-        )
+        expected = [
+            (
+                "INFO elifecleaner:parse:pdf_page_count: "
+                "Unable to parse PDF page count, opening it as an image instead: "
+                "PDF startxref not found\n"
+            ),
+            (
+                "ERROR elifecleaner:parse:pdf_page_count: "
+                "WandRuntimeError in pdf_page_count(), imagemagick may not be installed\n"
+            ),
+        ]
         log_file_lines = read_log_file_lines(self.log_file)
-        self.assertEqual(log_file_lines[0], expected)
+        self.assertEqual(log_file_lines[0:2], expected)
 
+    @patch.object(pdf_utils, "pdf_page_count")
     @patch.object(wand.image.Image, "allocate")
-    def test_pdf_page_count_wand_policy_error(self, mock_image_allocate):
+    def test_pdf_page_count_wand_policy_error(
+        self, mock_image_allocate, mock_pdf_page_count
+    ):
         mock_image_allocate.side_effect = wand.exceptions.PolicyError()
+        mock_pdf_page_count.side_effect = ValueError("PDF startxref not found")
         zip_lib.unzip_zip(
             "tests/test_data/30-01-2019-RA-eLife-45644.zip", self.temp_dir
         )
@@ -252,7 +362,28 @@ class TestPdfPageCount(unittest.TestCase):
             "imagemagick policy.xml may not allow reading PDF files\n"
         )
         log_file_lines = read_log_file_lines(self.log_file)
-        self.assertEqual(log_file_lines[0], expected)
+        self.assertEqual(log_file_lines[1], expected)
+
+
+class TestArticleAndRootFromXml(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+        self.xml_file_path = os.path.join(self.temp_dir, "test.xml")
+        with open(self.xml_file_path, "w") as open_file:
+            open_file.write(
+                '<article article-type="research-article"><front><article-meta>'
+                '<article-id pub-id-type="doi">10.7554/eLife.99999</article-id>'
+                "</article-meta></front></article>"
+            )
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    def test_article_and_root_from_xml(self):
+        article, error_count, root = parse.article_and_root_from_xml(self.xml_file_path)
+        self.assertEqual(article.doi, "10.7554/eLife.99999")
+        self.assertEqual(error_count, 0)
+        self.assertEqual(root.get("article-type"), "research-article")
 
 
 class TestParseArticleXML(unittest.TestCase):
@@ -269,6 +400,10 @@ class TestParseArticleXML(unittest.TestCase):
         root = parse.parse_article_xml(xml_file_path)
         self.assertIsNotNone(root)
 
+    def test_parse_article_xml_string(self):
+        root = parse.parse_article_xml(None, xml_string="<article>&mdash;</article>")
+        self.assertEqual(ElementTree.tostring(root), b"<article>&#8212;</article>")
+
     def test_parse_article_xml_entities(self):
         xml_file_path = os.path.join(self.temp_dir, "test.xml")
         with open(xml_file_path, "w") as open_file:
@@ -291,6 +426,23 @@ class TestParseArticleXML(unittest.TestCase):
         self.assertIsNotNone(root)
         self.assertEqual(ElementTree.tostring(root), expected)
 
+    def test_parse_article_xml_control_character_entities_log(self):
+        "the replacements are logged from parse_article_xml"
+        log_file = os.path.join(self.temp_dir, "test.log")
+        log_handler = configure_logging(log_file)
+        xml_string = "<article><title>To &#x001D;nd odd entities.</title></article>"
+        try:
+            parse.parse_article_xml(None, xml_string=xml_string)
+        finally:
+            LOGGER.removeHandler(log_handler)
+        self.assertEqual(
+            read_log_file_lines(log_file),
+            [
+                "INFO elifecleaner:parse:parse_article_xml: Replacing character "
+                "entities in the XML string: ['&#x001D;']\n"
+            ],
+        )
+
     def test_parse_article_xml_control_characters(self):
         # test parsing processing instructions and XML comments
         xml_file_path = os.path.join(self.temp_dir, "test.xml")
@@ -435,6 +587,81 @@ class TestParseFileList(unittest.TestCase):
         self.assertEqual(files, expected)
 
 
+MANIFEST_FILES_EXAMPLE = [
+    OrderedDict(
+        [
+            ("file_type", "figure"),
+            ("id", "1"),
+            ("upload_file_nm", "Figure 1.pdf"),
+            (
+                "custom_meta",
+                [OrderedDict([("meta_name", "Title"), ("meta_value", "Figure 1")])],
+            ),
+        ]
+    ),
+    OrderedDict(
+        [
+            ("file_type", "art_file"),
+            ("id", "2"),
+            ("upload_file_nm", "Manuscript.docx"),
+            ("custom_meta", []),
+        ]
+    ),
+    OrderedDict(
+        [
+            ("file_type", "figure"),
+            ("id", "3"),
+            ("upload_file_nm", "Figure 2.pdf"),
+            (
+                "custom_meta",
+                [
+                    OrderedDict([("meta_name", "Title"), ("meta_value", "Figure 2")]),
+                    OrderedDict([("meta_name", "Title"), ("meta_value", "Duplicate")]),
+                ],
+            ),
+        ]
+    ),
+]
+
+
+class TestManifestIndex(unittest.TestCase):
+    def test_manifest_index(self):
+        files = parse.ManifestIndex(MANIFEST_FILES_EXAMPLE)
+        self.assertEqual(files, MANIFEST_FILES_EXAMPLE)
+        self.assertEqual(
+            files.by_file_type("figure"),
+            [MANIFEST_FILES_EXAMPLE[0], MANIFEST_FILES_EXAMPLE[2]],
+        )
+        self.assertEqual(files.by_file_type("video"), [])
+        self.assertEqual(
+            files.by_file_types(["art_file", "figure"]), MANIFEST_FILES_EXAMPLE
+        )
+        self.assertEqual(
+            files.by_upload_file_nm("Manuscript.docx"), MANIFEST_FILES_EXAMPLE[1]
+        )
+        self.assertIsNone(files.by_upload_file_nm("Figure 3.pdf"))
+        self.assertEqual(files.by_id("3"), MANIFEST_FILES_EXAMPLE[2])
+        self.assertEqual(
+            files.by_meta_name("Title"),
+            [MANIFEST_FILES_EXAMPLE[0], MANIFEST_FILES_EXAMPLE[2]],
+        )
+        self.assertEqual(
+            files.upload_file_names(),
+            {"Figure 1.pdf", "Manuscript.docx", "Figure 2.pdf"},
+        )
+
+    def test_manifest_index_empty(self):
+        files = parse.ManifestIndex()
+        self.assertEqual(files, [])
+        self.assertEqual(files.by_file_type("figure"), [])
+
+    def test_manifest_index_helper(self):
+        files = parse.manifest_index(MANIFEST_FILES_EXAMPLE)
+        self.assertTrue(isinstance(files, parse.ManifestIndex))
+        # an existing index is not built again
+        self.assertIs(parse.manifest_index(files), files)
+
+
 class TestCheckMissingFiles(unittest.TestCase):
     def setUp(self):
         self.temp_dir = "tests/tmp"
@@ -457,7 +684,11 @@ class TestCheckMissingFiles(unittest.TestCase):
             )
             % (identifier, missing_files[0])
         ]
-        parse.check_missing_files([], {}, identifier)
+        result = parse.check_missing_files([], {}, identifier)
+        self.assertEqual(
+            result,
+            [parse.CheckResult(parse.CHECK_MISSING_FILE, identifier, "file.jpg")],
+        )
         self.assertEqual(read_log_file_lines(self.log_file), expected)
 
 
@@ -494,6 +725,48 @@ class TestFindMissingFiles(unittest.TestCase):
         self.assertEqual(parse.find_missing_files(files, asset_file_name_map), expected)
 
 
+class TestCheckReport(unittest.TestCase):
+    def test_check_report(self):
+        report = parse.CheckReport("test.zip")
+        self.assertTrue(report)
+        self.assertEqual(len(report), 0)
+        check_result = parse.CheckResult(parse.CHECK_EXTRA_FILE, "test.zip", "a.png")
+        self.assertEqual(
+            report.run(parse.CHECK_EXTRA_FILE, lambda: [check_result]),
+            [check_result],
+        )
+        report.add(parse.CHECK_ART_FILE, [], 0.5)
+        self.assertEqual(list(report), [check_result])
+        self.assertEqual(report.by_code(parse.CHECK_EXTRA_FILE), [check_result])
+        self.assertEqual(report.by_code(parse.CHECK_ART_FILE), [])
+        self.assertEqual(check_result.duration, report.durations["extra_file"])
+        self.assertEqual(report.durations["art_file"], 0.5)
+        self.assertEqual(
+            json.loads(json.dumps(report.to_dict())),
+            {
+                "identifier": "test.zip",
+                "results": [
+                    {
+                        "code": "extra_file",
+                        "identifier": "test.zip",
+                        "file_name": "a.png",
+                        "duration": check_result.duration,
+                    }
+                ],
+                "durations": {
+                    "extra_file": check_result.duration,
+                    "art_file": 0.5,
+                },
+            },
+        )
+
+    def test_check_result_repr(self):
+        check_result = parse.CheckResult(parse.CHECK_ART_FILE, "test.zip")
+        self.assertEqual(
+            repr(check_result), 'CheckResult("art_file", "test.zip", "None", None)'
+        )
+
+
 class TestCheckMultiPageFigurePdf(unittest.TestCase):
     def setUp(self):
         self.temp_dir = "tests/tmp"
@@ -513,7 +786,9 @@ class TestCheckMultiPageFigurePdf(unittest.TestCase):
         zip_file = "30-01-2019-RA-eLife-45644.zip"
         mock_pdfimages_exists.return_value = False
         mock_pdf_image_pages.return_value = {1, 2}
-        expected = None
+        expected = [
+            parse.CheckResult(parse.CHECK_MULTI_PAGE_FIGURE_PDF, zip_file, "figure.pdf")
+        ]
         self.assertEqual(parse.check_multi_page_figure_pdf(figures, zip_file), expected)
         log_file_lines = read_log_file_lines(self.log_file)
         self.assertTrue(
@@ -529,13 +804,137 @@ class TestCheckMultiPageFigurePdf(unittest.TestCase):
         zip_file = "30-01-2019-RA-eLife-45644.zip"
         mock_pdfimages_exists.return_value = True
         mock_pdf_image_pages.side_effect = Exception("An exception")
-        expected = None
+        expected = [
+            parse.CheckResult(
+                parse.CHECK_MULTI_PAGE_FIGURE_PDF,
+                zip_file,
+                "figure.pdf",
+                detail="Exception: An exception",
+            )
+        ]
         self.assertEqual(parse.check_multi_page_figure_pdf(figures, zip_file), expected)
         log_file_lines = read_log_file_lines(self.log_file)
         self.assertTrue("Exception:" in log_file_lines[-2])
         self.assertTrue(
             "multiple page PDF figure file: figure.pdf" in log_file_lines[-1]
         )
+        self.assertEqual(expected[0].to_dict()["detail"], "Exception: An exception")
+
+    @patch.object(pdf_utils, "pdf_image_pages")
+    @patch.object(pdf_utils, "pdfimages_exists")
+    def test_check_multi_page_figure_pdf_exception_no_log(
+        self, mock_pdfimages_exists, mock_pdf_image_pages
+    ):
+        "the exception is not logged if log is False"
+        figures = [{"file_name": "figure.pdf", "pages": 2}]
+        zip_file = "30-01-2019-RA-eLife-45644.zip"
+        mock_pdfimages_exists.return_value = True
+        mock_pdf_image_pages.side_effect = ValueError("An exception")
+        result = parse.check_multi_page_figure_pdf(figures, zip_file, log=False)
+        self.assertEqual(result[0].detail, "ValueError: An exception")
+        self.assertEqual(read_log_file_lines(self.log_file), [])
+
+    @patch.object(pdf_utils, "pdf_image_pages")
+    @patch.object(pdf_utils, "pdfimages_exists")
+    def test_check_multi_page_figure_pdf_workers(
+        self, mock_pdfimages_exists, mock_pdf_image_pages
+    ):
+        "inspect PDF files concurrently and log the results in manifest order"
+        figures = [
+            {"file_name": "figure%s.pdf" % index, "file_path": index, "pages": 2}
+            for index in range(1, 9)
+        ]
+        zip_file = "30-01-2019-RA-eLife-45644.zip"
+        mock_pdfimages_exists.return_value = True
+        # even numbered figures have images on page 2
+        mock_pdf_image_pages.side_effect = lambda file_path, timeout, cache_key: (
+            {1, 2} if file_path % 2 == 0 else {1}
+        )
+        parse.check_multi_page_figure_pdf(figures, zip_file, max_workers=4, timeout=60)
+        self.assertEqual(mock_pdf_image_pages.call_count, 8)
+        self.assertEqual(
+            mock_pdf_image_pages.call_args[1], {"timeout": 60, "cache_key": None}
+        )
+        log_file_lines = read_log_file_lines(self.log_file)
+        warnings = [line for line in log_file_lines if line.startswith("WARNING")]
+        self.assertEqual(
+            [line.rsplit(" ", 1)[-1] for line in warnings],
+            ["figure2.pdf\n", "figure4.pdf\n", "figure6.pdf\n", "figure8.pdf\n"],
+        )
+
+
+class TestSetFigurePdfPagesCount(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    def test_set_figure_pdf_pages_count(self):
+        figures = []
+        for index in range(1, 6):
+            file_path = os.path.join(self.temp_dir, "figure%s.pdf" % index)
+            with open(file_path, "wb") as open_file:
+                open_file.write(pdf_fixture(index))
+            figures.append({"extension": "pdf", "file_path": file_path})
+        figures.append({"extension": "png", "file_path": "figure.png"})
+        result = parse.set_figure_pdf_pages_count(figures, max_workers=3)
+        self.assertEqual(
+            [figure.get("pages") for figure in result], [1, 2, 3, 4, 5, None]
+        )
+
+    @patch.object(pdf_utils, "PDF_CACHE_DIR", "tests/tmp/pdf_cache")
+    @patch.object(pdf_utils, "pdfimages_output")
+    @patch.object(pdf_utils, "pdfimages_exists")
+    @patch("elifecleaner.disk_cache.file_sha256")
+    def test_pdf_hashed_once(
+        self, mock_file_sha256, mock_pdfimages_exists, mock_pdfimages_output
+    ):
+        "each PDF is hashed once to count its pages and check it for images"
+        mock_file_sha256.return_value = "a" * 64
+        mock_pdfimages_exists.return_value = True
+        mock_pdfimages_output.return_value = subprocess.CompletedProcess(
+            [], 0, stdout=b""
+        )
+        file_path = os.path.join(self.temp_dir, "figure.pdf")
+        with open(file_path, "wb") as open_file:
+            open_file.write(pdf_fixture(2))
+        figures = [{"extension": "pdf", "file_path": file_path}]
+        figures = parse.set_figure_pdf_pages_count(figures)
+        parse.check_multi_page_figure_pdf(figures, "test.zip", log=False)
+        self.assertEqual(figures[0].get("pages"), 2)
+        self.assertEqual(mock_pdfimages_output.call_count, 1)
+        self.assertEqual(mock_file_sha256.call_count, 1)
+
+
+class TestFigureList(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+        self.zip_file = os.path.join(self.temp_dir, "figures.zip")
+        with zipfile.ZipFile(self.zip_file, "w") as open_zipfile:
+            open_zipfile.writestr("folder/figure1.pdf", pdf_fixture(1))
+            open_zipfile.writestr("folder/figure2.png", b"png")
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    def test_figure_list_lazy(self):
+        "only the PDF figures are extracted from a lazy map"
+        files = [
+            {"file_type": "figure", "upload_file_nm": "figure1.pdf"},
+            {"file_type": "figure", "upload_file_nm": "figure2.png"},
+        ]
+        unzip_dir = os.path.join(self.temp_dir, "unzip")
+        with zip_lib.LazyZipMap(self.zip_file, unzip_dir) as asset_file_name_map:
+            result = parse.figure_list(files, asset_file_name_map)
+        self.assertEqual(
+            [figure.get("file_path") for figure in result],
+            [
+                "tests/tmp/unzip/folder/figure1.pdf",
+                "tests/tmp/unzip/folder/figure2.png",
+            ],
+        )
+        self.assertEqual(os.listdir(os.path.join(unzip_dir, "folder")), ["figure1.pdf"])
 
 
 class TestCheckExtraFiles(unittest.TestCase):
@@ -560,7 +959,10 @@ class TestCheckExtraFiles(unittest.TestCase):
             )
             % (identifier, extra_files[0])
         ]
-        parse.check_extra_files([], {}, identifier)
+        result = parse.check_extra_files([], {}, identifier)
+        self.assertEqual(
+            result, [parse.CheckResult(parse.CHECK_EXTRA_FILE, identifier, "file.jpg")]
+        )
         self.assertEqual(read_log_file_lines(self.log_file), expected)
 
 
@@ -623,7 +1025,15 @@ class TestCheckMissingFilesByName(unittest.TestCase):
             )
             % (identifier, missing_files[0])
         ]
-        parse.check_missing_files_by_name([], identifier)
+        result = parse.check_missing_files_by_name([], identifier)
+        self.assertEqual(
+            result,
+            [
+                parse.CheckResult(
+                    parse.CHECK_MISSING_FILE_BY_NAME, identifier, "Figure 2"
+                )
+            ],
+        )
         self.assertEqual(read_log_file_lines(self.log_file), expected)
 
 
@@ -832,8 +1242,54 @@ class TestCheckArtFile(unittest.TestCase):
             )
             % (identifier)
         ]
-        parse.check_art_file(files, identifier)
+        result = parse.check_art_file(files, identifier)
         self.assertEqual(read_log_file_lines(self.log_file), expected)
+        self.assertEqual(result, [parse.CheckResult(parse.CHECK_ART_FILE, identifier)])
+
+    def test_check_art_file_no_log(self):
+        "test the warning is returned but not logged"
+        identifier = "test.zip"
+        result = parse.check_art_file([OrderedDict()], identifier, log=False)
+        self.assertEqual(read_log_file_lines(self.log_file), [])
+        self.assertEqual(result, [parse.CheckResult(parse.CHECK_ART_FILE, identifier)])
+
+
+class TestXmlArticleType(unittest.TestCase):
+    def test_xml_article_type(self):
+        root = ElementTree.fromstring('<article article-type="correction"/>')
+        self.assertEqual(parse.xml_article_type(root), "correction")
+
+    def test_xml_article_type_missing(self):
+        root = ElementTree.fromstring("<article/>")
+        self.assertIsNone(parse.xml_article_type(root))
+
+
+class TestXmlDisplayChannel(unittest.TestCase):
+    def test_xml_display_channel(self):
+        xml_string = (
+            "<article><front><article-meta><article-categories>"
+            '<subj-group subj-group-type="display-channel">'
+            "<subject>Research <italic>Article</italic></subject>"
+            "</subj-group>"
+            '<subj-group subj-group-type="heading">'
+            "<subject>Neuroscience</subject>"
+            "</subj-group>"
+            "</article-categories></article-meta></front>"
+            "<sub-article><front-stub><article-categories>"
+            '<subj-group subj-group-type="display-channel">'
+            "<subject>Insight</subject>"
+            "</subj-group>"
+            "</article-categories></front-stub></sub-article>"
+            "</article>"
+        )
+        root = ElementTree.fromstring(xml_string)
+        self.assertEqual(
+            parse.xml_display_channel(root), ["Research Article", "Insight"]
+        )
+
+    def test_xml_display_channel_none(self):
+        root = ElementTree.fromstring("<article/>")
+        self.assertEqual(parse.xml_display_channel(root), [])
 
 
 class TestParsePreprintUrl(unittest.TestCase):
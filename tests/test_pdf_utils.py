@@ -2,7 +2,7 @@ import os
 import unittest
 from mock import patch
 from elifecleaner import pdf_utils, zip_lib
-from tests.helpers import delete_files_in_folder
+from tests.helpers import delete_files_in_folder, pdf_fixture
 
 PDFIMAGES_OUTPUT = (
     b"page   num  type   width height color comp bpc  enc interp  object ID x-ppi y-ppi size ratio\n"
@@ -41,6 +41,7 @@ class Result:
 
     def __init__(self):
         self.stdout = None
+        self.returncode = 0
 
 
 class TestPdfImagePages(unittest.TestCase):
@@ -61,6 +62,11 @@ class TestPdfImagePages(unittest.TestCase):
             result = pdf_utils.pdfimages_output(pdf_file)
             self.assertIsNotNone(result.stdout)
 
+    @patch("subprocess.run")
+    def test_pdfimages_output_timeout(self, mock_run):
+        pdf_utils.pdfimages_output("figure.pdf", timeout=30)
+        self.assertEqual(mock_run.call_args[1].get("timeout"), 30)
+
     @patch.object(pdf_utils, "pdfimages_output")
     def test_pdf_image_pages(self, mock_pdfimages_output):
         mock_result = Result()
@@ -70,3 +76,203 @@ class TestPdfImagePages(unittest.TestCase):
         pdf_file = "figure.pdf"
         pages = pdf_utils.pdf_image_pages(pdf_file)
         self.assertEqual(pages, expected)
+
+
+class TestPdfCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+        self.pdf_path = os.path.join(self.temp_dir, "figure.pdf")
+        with open(self.pdf_path, "wb") as open_file:
+            open_file.write(pdf_fixture(2))
+        self.original_cache_dir = pdf_utils.PDF_CACHE_DIR
+        pdf_utils.PDF_CACHE_DIR = os.path.join(self.temp_dir, "pdf_cache")
+
+    def tearDown(self):
+        pdf_utils.PDF_CACHE_DIR = self.original_cache_dir
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    def test_pdf_cache_disabled(self):
+        pdf_utils.PDF_CACHE_DIR = None
+        self.assertIsNone(pdf_utils.pdf_cache())
+        self.assertIsNone(pdf_utils.pdf_cache_key(self.pdf_path))
+        self.assertIsNone(pdf_utils.pdf_cache_get(None, "pages"))
+
+    def test_pdf_cache_instance(self):
+        "the same DiskCache is used until the settings change"
+        cache = pdf_utils.pdf_cache()
+        self.assertIs(pdf_utils.pdf_cache(), cache)
+        pdf_utils.PDF_CACHE_DIR = os.path.join(self.temp_dir, "other_cache")
+        self.assertIsNot(pdf_utils.pdf_cache(), cache)
+
+    def test_pdf_cache_set_get(self):
+        cache_key = pdf_utils.pdf_cache_key(self.pdf_path)
+        self.assertEqual(len(cache_key), 64)
+        self.assertIsNone(pdf_utils.pdf_cache_get(cache_key, "pages"))
+        pdf_utils.pdf_cache_set(cache_key, "pages", 2)
+        pdf_utils.pdf_cache_set(cache_key, "image_pages", [1])
+        self.assertEqual(pdf_utils.pdf_cache_get(cache_key, "pages"), 2)
+        self.assertEqual(pdf_utils.pdf_cache_get(cache_key, "image_pages"), [1])
+
+    @patch.object(pdf_utils, "pdfimages_output")
+    def test_pdf_image_pages_cached(self, mock_pdfimages_output):
+        mock_result = Result()
+        mock_result.stdout = PDFIMAGES_OUTPUT
+        mock_pdfimages_output.return_value = mock_result
+        expected = {1, 2, 3, 4, 5, 6}
+        self.assertEqual(pdf_utils.pdf_image_pages(self.pdf_path), expected)
+        self.assertEqual(pdf_utils.pdf_image_pages(self.pdf_path), expected)
+        self.assertEqual(mock_pdfimages_output.call_count, 1)
+
+    @patch.object(pdf_utils, "pdfimages_output")
+    def test_pdf_image_pages_not_cached_on_error(self, mock_pdfimages_output):
+        mock_result = Result()
+        mock_result.returncode = 1
+        mock_pdfimages_output.return_value = mock_result
+        self.assertEqual(pdf_utils.pdf_image_pages(self.pdf_path), set())
+        self.assertEqual(pdf_utils.pdf_image_pages(self.pdf_path), set())
+        self.assertEqual(mock_pdfimages_output.call_count, 2)
+
+
+class TestMapPdfFiles(unittest.TestCase):
+    "tests for pdf_utils.map_pdf_files()"
+
+    def test_map_pdf_files(self):
+        pdf_list = ["figure%s.pdf" % index for index in range(10)]
+        futures = pdf_utils.map_pdf_files(str.upper, pdf_list, max_workers=4)
+        self.assertEqual(
+            [future.result() for future in futures],
+            [pdf.upper() for pdf in pdf_list],
+        )
+
+    def test_map_pdf_files_exception(self):
+        "exception is raised when the result of a future is requested"
+
+        def function(pdf, suffix=None):
+            if pdf == "bad.pdf":
+                raise ValueError("bad PDF")
+            return pdf + suffix
+
+        futures = pdf_utils.map_pdf_files(
+            function, ["figure.pdf", "bad.pdf"], max_workers=2, suffix="!"
+        )
+        self.assertEqual(futures[0].result(), "figure.pdf!")
+        with self.assertRaises(ValueError):
+            futures[1].result()
+
+    def test_map_pdf_files_empty(self):
+        self.assertEqual(pdf_utils.map_pdf_files(str.upper, []), [])
+
+
+class TestPdfPageCount(unittest.TestCase):
+    "tests for pdf_utils.pdf_page_count()"
+
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+        self.pdf_file = os.path.join(self.temp_dir, "figure.pdf")
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    def write_pdf(self, pdf_bytes):
+        with open(self.pdf_file, "wb") as open_file:
+            open_file.write(pdf_bytes)
+
+    def test_pdf_page_count(self):
+        "PDF with a cross-reference table"
+        self.write_pdf(pdf_fixture(3))
+        self.assertEqual(pdf_utils.pdf_page_count(self.pdf_file), 3)
+
+    def test_pdf_page_count_xref_stream(self):
+        "PDF with a cross-reference stream and an object stream"
+        self.write_pdf(pdf_fixture(6, xref_stream=True))
+        self.assertEqual(pdf_utils.pdf_page_count(self.pdf_file), 6)
+
+    def test_pdf_page_count_incremental_update(self):
+        "an appended update to the page tree is used instead of the original"
+        pdf_bytes = pdf_fixture(3)
+        previous_startxref = int(pdf_bytes.rsplit(b"startxref", 1)[1].split()[0])
+        offset = len(pdf_bytes)
+        pdf_bytes += b"2 0 obj\n<< /Type /Pages /Kids [3 0 R] /Count 1 >>\nendobj\n"
+        startxref = len(pdf_bytes)
+        pdf_bytes += (
+            b"xref\n2 1\n%010d 00000 n \ntrailer\n<< /Size 6 /Root 1 0 R /Prev %d >>\n"
+            b"startxref\n%d\n%%%%EOF\n" % (offset, previous_startxref, startxref)
+        )
+        self.write_pdf(pdf_bytes)
+        self.assertEqual(pdf_utils.pdf_page_count(self.pdf_file), 1)
+
+    def test_pdf_page_count_empty(self):
+        self.write_pdf(b"")
+        with self.assertRaises(ValueError):
+            pdf_utils.pdf_page_count(self.pdf_file)
+
+    def test_pdf_page_count_not_a_pdf(self):
+        self.write_pdf(b"not a PDF file")
+        with self.assertRaises(ValueError):
+            pdf_utils.pdf_page_count(self.pdf_file)
+
+    def test_pdf_page_count_nested_too_deeply(self):
+        "a deeply nested object in the trailer raises ValueError"
+        pdf_bytes = pdf_fixture(1)
+        pdf_bytes = pdf_bytes.replace(
+            b"trailer\n<<", b"trailer\n<< /X %s" % (b"[" * 5000)
+        )
+        self.write_pdf(pdf_bytes)
+        with self.assertRaises(ValueError):
+            pdf_utils.pdf_page_count(self.pdf_file)
+
+    def test_pdf_page_count_truncated(self):
+        pdf_bytes = pdf_fixture(3)
+        self.write_pdf(pdf_bytes[0:-40] + pdf_bytes[-30:])
+        with self.assertRaises(ValueError):
+            pdf_utils.pdf_page_count(self.pdf_file)
+
+
+class TestPdfObject(unittest.TestCase):
+    "tests for pdf_utils.pdf_object()"
+
+    def test_pdf_object(self):
+        data = (
+            b"<< /Type /Pages % comment\n/Kids [3 0 R 4 0 R] /Count 2"
+            b" /Title (A (nested) \\) string) /ID <0a1b> /Rotate -90 /Scale 0.5"
+            b" /Flag true /None null /Sub << /Columns 5 >> >> trailing"
+        )
+        expected = {
+            "Type": "Pages",
+            "Kids": [pdf_utils.PdfReference(3, 0), pdf_utils.PdfReference(4, 0)],
+            "Count": 2,
+            "Title": b"A (nested) \\) string",
+            "ID": b"0a1b",
+            "Rotate": -90,
+            "Scale": 0.5,
+            "Flag": True,
+            "None": None,
+            "Sub": {"Columns": 5},
+        }
+        value, position = pdf_utils.pdf_object(data, 0)
+        self.assertEqual(value, expected)
+        self.assertEqual(data[position:], b" trailing")
+
+    def test_pdf_object_bad_token(self):
+        with self.assertRaises(ValueError):
+            pdf_utils.pdf_object(b"<< /Key ) >>", 0)
+
+    def test_pdf_object_nested_too_deeply(self):
+        "deeply nested arrays raise ValueError instead of RecursionError"
+        with self.assertRaises(ValueError):
+            pdf_utils.pdf_object(b"[" * 5000 + b"]" * 5000, 0)
+
+    def test_pdf_object_nesting_limit(self):
+        data = b"[" * pdf_utils.PDF_MAX_NESTING + b"]" * pdf_utils.PDF_MAX_NESTING
+        value, position = pdf_utils.pdf_object(data, 0)
+        self.assertEqual(position, len(data))
+
+
+class TestPngPredictorDecode(unittest.TestCase):
+    "tests for pdf_utils.png_predictor_decode()"
+
+    def test_png_predictor_decode(self):
+        # first row uses the up filter from a blank row, second row uses sub filter
+        data = b"\x02\x01\x02\x03" + b"\x01\x01\x01\x01"
+        expected = b"\x01\x02\x03" + b"\x01\x02\x03"
+        self.assertEqual(pdf_utils.png_predictor_decode(data, 3), expected)
@@ -3,12 +3,12 @@ import time
 import unittest
 from xml.etree import ElementTree
 import json
+from mock import patch
 from elifearticle.article import Affiliation, Contributor, Role
 from elifetools import xmlio
 from elifecleaner import LOGGER, configure_logging, prc
 from tests.helpers import delete_files_in_folder, read_fixture
 
-
 # elife ISSN example of non-PRC journal-id tag values
 NON_PRC_XML = (
     "<article><front><journal-meta>"
@@ -270,6 +270,162 @@ class TestAddPrcCustomMetaTags(unittest.TestCase):
             )
 
 
+class TestDocmapContext(unittest.TestCase):
+    "tests for prc.DocmapContext"
+
+    def setUp(self):
+        self.docmap_string = json.dumps(docmap_test_data())
+        self.version_doi = "10.7554/eLife.85111.1"
+
+    @patch.object(prc.docmap_parse, "docmap_json", wraps=prc.docmap_parse.docmap_json)
+    def test_parse_once(self, mock_docmap_json):
+        "parse the docmap once when getting more than one value"
+        context = prc.DocmapContext(self.docmap_string)
+        self.assertEqual(prc.elocation_id_from_docmap(context), "RP85111")
+        self.assertEqual(prc.volume_from_docmap(context), 12)
+        self.assertEqual(prc.article_id_from_docmap(context), "85111")
+        self.assertEqual(
+            prc.license_from_docmap(context),
+            "http://creativecommons.org/licenses/by/4.0/",
+        )
+        self.assertEqual(prc.article_categories_from_docmap(context), ["Neuroscience"])
+        self.assertEqual(
+            prc.review_date_from_docmap(context), "2022-11-28T11:30:05+00:00"
+        )
+        self.assertEqual(mock_docmap_json.call_count, 1)
+
+    @patch.object(
+        prc.docmap_parse,
+        "preprint_version_doi_step_map",
+        wraps=prc.docmap_parse.preprint_version_doi_step_map,
+    )
+    def test_version_doi(self, mock_step_map):
+        "values for a version DOI use the step map made once"
+        context = prc.DocmapContext(self.docmap_string)
+        self.assertEqual(context.elocation_id(self.version_doi), "RP85111")
+        self.assertEqual(context.volume(self.version_doi), "12")
+        self.assertEqual(context.article_id(self.version_doi), "85111")
+        self.assertEqual(mock_step_map.call_count, 1)
+        self.assertEqual(
+            context.preprint_output(self.version_doi),
+            prc.docmap_parse.docmap_preprint_output(
+                docmap_test_data(), self.version_doi
+            ),
+        )
+
+    def test_unknown_version_doi(self):
+        "a version DOI not in the docmap has no preprint output, the same as docmaptools"
+        context = prc.DocmapContext(self.docmap_string)
+        version_doi = "10.7554/eLife.85111.9"
+        self.assertEqual(
+            context.preprint_output(version_doi),
+            prc.docmap_parse.docmap_preprint_output(docmap_test_data(), version_doi),
+        )
+        self.assertIsNone(context.preprint_output(version_doi))
+        with self.assertRaises(AttributeError):
+            prc.article_id_from_docmap(context, version_doi)
+        with self.assertRaises(TypeError):
+            context.editor_data(version_doi)
+
+    def test_partof_field_warning(self):
+        "a missing partOf value is logged by the docmaptools logger"
+        context = prc.DocmapContext(self.docmap_string)
+        with self.assertLogs(prc.docmap_parse.LOGGER, "WARNING") as logs:
+            self.assertIsNone(
+                context.elocation_id("10.7554/eLife.85111.9", identifier="test.zip")
+            )
+        self.assertEqual(
+            logs.output,
+            [
+                "WARNING:docmaptools:test.zip no electronicArticleIdentifier "
+                "found in the docmap"
+            ],
+        )
+
+    def test_docmap_context(self):
+        "a DocmapContext is used as it is"
+        context = prc.DocmapContext(self.docmap_string)
+        self.assertEqual(prc.docmap_context(context), context)
+        self.assertEqual(
+            prc.docmap_context(self.docmap_string).docmap_string, self.docmap_string
+        )
+
+
+class TestDocmapCache(unittest.TestCase):
+    "tests for the process-wide cache of docmaps"
+
+    def setUp(self):
+        prc.clear_docmap_cache()
+        self.docmap_string = json.dumps(docmap_test_data())
+
+    def tearDown(self):
+        prc.clear_docmap_cache()
+
+    @patch.object(prc.docmap_parse, "docmap_json", wraps=prc.docmap_parse.docmap_json)
+    def test_docmap_cache(self, mock_docmap_json):
+        "the same docmap string is parsed once by separate calls"
+        self.assertEqual(prc.elocation_id_from_docmap(self.docmap_string), "RP85111")
+        self.assertEqual(prc.volume_from_docmap(self.docmap_string), 12)
+        self.assertEqual(mock_docmap_json.call_count, 1)
+        self.assertEqual(
+            prc.docmap_cache_info(),
+            {"hits": 1, "misses": 1, "size": 1, "max_size": prc.DOCMAP_CACHE_SIZE},
+        )
+
+    @patch.object(prc, "DOCMAP_CACHE_SIZE", 2)
+    def test_least_recently_used(self):
+        "the least recently used docmap is removed when the cache is full"
+        docmap_strings = [
+            json.dumps(docmap_test_data("10.7554/eLife.85111.%s" % version))
+            for version in range(1, 4)
+        ]
+        first_context = prc.docmap_context(docmap_strings[0])
+        prc.docmap_context(docmap_strings[1])
+        # use the first docmap again so the second is the least recently used
+        self.assertEqual(prc.docmap_context(docmap_strings[0]), first_context)
+        prc.docmap_context(docmap_strings[2])
+        self.assertEqual(prc.invalidate_docmap(docmap_strings[1]), False)
+        self.assertEqual(prc.invalidate_docmap(docmap_strings[0]), True)
+        self.assertEqual(prc.docmap_cache_info().get("size"), 1)
+
+    @patch.object(prc, "DOCMAP_CACHE_SIZE", 0)
+    def test_cache_disabled(self):
+        "no docmaps are cached if the cache size is 0"
+        context = prc.docmap_context(self.docmap_string)
+        self.assertNotEqual(prc.docmap_context(self.docmap_string), context)
+        self.assertEqual(prc.docmap_cache_info().get("size"), 0)
+
+    def test_clear_docmap_cache(self):
+        "clearing the cache removes the docmaps and resets the counts"
+        prc.docmap_context(self.docmap_string)
+        prc.clear_docmap_cache()
+        self.assertEqual(
+            prc.docmap_cache_info(),
+            {"hits": 0, "misses": 0, "size": 0, "max_size": prc.DOCMAP_CACHE_SIZE},
+        )
+
+    def test_returned_values_are_copies(self):
+        "changing a returned value does not change the cached docmap"
+        version_doi = "10.7554/eLife.85111.1"
+        article_categories = prc.article_categories_from_docmap(self.docmap_string)
+        article_categories.append("Corrupted")
+        participants = prc.docmap_context(self.docmap_string).editor_data(version_doi)
+        participants.append({"role": "corrupted"})
+        d_json = prc.docmap_context(self.docmap_string).d_json
+        d_json["steps"] = {}
+        self.assertEqual(
+            prc.article_categories_from_docmap(self.docmap_string), ["Neuroscience"]
+        )
+        self.assertEqual(
+            prc.docmap_context(self.docmap_string).editor_data(version_doi),
+            prc.DocmapContext(self.docmap_string).editor_data(version_doi),
+        )
+        self.assertEqual(
+            prc.docmap_context(self.docmap_string).d_json, docmap_test_data()
+        )
+        self.assertEqual(prc.docmap_cache_info().get("misses"), 1)
+
+
 class TestElocationIdFromDocmap(unittest.TestCase):
     "tests for prc.elocation_id_from_docmap()"
 
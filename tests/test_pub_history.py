@@ -2,8 +2,8 @@ import unittest
 from xml.etree import ElementTree
 from mock import patch
 from elifetools import xmlio
-from elifecleaner import pub_history
-from tests.helpers import read_fixture
+from elifecleaner import prc, pub_history
+from tests.helpers import FakeResponse, read_fixture
 
 SCIETY_DATA = {
     "https://sciety.org/evaluations/hypothesis:6wCSiENREe-fsV9XrL_PJA/content": (
@@ -27,15 +27,14 @@ SCIETY_DATA = {
 }
 
 
-def mock_get_web_content(
-    url=None,
-    user_agent=None,
-):
-    "return a content containing the response data based on the URL"
+def mock_session_get(url=None, **kwargs):
+    "return a response containing the data based on the URL"
     if url and url in SCIETY_DATA:
-        return SCIETY_DATA.get(url)
+        return FakeResponse(200, content=SCIETY_DATA.get(url))
     # default
-    return b"<p><strong>%s</strong></p>\n" b"<p>The ....</p>\n" % b"Title"
+    return FakeResponse(
+        200, content=b"<p><strong>%s</strong></p>\n" b"<p>The ....</p>\n" % b"Title"
+    )
 
 
 class TestPruneHistoryData(unittest.TestCase):
@@ -293,10 +292,16 @@ class TestReviewedPreprintEventDesc(unittest.TestCase):
 class TestHistoryEventSelfUriList(unittest.TestCase):
     "tests for history_event_self_uri_list()"
 
-    @patch("docmaptools.parse.get_web_content")
+    def setUp(self):
+        prc.clear_docmap_cache()
+
+    def tearDown(self):
+        prc.clear_docmap_cache()
+
+    @patch("requests.Session.get")
     def test_self_uri_list(self, fake_get):
         "test get self-uri data from docmap"
-        fake_get.side_effect = mock_get_web_content
+        fake_get.side_effect = mock_session_get
         docmap_string = read_fixture("99854.json", mode="r")
         version_doi = "10.7554/eLife.99854.1"
         expected = [
@@ -331,6 +336,52 @@ class TestHistoryEventSelfUriList(unittest.TestCase):
         # assert
         self.assertEqual(result, expected)
 
+    @patch("requests.Session.get")
+    def test_memoized(self, fake_get):
+        "self-uri data for a version DOI is made once for the docmap"
+        fake_get.side_effect = mock_session_get
+        docmap_string = read_fixture("99854.json", mode="r")
+        version_doi = "10.7554/eLife.99854.1"
+        # invoke
+        result = pub_history.history_event_self_uri_list(docmap_string, version_doi)
+        call_count = fake_get.call_count
+        result[0]["title"] = "changed"
+        second_result = pub_history.history_event_self_uri_list(
+            docmap_string, version_doi
+        )
+        # assert
+        self.assertEqual(fake_get.call_count, call_count)
+        self.assertEqual(second_result[0].get("title"), "eLife assessment")
+        self.assertEqual(len(second_result), 5)
+
+    @patch("requests.Session.get")
+    def test_not_memoized_after_failed_download(self, fake_get):
+        "self-uri data is made again if a web-content URL was not downloaded"
+        failed_urls = []
+
+        def fail_first_get(url=None, **kwargs):
+            if not failed_urls:
+                failed_urls.append(url)
+                return FakeResponse(404)
+            return mock_session_get(url, **kwargs)
+
+        fake_get.side_effect = fail_first_get
+        docmap_string = read_fixture("99854.json", mode="r")
+        version_doi = "10.7554/eLife.99854.1"
+        # invoke
+        result = pub_history.history_event_self_uri_list(docmap_string, version_doi)
+        second_result = pub_history.history_event_self_uri_list(
+            docmap_string, version_doi
+        )
+        third_result = pub_history.history_event_self_uri_list(
+            docmap_string, version_doi
+        )
+        # assert
+        self.assertEqual(len(result), 4)
+        self.assertEqual(len(second_result), 5)
+        self.assertEqual(third_result, second_result)
+        self.assertEqual(fake_get.call_count, 10)
+
 
 HISTORY_DATA_99854 = [
     {
@@ -432,10 +483,10 @@ class TestCollectHistoryEventData(unittest.TestCase):
         self.assertEqual(len(result), 1)
         self.assertDictEqual(result[0], expected[0])
 
-    @patch("docmaptools.parse.get_web_content")
+    @patch("requests.Session.get")
     def test_meca(self, fake_get):
         "test collecting history data for meca style including self-uri data"
-        fake_get.side_effect = mock_get_web_content
+        fake_get.side_effect = mock_session_get
         style = "meca"
         docmap_string = read_fixture("99854.json", mode="r")
         add_self_uri = True
@@ -846,9 +897,9 @@ class TestAddPubHistoryMeca(unittest.TestCase):
             v2_events,
         )
 
-    @patch("docmaptools.parse.get_web_content")
+    @patch("requests.Session.get")
     def test_add_pub_history_meca(self, fake_get):
-        fake_get.side_effect = mock_get_web_content
+        fake_get.side_effect = mock_session_get
         root = ElementTree.fromstring(
             "<article>"
             "<front>"
@@ -878,10 +929,10 @@ class TestAddPubHistoryMeca(unittest.TestCase):
         xml_string = ElementTree.tostring(result).decode("utf-8")
         self.assertEqual(xml_string, expected)
 
-    @patch("docmaptools.parse.get_web_content")
+    @patch("requests.Session.get")
     def test_insert_near_elocation_id(self, fake_get):
         "test for inserting pub-history near the elocation-id tag and no history tag"
-        fake_get.side_effect = mock_get_web_content
+        fake_get.side_effect = mock_session_get
         root = ElementTree.fromstring(
             "<article>"
             "<front>"
@@ -911,10 +962,10 @@ class TestAddPubHistoryMeca(unittest.TestCase):
         xml_string = ElementTree.tostring(result).decode("utf-8")
         self.assertEqual(xml_string, expected)
 
-    @patch("docmaptools.parse.get_web_content")
+    @patch("requests.Session.get")
     def test_multiple_history_events(self, fake_get):
         "test more than one version DOI in history data"
-        fake_get.side_effect = mock_get_web_content
+        fake_get.side_effect = mock_session_get
         root = ElementTree.fromstring(
             "<article>"
             "<front>"
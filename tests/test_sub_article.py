@@ -21,7 +21,6 @@ from tests.helpers import (
     read_log_file_lines,
 )
 
-
 ARTICLE_TITLES = [
     b"Evaluation Summary: <italic>test</italic>",
     b"Reviewer #1 (Public Review):",
@@ -198,6 +197,60 @@ class TestReorderReviewArticles(unittest.TestCase):
         self.assertEqual(result[5], content_list[1])
 
 
+class TestTitleNumber(unittest.TestCase):
+    def test_title_number(self):
+        self.assertEqual(sub_article.title_number("Reviewer #12 (Public Review):"), 12)
+
+    def test_no_number(self):
+        self.assertEqual(sub_article.title_number("eLife assessment"), 0)
+
+    def test_none(self):
+        self.assertEqual(sub_article.title_number(None), 0)
+
+
+class TestParseContentXml(unittest.TestCase):
+    def test_parse_content_xml(self):
+        "the XML is parsed and the title and number are recorded"
+        content_json = [
+            {"xml": xml_content(b"Reviewer #2 <italic>(Public Review)</italic>:")},
+            {"xml": xml_content(b"Author Response:")},
+        ]
+        result = sub_article.parse_content_xml(content_json)
+        self.assertTrue(isinstance(result[0].get("xml_root"), Element))
+        self.assertEqual(
+            result[0].get("title"), "Reviewer #2 <italic>(Public Review)</italic>:"
+        )
+        self.assertEqual(result[0].get("title_number"), 2)
+        self.assertEqual(result[1].get("title_number"), 0)
+
+    def test_malformed_xml(self):
+        "an exception is raised if the XML cannot be parsed"
+        with self.assertRaises(ElementTree.ParseError):
+            sub_article.parse_content_xml([{"xml": "<root>"}])
+
+    def test_reorder_parsed_content(self):
+        "parsed content is ordered by its title_number"
+        content_list = sub_article.parse_content_xml(
+            [
+                {"xml": xml_content(b"Reviewer #2 (Public Review):")},
+                {"xml": xml_content(b"Reviewer #1 (Public Review):")},
+            ]
+        )
+        result = sub_article.reorder_review_articles(content_list)
+        self.assertEqual(result, [content_list[1], content_list[0]])
+
+    def test_transform_ordered_lists(self):
+        "lists in a parsed xml_root are changed without replacing the xml"
+        xml = '<root><list list-type="order"><list-item>One.</list-item></list></root>'
+        content_json = sub_article.parse_content_xml([{"xml": xml}])
+        result = sub_article.transform_ordered_lists(content_json)
+        self.assertEqual(
+            ElementTree.tostring(result[0].get("xml_root")),
+            b"<root><p>1. One.</p></root>",
+        )
+        self.assertEqual(result[0].get("xml"), xml)
+
+
 class TestReorderContentJson(unittest.TestCase):
     def test_reorder_content_json(self):
         content_json = [
@@ -239,7 +292,7 @@ class TestAddSubArticleXml(unittest.TestCase):
         delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
         parse.REPAIR_XML = self.original_repair_xml_value
 
-    @patch("elifecleaner.sub_article.docmap_parse.populate_docmap_content")
+    @patch("elifecleaner.sub_article.web_content.populate_docmap_content")
     @patch("requests.get")
     def test_add_sub_article_xml(self, mock_get, mock_sub_article_data):
         mock_get.return_value = True
@@ -273,7 +326,7 @@ class TestAddSubArticleXml(unittest.TestCase):
         for line in expected_log_file_lines:
             self.assertTrue(line in log_file_lines)
 
-    @patch("elifecleaner.sub_article.docmap_parse.populate_docmap_content")
+    @patch("elifecleaner.sub_article.web_content.populate_docmap_content")
     @patch("requests.get")
     def test_generate_dois(self, mock_get, mock_sub_article_data):
         "test argument generate_dois is False"
@@ -299,7 +352,7 @@ class TestAddSubArticleXml(unittest.TestCase):
 class TestSubArticleData(unittest.TestCase):
     "tests for sub_article_data()"
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_sub_article_data(self, mock_get):
         article_title = b"Evaluation Summary: <italic>test</italic>"
         mock_get.return_value = FakeResponse(
@@ -339,7 +392,7 @@ class TestSubArticleData(unittest.TestCase):
             sub_article_data[0].get("xml_root").find(".//article-title")
         )
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_preprint_sub_article_data(self, mock_get):
         "test using version_doi and generate_dois arguments"
         article_title = b"Evaluation Summary: <italic>test</italic>"
@@ -368,6 +421,67 @@ class TestSubArticleData(unittest.TestCase):
         )
 
 
+class TestSubArticleMetadata(unittest.TestCase):
+    "tests for sub_article_metadata()"
+
+    @patch("requests.Session.get")
+    def test_sub_article_metadata(self, mock_get):
+        "metadata matches the Article objects of sub_article_data()"
+        mock_get.return_value = FakeResponse(
+            200,
+            content=b"<p><strong>Reviewer #1 <em>test</em></strong></p><p>Test.</p>",
+        )
+        docmap_string = read_fixture("99854.json", mode="r")
+        version_doi = "10.7554/eLife.99854.1"
+        data = sub_article.sub_article_data(
+            docmap_string, Article(version_doi), version_doi, False
+        )
+        # invoke
+        metadata = sub_article.sub_article_metadata(docmap_string, version_doi)
+        # assert
+        self.assertEqual(
+            metadata,
+            [
+                {
+                    "article_type": data_item.get("article").article_type,
+                    "doi": data_item.get("article").doi,
+                    "title": data_item.get("article").title,
+                }
+                for data_item in data
+            ],
+        )
+        self.assertEqual(metadata[0].get("title"), "Reviewer #1 <italic>test</italic>")
+
+
+class TestHtmlTitle(unittest.TestCase):
+    "tests for html_title()"
+
+    def test_html_title(self):
+        "the title is the same as the article-title of the converted XML"
+        html_list = [
+            b"<p><strong>Reviewer #1 <em>test</em> <a href='x'>link</a></strong></p>",
+            b"<p><strong>T &amp; <i>x</i></strong><br>more</p><p>Test.</p>",
+            b"<ul><li>list</li></ul><p><strong>eLife assessment</strong></p>",
+            b"<p>Text <strong>not a title</strong></p>",
+            b"<p><br/><strong>not a title</strong></p>",
+            b"No title",
+        ]
+        for html in html_list:
+            xml_root = ElementTree.fromstring(
+                sub_article.docmap_convert.convert_html_string(html)
+            )
+            self.assertEqual(
+                sub_article.html_title(html), sub_article.article_title(xml_root)
+            )
+        self.assertEqual(
+            sub_article.html_title(html_list[0]),
+            '<article-title xmlns:xlink="http://www.w3.org/1999/xlink">'
+            "Reviewer #1 <italic>test</italic> "
+            '<ext-link ext-link-type="uri" xlink:href="x">link</ext-link>',
+        )
+        self.assertIsNone(sub_article.html_title(html_list[3]))
+
+
 class TestSubArticleId(unittest.TestCase):
     def test_sub_article_id(self):
         index = 0
@@ -0,0 +1,123 @@
+import json
+import os
+import unittest
+from elifecleaner import parse, trace, transform
+from tests.helpers import delete_files_in_folder
+
+
+class TestSpan(unittest.TestCase):
+    def test_span_null_recorder(self):
+        "spans are not recorded by default"
+        with trace.span("test") as span:
+            span.count("bytes_read", 10)
+        self.assertEqual(span, trace.NULL_SPAN)
+        self.assertFalse(span.recording)
+
+    def test_span_memory_recorder(self):
+        recorder = trace.MemoryRecorder()
+        with trace.recording(recorder):
+            with trace.span("outer", zip_file="test.zip") as outer_span:
+                outer_span.count("files")
+                with trace.span("inner") as inner_span:
+                    inner_span.count("bytes_read", 10)
+                    inner_span.count("bytes_read", 5)
+                    self.assertEqual(trace.current_span(), inner_span)
+        self.assertEqual(trace.current_span(), trace.NULL_SPAN)
+        self.assertEqual([span.name for span in recorder.spans], ["inner", "outer"])
+        self.assertEqual(inner_span.parent, "outer")
+        self.assertEqual(inner_span.counts, {"bytes_read": 15})
+        self.assertIsNone(outer_span.parent)
+        self.assertEqual(outer_span.attributes, {"zip_file": "test.zip"})
+        self.assertTrue(outer_span.duration >= inner_span.duration >= 0)
+        summary = recorder.summary()
+        self.assertEqual(summary["inner"]["calls"], 1)
+        self.assertEqual(summary["inner"]["counts"], {"bytes_read": 15})
+
+    def test_span_exception(self):
+        recorder = trace.MemoryRecorder()
+        with trace.recording(recorder):
+            with self.assertRaises(ValueError):
+                with trace.span("test"):
+                    raise ValueError("An exception")
+        self.assertEqual(recorder.spans[0].error, "ValueError")
+        self.assertTrue(recorder.spans[0].duration >= 0)
+
+    def test_traced(self):
+        @trace.traced()
+        def add(first, second):
+            trace.current_span().count("calls")
+            return first + second
+
+        self.assertEqual(add(1, 2), 3)
+        recorder = trace.MemoryRecorder()
+        with trace.recording(recorder):
+            self.assertEqual(add(1, 2), 3)
+        self.assertEqual(len(recorder.spans), 1)
+        self.assertEqual(recorder.spans[0].name, "test_trace.add")
+        self.assertEqual(recorder.spans[0].counts, {"calls": 1})
+
+
+class TestJsonLinesRecorder(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+        self.trace_file = os.path.join(self.temp_dir, "trace.jsonl")
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    def test_json_lines_recorder(self):
+        recorder = trace.JsonLinesRecorder(self.trace_file)
+        with trace.recording(recorder):
+            with trace.span("test", identifier="test.zip") as span:
+                span.count("elements", 3)
+        self.assertIsNone(recorder.open_file)
+        with open(self.trace_file, "r") as open_file:
+            lines = [json.loads(line) for line in open_file]
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(lines[0]["name"], "test")
+        self.assertEqual(lines[0]["attributes"], {"identifier": "test.zip"})
+        self.assertEqual(lines[0]["counts"], {"elements": 3})
+
+
+class TestTracePipeline(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+        self.output_dir = "tests/tmp_output"
+        self.zip_file = "tests/test_data/08-11-2020-FA-eLife-64719.zip"
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+        delete_files_in_folder(self.output_dir, filter_out=[".keepme"])
+
+    def test_transform_ejp_zip(self):
+        recorder = trace.MemoryRecorder()
+        with trace.recording(recorder):
+            transform.transform_ejp_zip(self.zip_file, self.temp_dir, self.output_dir)
+        summary = recorder.summary()
+        for name in [
+            "zip_lib.unzip_zip",
+            "parse.parse_article_xml",
+            "transform.xml_rewrite_file_tags",
+            "transform.transform_xml",
+            "transform.write_xml_file",
+            "transform.rezip",
+        ]:
+            self.assertEqual(summary[name]["calls"], 1, name)
+        self.assertEqual(
+            recorder.by_name("transform.rezip")[0].parent,
+            "transform.transform_ejp_zip",
+        )
+        self.assertEqual(summary["zip_lib.unzip_zip"]["counts"]["files"], 5)
+        self.assertTrue(summary["parse.parse_article_xml"]["counts"]["elements"])
+        zip_span = recorder.by_name("transform.transform_ejp_zip")[0]
+        self.assertEqual(zip_span.counts["bytes_read"], os.path.getsize(self.zip_file))
+        self.assertTrue(zip_span.counts["bytes_written"])
+
+    def test_check_ejp_zip(self):
+        recorder = trace.MemoryRecorder()
+        with trace.recording(recorder):
+            parse.check_ejp_zip(self.zip_file, self.temp_dir)
+        self.assertEqual(
+            [span.name for span in recorder.spans][-2:],
+            ["parse.check_files", "parse.check_ejp_zip"],
+        )
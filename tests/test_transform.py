@@ -3,7 +3,10 @@ import os
 import sys
 import unittest
 import zipfile
+from collections import OrderedDict
 from xml.etree import ElementTree
+from xml.etree.ElementTree import SubElement
+from mock import patch
 from elifetools import parseJATS as parser
 from elifetools import xmlio
 from elifecleaner import LOGGER, configure_logging, transform, zip_lib
@@ -21,6 +24,49 @@ class TestArticleZipFile(unittest.TestCase):
         self.assertEqual(str(from_file), expected)
 
 
+class TestArticleDocument(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+        self.xml_asset_path = os.path.join(self.temp_dir, "test.xml")
+        with open(self.xml_asset_path, "w") as open_file:
+            open_file.write("<article><front/></article>")
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    def test_instantiate(self):
+        document = transform.ArticleDocument(self.xml_asset_path, "test.zip")
+        expected = 'ArticleDocument("%s", "test.zip")' % self.xml_asset_path
+        self.assertEqual(str(document), expected)
+
+    def test_root_parsed_once(self):
+        document = transform.ArticleDocument(self.xml_asset_path, "test.zip")
+        root = document.root
+        self.assertEqual(root.tag, "article")
+        # the same Element is returned each time
+        self.assertTrue(document.root is root)
+
+    def test_write(self):
+        document = transform.ArticleDocument(self.xml_asset_path, "test.zip")
+        SubElement(document.root.find("front"), "article-meta")
+        # file is unchanged until it is written
+        with open(self.xml_asset_path, "r") as open_file:
+            self.assertTrue("<article-meta" not in open_file.read())
+        document.write()
+        with open(self.xml_asset_path, "r") as open_file:
+            self.assertTrue("<article-meta/>" in open_file.read())
+
+    def test_xml_string(self):
+        "parse the XML from a string instead of a file"
+        document = transform.ArticleDocument(
+            identifier="test.zip", xml_string="<article><front/></article>"
+        )
+        self.assertEqual(document.root.tag, "article")
+        self.assertEqual(len(document.soup().find_all("front")), 1)
+        SubElement(document.root.find("front"), "article-meta")
+        self.assertTrue("<article-meta/>" in document.to_string())
+
+
 class TestTransform(unittest.TestCase):
     def setUp(self):
         self.temp_dir = "tests/tmp"
@@ -33,6 +79,78 @@ class TestTransform(unittest.TestCase):
         delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
         delete_files_in_folder(self.output_dir, filter_out=[".keepme"])
 
+    def test_transform_ejp_zip_stream(self):
+        "streaming transform makes a zip with the same contents as transform_ejp_zip"
+        zip_file = os.path.join(self.temp_dir, "08-11-2020-FA-eLife-64719.zip")
+        xml_file_name = "08-11-2020-FA-eLife-64719/08-11-2020-FA-eLife-64719.xml"
+        # add a code file to a copy of the test zip
+        with zipfile.ZipFile(
+            "tests/test_data/08-11-2020-FA-eLife-64719.zip", "r"
+        ) as input_zipfile:
+            with zipfile.ZipFile(zip_file, "w", zipfile.ZIP_DEFLATED) as output_zipfile:
+                for zip_info in input_zipfile.infolist():
+                    data = input_zipfile.read(zip_info.filename)
+                    if zip_info.filename == xml_file_name:
+                        data = data.replace(
+                            b"</files>",
+                            (
+                                b'<file file-type="aux_file" id="99">'
+                                b"<upload_file_nm>main.c</upload_file_nm></file>"
+                                b"</files>"
+                            ),
+                        )
+                    output_zipfile.writestr(zip_info, data)
+                output_zipfile.write(
+                    "tests/test_data/main.c", "08-11-2020-FA-eLife-64719/main.c"
+                )
+        stream_output_dir = os.path.join(self.temp_dir, "stream_output")
+        os.mkdir(stream_output_dir)
+        unzip_dir = os.path.join(self.temp_dir, "unzip")
+        os.mkdir(unzip_dir)
+
+        new_zip_file_path = transform.transform_ejp_zip_stream(
+            zip_file, stream_output_dir
+        )
+        self.assertEqual(
+            new_zip_file_path,
+            os.path.join(stream_output_dir, "08-11-2020-FA-eLife-64719.zip"),
+        )
+        # only the new zip file is written
+        self.assertEqual(
+            os.listdir(stream_output_dir), ["08-11-2020-FA-eLife-64719.zip"]
+        )
+        expected_zip_file_path = transform.transform_ejp_zip(
+            zip_file, unzip_dir, self.output_dir
+        )
+        with zipfile.ZipFile(expected_zip_file_path, "r") as expected_zipfile:
+            with zipfile.ZipFile(new_zip_file_path, "r") as open_zipfile:
+                self.assertIsNone(open_zipfile.testzip())
+                self.assertEqual(open_zipfile.namelist(), expected_zipfile.namelist())
+                for file_name in expected_zipfile.namelist():
+                    if file_name.endswith(".zip"):
+                        continue
+                    self.assertEqual(
+                        open_zipfile.read(file_name), expected_zipfile.read(file_name)
+                    )
+                code_zip_data = open_zipfile.read(
+                    "08-11-2020-FA-eLife-64719/main.c.zip"
+                )
+        with zipfile.ZipFile(io.BytesIO(code_zip_data), "r") as code_zipfile:
+            with open("tests/test_data/main.c", "rb") as open_file:
+                self.assertEqual(
+                    code_zipfile.read("08-11-2020-FA-eLife-64719/main.c"),
+                    open_file.read(),
+                )
+        with open(self.log_file, "r") as open_file:
+            self.assertTrue(
+                (
+                    "INFO elifecleaner:transform:transform_ejp_zip_stream: "
+                    "08-11-2020-FA-eLife-64719.zip writing xml to zip "
+                    "08-11-2020-FA-eLife-64719/08-11-2020-FA-eLife-64719.xml\n"
+                )
+                in open_file.readlines()
+            )
+
     def test_transform_ejp_zip(self):
         zip_file = "tests/test_data/30-01-2019-RA-eLife-45644.zip"
         zip_file_name = zip_file.split(os.sep)[-1]
@@ -107,25 +225,18 @@ class TestTransform(unittest.TestCase):
             log_file_lines[5],
             ("%s rewriting xml tags\n") % rewrite_info_prefix,
         )
-        self.assertEqual(
-            log_file_lines[6],
-            (
-                "%s writing xml to file"
-                " tests/tmp/30-01-2019-RA-eLife-45644/30-01-2019-RA-eLife-45644.xml\n"
-            )
-            % write_info_prefix,
-        )
 
         self.assertEqual(
-            log_file_lines[7],
+            log_file_lines[6],
             (
                 "%s "
                 "article_type research-article, display_channel ['Research Article']\n"
             )
             % transform_history_prefix,
         )
+        # XML file is written once
         self.assertEqual(
-            log_file_lines[9],
+            log_file_lines[8],
             (
                 "%s writing xml to file"
                 " tests/tmp/30-01-2019-RA-eLife-45644/30-01-2019-RA-eLife-45644.xml\n"
@@ -133,7 +244,10 @@ class TestTransform(unittest.TestCase):
             % write_info_prefix,
         )
         self.assertEqual(
-            log_file_lines[10],
+            len([line for line in log_file_lines if "writing xml to file" in line]), 1
+        )
+        self.assertEqual(
+            log_file_lines[9],
             ("%s writing new zip file tests/tmp_output/30-01-2019-RA-eLife-45644.zip\n")
             % rezip_info_prefix,
         )
@@ -286,6 +400,82 @@ class TestCodeFileList(unittest.TestCase):
         self.assertEqual(code_files, expected)
 
 
+class TestFileTransformPlan(unittest.TestCase):
+    def test_file_transform_plan(self):
+        from_file = ArticleZipFile("main.c", "folder/main.c", "tmp/folder/main.c")
+        to_file = ArticleZipFile("main.c.zip", "folder/main.c.zip", "out/main.c.zip")
+        plan = transform.FileTransformPlan()
+        self.assertEqual(len(plan), 0)
+        plan.append((from_file, to_file))
+        self.assertEqual(len(plan), 1)
+        self.assertEqual(plan, [(from_file, to_file)])
+        self.assertEqual(plan[0], (from_file, to_file))
+        self.assertEqual(list(plan), [(from_file, to_file)])
+        self.assertTrue(str(plan).startswith('FileTransformPlan([(ArticleZipFile("'))
+
+    def test_file_transform_plan_equal(self):
+        "a plan is equal to a plan or list with the same file transformations"
+        from_file = ArticleZipFile("main.c", "folder/main.c", "tmp/folder/main.c")
+        plan = transform.FileTransformPlan([(from_file, from_file)])
+        self.assertEqual(plan, transform.FileTransformPlan([(from_file, from_file)]))
+        self.assertNotEqual(plan, transform.FileTransformPlan())
+        self.assertNotEqual(plan, None)
+        self.assertNotEqual(plan, 1)
+        self.assertNotEqual(plan, "main.c")
+
+
+class TestCodeFileTransformations(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+        self.output_dir = os.path.join(self.temp_dir, "output")
+        os.mkdir(self.output_dir)
+        xml_string = read_fixture("code_file_list.xml")
+        self.root = ElementTree.fromstring(xml_string)
+        self.asset_file_name_map = {}
+        for file_data in read_fixture("code_file_list.py"):
+            file_name = file_data.get("upload_file_nm")
+            file_path = os.path.join(self.temp_dir, file_name)
+            with open(file_path, "w") as open_file:
+                open_file.write(file_name)
+            self.asset_file_name_map["folder/%s" % file_name] = file_path
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    def test_code_file_transformations(self):
+        "the plan is made without writing any files"
+        plan = transform.code_file_transformations(
+            self.root, self.asset_file_name_map, self.output_dir, "test.zip"
+        )
+        self.assertTrue(isinstance(plan, transform.FileTransformPlan))
+        self.assertEqual(len(plan), len(self.asset_file_name_map))
+        self.assertEqual(os.listdir(self.output_dir), [])
+        from_file, to_file = plan[0]
+        self.assertEqual(from_file.zip_name, "folder/Figure 5source code 1.c")
+        self.assertEqual(to_file.zip_name, "folder/Figure 5source code 1.c.zip")
+        self.assertEqual(
+            to_file.file_path,
+            os.path.join(self.output_dir, "Figure 5source code 1.c.zip"),
+        )
+
+    def test_code_file_zip(self):
+        "each code file is zipped once"
+        plan = transform.code_file_transformations(
+            self.root, self.asset_file_name_map, self.output_dir, "test.zip"
+        )
+        with patch.object(
+            transform, "write_code_file_zip", wraps=transform.write_code_file_zip
+        ) as mock_write_code_file_zip:
+            transform.code_file_zip(plan, self.output_dir, "test.zip", max_workers=2)
+        self.assertEqual(mock_write_code_file_zip.call_count, len(plan))
+        for from_file, to_file in plan:
+            with zipfile.ZipFile(to_file.file_path, "r") as open_zipfile:
+                self.assertEqual(
+                    open_zipfile.read(from_file.zip_name),
+                    from_file.xml_name.encode("utf-8"),
+                )
+
+
 class TestFindInFileNameMap(unittest.TestCase):
     def test_find_in_file_name_map(self):
         file_name = "file_one.txt"
@@ -577,6 +767,12 @@ class TestTransformXmlFileTags(unittest.TestCase):
 
 
 class TestTransformXmlHistoryTags(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
     def test_transform_xml_history_tags_research_article(self):
         "research-article XML will be unchanged"
         # populate an ElementTree
@@ -691,6 +887,73 @@ class TestTransformXmlHistoryTags(unittest.TestCase):
         )
         self.assertEqual(transform.xml_element_to_string(root_output), expected)
 
+    def test_transform_xml_history_tags_insight_no_soup(self):
+        "values are read from the root when no soup is supplied"
+        xml_string = (
+            '<article article-type="article-commentary">'
+            "<front>"
+            "<article-meta>"
+            "<article-categories>"
+            '<subj-group subj-group-type="display-channel">'
+            "<subject>Insight</subject>"
+            "</subj-group>"
+            "</article-categories>"
+            "<history>"
+            "<date/>"
+            "</history>"
+            "</article-meta>"
+            "</front>"
+            "</article>"
+        )
+        root = ElementTree.fromstring(xml_string)
+        root_output = transform.transform_xml_history_tags(root, None, "test.zip")
+        expected = (
+            '<?xml version="1.0" ?>'
+            '<article article-type="article-commentary">'
+            "<front>"
+            "<article-meta>"
+            "<article-categories>"
+            '<subj-group subj-group-type="display-channel">'
+            "<subject>Insight</subject>"
+            "</subj-group>"
+            "</article-categories>"
+            "</article-meta>"
+            "</front>"
+            "</article>"
+        )
+        self.assertEqual(transform.xml_element_to_string(root_output), expected)
+
+    def test_transform_xml_insight_vor(self):
+        "history is changed the same with and without the soup for an (VOR) subject"
+        xml_string = (
+            '<article article-type="article-commentary">'
+            "<front>"
+            "<article-meta>"
+            "<article-categories>"
+            '<subj-group subj-group-type="display-channel">'
+            "<subject>Insight (VOR)</subject>"
+            "</subj-group>"
+            "</article-categories>"
+            "<history>"
+            '<date date-type="received"><day>01</day><month>01</month>'
+            "<year>2023</year></date>"
+            "</history>"
+            "</article-meta>"
+            "</front>"
+            "</article>"
+        )
+        xml_strings = []
+        for use_soup in [False, True]:
+            xml_asset_path = os.path.join(self.temp_dir, "test.xml")
+            with open(xml_asset_path, "w") as open_file:
+                open_file.write(xml_string)
+            transform.transform_xml(xml_asset_path, "test.zip", use_soup=use_soup)
+            with open(xml_asset_path, "r") as open_file:
+                xml_strings.append(open_file.read())
+        self.assertEqual(xml_strings[0], xml_strings[1])
+        self.assertTrue("<history>" in xml_strings[0])
+        self.assertTrue("<subject>Insight</subject>" in xml_strings[0])
+
     def test_keep_sent_for_review_date(self):
         "keep the sent-for-review date in the history tag"
         # populate an ElementTree
@@ -926,6 +1189,19 @@ class TestTransformAssetFileNameMap(unittest.TestCase):
         self.assertEqual(new_asset_file_name_map, expected)
 
 
+class UnseekableStream:
+    "file-like object which can only be written to, for testing"
+
+    def __init__(self, output):
+        self.output = output
+
+    def write(self, data):
+        return self.output.write(data)
+
+    def flush(self):
+        pass
+
+
 class TestCreateZipFromFileMap(unittest.TestCase):
     def setUp(self):
         self.temp_dir = "tests/tmp"
@@ -943,3 +1219,169 @@ class TestCreateZipFromFileMap(unittest.TestCase):
         with zipfile.ZipFile(zip_path, "r") as open_zipfile:
             infolist = open_zipfile.infolist()
         self.assertEqual(infolist[0].filename, file_name)
+
+    def test_create_zip_from_file_map_source_zip(self):
+        "unchanged files are copied from the source zip without compressing again"
+        source_zip_path = os.path.join(self.temp_dir, "source.zip")
+        with zipfile.ZipFile(source_zip_path, "w") as open_zipfile:
+            open_zipfile.writestr(
+                "folder/folder.xml", b"<article/>" * 100, zipfile.ZIP_DEFLATED
+            )
+            open_zipfile.writestr(
+                "folder/main.c", b"int main() {}\n" * 100, zipfile.ZIP_DEFLATED
+            )
+            open_zipfile.writestr("folder/video.mp4", b"video", zipfile.ZIP_STORED)
+        asset_file_name_map = zip_lib.unzip_zip(source_zip_path, self.temp_dir)
+        # modify the XML file
+        with open(asset_file_name_map.get("folder/folder.xml"), "wb") as open_file:
+            open_file.write(b"<article></article>")
+        zip_path = os.path.join(self.temp_dir, "test.zip")
+        transform.create_zip_from_file_map(
+            zip_path,
+            asset_file_name_map,
+            source_zip=source_zip_path,
+            modified_file_names=["folder/folder.xml"],
+        )
+        with zipfile.ZipFile(source_zip_path, "r") as open_zipfile:
+            source_infos = open_zipfile.NameToInfo
+        with zipfile.ZipFile(zip_path, "r") as open_zipfile:
+            self.assertIsNone(open_zipfile.testzip())
+            infos = open_zipfile.NameToInfo
+            self.assertEqual(
+                open_zipfile.read("folder/folder.xml"), b"<article></article>"
+            )
+            self.assertEqual(
+                open_zipfile.read("folder/main.c"), b"int main() {}\n" * 100
+            )
+            self.assertEqual(open_zipfile.read("folder/video.mp4"), b"video")
+        for file_name in ["folder/main.c", "folder/video.mp4"]:
+            self.assertEqual(infos[file_name].CRC, source_infos[file_name].CRC)
+            self.assertEqual(
+                infos[file_name].compress_type, source_infos[file_name].compress_type
+            )
+            self.assertEqual(
+                infos[file_name].date_time, source_infos[file_name].date_time
+            )
+
+    def test_create_zip_from_file_map_data_descriptor(self):
+        "copy a member written with a data descriptor after its data"
+        source_zip_path = os.path.join(self.temp_dir, "source.zip")
+        output = io.BytesIO()
+        # a stream which cannot seek is written using data descriptors
+        stream = UnseekableStream(output)
+        with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as open_zipfile:
+            with open_zipfile.open("folder/main.c", "w") as open_file:
+                open_file.write(b"int main() {}\n" * 100)
+            open_zipfile.writestr("folder/readme.txt", b"readme")
+        with open(source_zip_path, "wb") as open_file:
+            open_file.write(output.getvalue())
+        with zipfile.ZipFile(source_zip_path, "r") as open_zipfile:
+            self.assertTrue(
+                open_zipfile.getinfo("folder/main.c").flag_bits
+                & zip_lib.DATA_DESCRIPTOR_FLAG
+            )
+        asset_file_name_map = zip_lib.unzip_zip(source_zip_path, self.temp_dir)
+        zip_path = os.path.join(self.temp_dir, "test.zip")
+        transform.create_zip_from_file_map(
+            zip_path, asset_file_name_map, source_zip=source_zip_path
+        )
+        with zipfile.ZipFile(zip_path, "r") as open_zipfile:
+            self.assertIsNone(open_zipfile.testzip())
+            self.assertEqual(
+                open_zipfile.read("folder/main.c"), b"int main() {}\n" * 100
+            )
+            self.assertEqual(open_zipfile.read("folder/readme.txt"), b"readme")
+            self.assertEqual(
+                open_zipfile.getinfo("folder/main.c").flag_bits
+                & zip_lib.DATA_DESCRIPTOR_FLAG,
+                0,
+            )
+
+    @patch.object(zip_lib, "write_raw_member")
+    def test_create_zip_from_file_map_failure(self, mock_write_raw_member):
+        "after a failure the waiting files are not compressed and none are left open"
+        compressed_files = []
+        compress_file = zip_lib.compress_file
+
+        def fake_compress_file(*args):
+            zip_info, compressed_file = compress_file(*args)
+            compressed_files.append(compressed_file)
+            return zip_info, compressed_file
+
+        mock_write_raw_member.side_effect = OSError("No space left on device")
+        file_name_map = OrderedDict(
+            ("zip_folder/main%s.c" % index, "tests/test_data/main.c")
+            for index in range(20)
+        )
+        zip_path = os.path.join(self.temp_dir, "test.zip")
+        with patch.object(zip_lib, "compress_file", side_effect=fake_compress_file):
+            with self.assertRaises(OSError):
+                transform.create_zip_from_file_map(
+                    zip_path, file_name_map, max_workers=1
+                )
+        self.assertTrue(0 < len(compressed_files) < 20)
+        self.assertTrue(
+            all(compressed_file.closed for compressed_file in compressed_files)
+        )
+
+    def test_create_zip_from_file_map_compress_type(self):
+        "already compressed formats are stored and others are deflated"
+        png_file_path = os.path.join(self.temp_dir, "image.png")
+        with open(png_file_path, "wb") as open_file:
+            open_file.write(b"png" * 100)
+        file_name_map = {
+            "zip_folder/main.c": "tests/test_data/main.c",
+            "zip_folder/image.png": png_file_path,
+        }
+        zip_path = os.path.join(self.temp_dir, "test.zip")
+        transform.create_zip_from_file_map(zip_path, file_name_map)
+        with zipfile.ZipFile(zip_path, "r") as open_zipfile:
+            self.assertIsNone(open_zipfile.testzip())
+            self.assertEqual(
+                [zip_info.filename for zip_info in open_zipfile.infolist()],
+                list(file_name_map),
+            )
+            self.assertEqual(
+                open_zipfile.getinfo("zip_folder/main.c").compress_type,
+                zipfile.ZIP_DEFLATED,
+            )
+            self.assertEqual(
+                open_zipfile.getinfo("zip_folder/image.png").compress_type,
+                zipfile.ZIP_STORED,
+            )
+            self.assertEqual(open_zipfile.read("zip_folder/image.png"), b"png" * 100)
+
+    def test_create_zip_from_file_map_workers(self):
+        "the zip is the same no matter how many files are compressed at once"
+        file_name_map = {}
+        for index in range(10):
+            file_path = os.path.join(self.temp_dir, "file_%s.txt" % index)
+            with open(file_path, "wb") as open_file:
+                open_file.write(b"file %s\n" % str(index).encode() * 1000)
+            file_name_map["zip_folder/file_%s.txt" % index] = file_path
+        zip_contents = []
+        for max_workers in [1, 4]:
+            zip_path = os.path.join(self.temp_dir, "test_%s.zip" % max_workers)
+            transform.create_zip_from_file_map(
+                zip_path, file_name_map, max_workers=max_workers
+            )
+            with open(zip_path, "rb") as open_file:
+                zip_contents.append(open_file.read())
+        self.assertEqual(zip_contents[0], zip_contents[1])
+        with zipfile.ZipFile(zip_path, "r") as open_zipfile:
+            self.assertIsNone(open_zipfile.testzip())
+            self.assertEqual(len(open_zipfile.infolist()), 10)
+
+
+class TestZipCompressType(unittest.TestCase):
+    def test_zip_compress_type(self):
+        passes = [
+            ("folder/Video 1.MP4", zipfile.ZIP_STORED),
+            ("folder/Figure 1.png", zipfile.ZIP_STORED),
+            ("folder/code.zip", zipfile.ZIP_STORED),
+            ("folder/article.xml", zipfile.ZIP_DEFLATED),
+            ("folder/Figure 1.tif", zipfile.ZIP_DEFLATED),
+            ("folder/no_extension", zipfile.ZIP_DEFLATED),
+        ]
+        for file_name, expected in passes:
+            self.assertEqual(transform.zip_compress_type(file_name), expected)
@@ -65,6 +65,43 @@ class TestReplaceControlCharacterEntities(unittest.TestCase):
         self.assertEqual(expected, utils.replace_control_character_entities(string))
 
 
+class TestSanitizeXmlString(unittest.TestCase):
+    "tests for utils.sanitize_xml_string()"
+
+    def test_sanitize_xml_string_empty(self):
+        string, result = utils.sanitize_xml_string("")
+        self.assertEqual(string, "")
+        self.assertFalse(result.changed)
+
+    def test_sanitize_xml_string_unchanged(self):
+        xml_string = "<article>&amp;&lt;&gt;&#8212;&undefined;\t\n</article>"
+        string, result = utils.sanitize_xml_string(xml_string)
+        self.assertEqual(string, xml_string)
+        self.assertFalse(result.changed)
+
+    def test_sanitize_xml_string(self):
+        xml_string = "<title>&mdash;To &#x001D;nd %s odd &#x01;&beta;</title>" % chr(29)
+        expected = "<title>\u2014To %snd %s odd %s\u03b2</title>" % (
+            (utils.CONTROL_CHARACTER_ENTITY_REPLACEMENT,) * 3
+        )
+        string, result = utils.sanitize_xml_string(xml_string)
+        self.assertEqual(string, expected)
+        self.assertTrue(result.changed)
+        self.assertEqual(result.entities, ["&mdash;", "&beta;"])
+        self.assertEqual(result.control_character_entities, ["&#x001D;", "&#x01;"])
+        self.assertEqual(result.control_characters, [chr(29)])
+        self.assertEqual(
+            str(result),
+            "SanitizeResult(['&mdash;', '&beta;'], ['&#x001D;', '&#x01;'], [29])",
+        )
+
+    def test_control_character_in_entity(self):
+        "control character inside an unknown entity is replaced"
+        string, result = utils.sanitize_xml_string("&%s;" % chr(1))
+        self.assertEqual(string, "&%s;" % utils.CONTROL_CHARACTER_ENTITY_REPLACEMENT)
+        self.assertEqual(result.control_characters, [chr(1)])
+
+
 class TestXlinkHref(unittest.TestCase):
     def test_xlink_href(self):
         image_href = "image.png"
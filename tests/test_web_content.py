@@ -0,0 +1,234 @@
+import os
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from mock import patch
+import requests
+from elifecleaner import web_content
+from tests.helpers import delete_files_in_folder
+
+ETAG = '"v1"'
+
+LAST_MODIFIED = "Wed, 01 May 2024 00:00:00 GMT"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    "stand-in web server, the path sets the response"
+
+    # requests received by path, and the most requests at the same time
+    counts = {}
+    not_modified = {}
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            StandInHandler.counts[self.path] = (
+                StandInHandler.counts.get(self.path, 0) + 1
+            )
+            StandInHandler.active += 1
+            StandInHandler.max_active = max(
+                StandInHandler.max_active, StandInHandler.active
+            )
+            count = StandInHandler.counts[self.path]
+        try:
+            if self.path.startswith("/slow"):
+                time.sleep(0.1)
+            if self.path == "/missing":
+                self.send_response(404)
+                self.end_headers()
+            elif self.path == "/etag" and self.headers.get("If-None-Match") == ETAG:
+                self.send_not_modified()
+            elif self.path == "/last-modified" and self.headers.get(
+                "If-Modified-Since"
+            ):
+                self.send_not_modified()
+            elif self.path == "/flaky" and count == 1:
+                self.send_response(503)
+                self.end_headers()
+            else:
+                content = ("<p>%s</p>" % self.path).encode("utf-8")
+                self.send_response(200)
+                if self.path == "/etag":
+                    self.send_header("ETag", ETAG)
+                if self.path == "/last-modified":
+                    self.send_header("Last-Modified", LAST_MODIFIED)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+        finally:
+            with self.lock:
+                StandInHandler.active -= 1
+
+    def send_not_modified(self):
+        with self.lock:
+            StandInHandler.not_modified[self.path] = (
+                StandInHandler.not_modified.get(self.path, 0) + 1
+            )
+        self.send_response(304)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServerTestCase(unittest.TestCase):
+    "start a local web server for the tests"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        cls.server.daemon_threads = True
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = "http://127.0.0.1:%s" % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StandInHandler.counts = {}
+        StandInHandler.not_modified = {}
+        StandInHandler.max_active = 0
+        self.patcher = patch.object(web_content, "WEB_CONTENT_RETRY_DELAY", 0.01)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def url(self, path):
+        return "%s%s" % (self.base_url, path)
+
+
+class TestFetchWebContent(StandInServerTestCase):
+    "tests for web_content.fetch_web_content() using a local web server"
+
+    def test_docmap_order(self):
+        "content is returned in the order of the URLs and each URL is fetched once"
+        paths = ["/slow/1", "/2", "/slow/3", "/2"]
+        result = web_content.fetch_web_content([self.url(path) for path in paths])
+        self.assertEqual(
+            result,
+            [b"<p>/slow/1</p>", b"<p>/2</p>", b"<p>/slow/3</p>", b"<p>/2</p>"],
+        )
+        self.assertEqual(StandInHandler.counts.get("/2"), 1)
+
+    def test_host_limit(self):
+        "no more than host_limit requests to the host at the same time"
+        urls = [self.url("/slow/%s" % index) for index in range(6)]
+        result = web_content.fetch_web_content(urls, max_workers=6, host_limit=2)
+        self.assertEqual(len([content for content in result if content]), 6)
+        self.assertEqual(StandInHandler.max_active, 2)
+
+    def test_retry(self):
+        "a 503 response is tried again"
+        result = web_content.fetch_web_content([self.url("/flaky")])
+        self.assertEqual(result, [b"<p>/flaky</p>"])
+        self.assertEqual(StandInHandler.counts.get("/flaky"), 2)
+
+    def test_missing(self):
+        "a 404 response is not tried again and has no content"
+        result = web_content.fetch_web_content([self.url("/missing")])
+        self.assertEqual(result, [None])
+        self.assertEqual(StandInHandler.counts.get("/missing"), 1)
+
+    def test_timeout_budget(self):
+        "requests are not made after the timeout budget is used"
+        urls = [self.url("/slow/%s" % index) for index in range(4)]
+        with self.assertRaises(requests.exceptions.Timeout):
+            web_content.fetch_web_content(
+                urls, max_workers=1, retries=0, timeout_budget=0.15
+            )
+        self.assertTrue(len(StandInHandler.counts) < 4)
+
+    def test_populate_docmap_content(self):
+        "html is added to the content items which have a web-content URL"
+        content_json = [
+            {"type": "evaluation-summary", "web-content": self.url("/1")},
+            {"type": "review-article", "web-content": None},
+            {"type": "reply", "web-content": self.url("/3")},
+        ]
+        result = web_content.populate_docmap_content(content_json, "test-agent")
+        self.assertEqual(
+            [content_item.get("html") for content_item in result],
+            [b"<p>/1</p>", None, b"<p>/3</p>"],
+        )
+        self.assertTrue("html" not in result[1])
+
+
+class TestWebContentCache(StandInServerTestCase):
+    "tests for caching web content on disk"
+
+    def setUp(self):
+        super().setUp()
+        self.temp_dir = "tests/tmp"
+        self.original_cache_dir = web_content.WEB_CONTENT_CACHE_DIR
+        web_content.WEB_CONTENT_CACHE_DIR = os.path.join(self.temp_dir, "web_cache")
+
+    def tearDown(self):
+        super().tearDown()
+        web_content.WEB_CONTENT_CACHE_DIR = self.original_cache_dir
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    def test_max_age(self):
+        "cached content newer than max_age is used without a request"
+        urls = [self.url("/1")]
+        self.assertEqual(web_content.fetch_web_content(urls), [b"<p>/1</p>"])
+        self.assertEqual(web_content.fetch_web_content(urls), [b"<p>/1</p>"])
+        self.assertEqual(StandInHandler.counts.get("/1"), 1)
+
+    def test_etag(self):
+        "cached content is revalidated using the ETag"
+        urls = [self.url("/etag")]
+        self.assertEqual(web_content.fetch_web_content(urls), [b"<p>/etag</p>"])
+        result = web_content.fetch_web_content(urls, max_age=0)
+        self.assertEqual(result, [b"<p>/etag</p>"])
+        self.assertEqual(StandInHandler.counts.get("/etag"), 2)
+        self.assertEqual(StandInHandler.not_modified.get("/etag"), 1)
+
+    def test_last_modified(self):
+        "cached content is revalidated using the Last-Modified date"
+        urls = [self.url("/last-modified")]
+        web_content.fetch_web_content(urls)
+        result = web_content.fetch_web_content(urls, max_age=0)
+        self.assertEqual(result, [b"<p>/last-modified</p>"])
+        self.assertEqual(StandInHandler.not_modified.get("/last-modified"), 1)
+
+    def test_not_revalidated_without_validators(self):
+        "content with no ETag or Last-Modified is downloaded again"
+        urls = [self.url("/1")]
+        web_content.fetch_web_content(urls)
+        web_content.fetch_web_content(urls, max_age=0)
+        self.assertEqual(StandInHandler.counts.get("/1"), 2)
+        self.assertEqual(StandInHandler.not_modified.get("/1"), None)
+
+    def test_offline(self):
+        "in offline mode only cached content is used"
+        web_content.fetch_web_content([self.url("/1")])
+        result = web_content.fetch_web_content(
+            [self.url("/1"), self.url("/2")], max_age=0, offline=True
+        )
+        self.assertEqual(result, [b"<p>/1</p>", None])
+        self.assertEqual(StandInHandler.counts.get("/1"), 1)
+        self.assertEqual(StandInHandler.counts.get("/2"), None)
+
+    def test_shared_cache(self):
+        "fetchers using the same cache settings share one DiskCache"
+        cache = web_content.web_content_cache()
+        self.assertEqual(web_content.WebContentFetcher().cache, cache)
+        self.assertEqual(web_content.WebContentFetcher().cache, cache)
+        with patch.object(web_content, "WEB_CONTENT_CACHE_MAX_SIZE", 400):
+            self.assertNotEqual(web_content.web_content_cache(), cache)
+
+    @patch.object(web_content, "WEB_CONTENT_CACHE_MAX_SIZE", 400)
+    def test_evict(self):
+        "the least recently used content is deleted when the cache is too large"
+        for index in range(4):
+            web_content.fetch_web_content([self.url("/%s" % index)])
+        cache = web_content.web_content_cache()
+        self.assertTrue(cache.size() <= 400)
+        self.assertTrue(0 < len(cache.entries()) < 4)
@@ -1,6 +1,10 @@
+import os
 import unittest
+import zipfile
+import zlib
 from collections import OrderedDict
-from elifecleaner import zip_lib
+from mock import patch
+from elifecleaner import LOGGER, configure_logging, zip_lib
 from tests.helpers import delete_files_in_folder, read_fixture
 
 
@@ -16,3 +20,239 @@ class TestZipLib(unittest.TestCase):
         asset_file_name_map = zip_lib.unzip_zip(zip_file, self.temp_dir)
         expected = read_fixture("asset_file_name_map_45644.py")
         self.assertEqual(asset_file_name_map, expected)
+
+
+class TestLazyZipMap(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+        self.zip_file = "tests/test_data/08-11-2020-FA-eLife-64719.zip"
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    def test_lazy_zip_map(self):
+        xml_file_name = "08-11-2020-FA-eLife-64719/08-11-2020-FA-eLife-64719.xml"
+        xml_file_path = (
+            "tests/tmp/08-11-2020-FA-eLife-64719/08-11-2020-FA-eLife-64719.xml"
+        )
+        with zip_lib.LazyZipMap(self.zip_file, self.temp_dir) as asset_file_name_map:
+            self.assertEqual(len(asset_file_name_map), 5)
+            self.assertTrue(xml_file_name in asset_file_name_map)
+            self.assertEqual(
+                list(asset_file_name_map),
+                list(zip_lib.unzip_zip(self.zip_file, "tests/tmp/unzipped")),
+            )
+            # nothing is extracted by listing the files
+            self.assertFalse(os.path.exists(xml_file_path))
+            self.assertEqual(
+                asset_file_name_map.file_path(xml_file_name), xml_file_path
+            )
+            self.assertEqual(asset_file_name_map[xml_file_name], xml_file_path)
+            self.assertTrue(os.path.exists(xml_file_path))
+            self.assertEqual(
+                os.listdir(os.path.join(self.temp_dir, "08-11-2020-FA-eLife-64719")),
+                ["08-11-2020-FA-eLife-64719.xml"],
+            )
+
+    def test_open(self):
+        file_name = "08-11-2020-FA-eLife-64719/eLife64719_template5.docx"
+        asset_file_name_map = zip_lib.LazyZipMap(self.zip_file, self.temp_dir)
+        with asset_file_name_map.open(file_name) as open_file:
+            self.assertEqual(len(open_file.read()), 37148)
+        asset_file_name_map.close()
+        self.assertFalse(
+            os.path.exists(os.path.join(self.temp_dir, "08-11-2020-FA-eLife-64719"))
+        )
+
+    def test_asset_index(self):
+        "index a lazy map without extracting files"
+        with zip_lib.LazyZipMap(self.zip_file, self.temp_dir) as asset_file_name_map:
+            asset_index = zip_lib.AssetIndex(asset_file_name_map)
+            self.assertEqual(
+                asset_index.find_all("figure1_classB.png"),
+                ["08-11-2020-FA-eLife-64719/eLife64719_figure1_classB.png"],
+            )
+            self.assertEqual(os.listdir(self.temp_dir), [".keepme"])
+
+
+ASSET_FILE_NAME_MAP_EXAMPLE = OrderedDict(
+    [
+        ("folder/folder.xml", "tmp/folder/folder.xml"),
+        ("folder/Supplementary Figure 1.pdf", "tmp/folder/Supplementary Figure 1.pdf"),
+        ("folder/Figure 1.pdf", "tmp/folder/Figure 1.pdf"),
+        ("folder/Figure 2.pdf", "tmp/folder/Figure 2.pdf"),
+    ]
+)
+
+
+class TestAssetIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+        self.log_file = os.path.join(self.temp_dir, "test.log")
+        self.log_handler = configure_logging(self.log_file)
+
+    def tearDown(self):
+        LOGGER.removeHandler(self.log_handler)
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    def test_asset_index(self):
+        asset_index = zip_lib.AssetIndex(ASSET_FILE_NAME_MAP_EXAMPLE)
+        self.assertEqual(str(asset_index), "AssetIndex(4 files)")
+        self.assertEqual(
+            asset_index.zip_file_names,
+            [
+                "folder.xml",
+                "Supplementary Figure 1.pdf",
+                "Figure 1.pdf",
+                "Figure 2.pdf",
+            ],
+        )
+        self.assertEqual(
+            asset_index.find("Figure 2.pdf"),
+            ("folder/Figure 2.pdf", "tmp/folder/Figure 2.pdf"),
+        )
+        self.assertEqual(asset_index.find("Figure 3.pdf"), (None, None))
+        self.assertEqual(
+            asset_index.find("folder/Figure 2.pdf"),
+            ("folder/Figure 2.pdf", "tmp/folder/Figure 2.pdf"),
+        )
+
+    def test_find_ambiguous(self):
+        "first match is used, the same as an endswith scan, and a warning is logged"
+        asset_index = zip_lib.AssetIndex(ASSET_FILE_NAME_MAP_EXAMPLE)
+        expected = [
+            (asset_file_name, file_path)
+            for asset_file_name, file_path in ASSET_FILE_NAME_MAP_EXAMPLE.items()
+            if file_path.endswith("Figure 1.pdf")
+        ][0]
+        self.assertEqual(asset_index.find("Figure 1.pdf", "test.zip"), expected)
+        with open(self.log_file, "r") as open_file:
+            log_lines = open_file.readlines()
+        self.assertEqual(
+            log_lines,
+            [
+                (
+                    "WARNING elifecleaner:zip_lib:find: test.zip file name "
+                    "Figure 1.pdf matches more than one file, using "
+                    "folder/Supplementary Figure 1.pdf, other matches: "
+                    "['folder/Figure 1.pdf']\n"
+                )
+            ],
+        )
+
+    def test_asset_index_helper(self):
+        asset_index = zip_lib.AssetIndex(ASSET_FILE_NAME_MAP_EXAMPLE)
+        self.assertIs(zip_lib.asset_index(None, asset_index), asset_index)
+        self.assertEqual(
+            str(zip_lib.asset_index(ASSET_FILE_NAME_MAP_EXAMPLE)), "AssetIndex(4 files)"
+        )
+
+
+class TestCompressFile(unittest.TestCase):
+    def test_compress_file(self):
+        file_path = "tests/test_data/main.c"
+        with open(file_path, "rb") as open_file:
+            content = open_file.read()
+        zip_info, compressed_file = zip_lib.compress_file(file_path, "folder/main.c")
+        with compressed_file:
+            compressed_data = compressed_file.read()
+        self.assertEqual(zip_info.filename, "folder/main.c")
+        self.assertEqual(zip_info.compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(zip_info.file_size, len(content))
+        self.assertEqual(zip_info.compress_size, len(compressed_data))
+        self.assertEqual(zip_info.CRC, zlib.crc32(content))
+        self.assertEqual(zlib.decompress(compressed_data, -15), content)
+
+    def test_compress_file_stored(self):
+        file_path = "tests/test_data/main.c"
+        zip_info, compressed_file = zip_lib.compress_file(
+            file_path, "folder/main.c", zipfile.ZIP_STORED
+        )
+        with compressed_file:
+            data = compressed_file.read()
+        with open(file_path, "rb") as open_file:
+            self.assertEqual(data, open_file.read())
+        self.assertEqual(zip_info.compress_size, zip_info.file_size)
+
+
+class TestWriteRawMember(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = "tests/tmp"
+        self.zip_file = os.path.join(self.temp_dir, "source.zip")
+        self.new_zip_file = os.path.join(self.temp_dir, "new.zip")
+        with open("tests/test_data/main.c", "rb") as open_file:
+            self.content = open_file.read()
+        with zipfile.ZipFile(self.zip_file, "w") as open_zip:
+            open_zip.writestr("deflated.c", self.content, zipfile.ZIP_DEFLATED)
+            open_zip.writestr("stored.c", self.content, zipfile.ZIP_STORED)
+
+    def tearDown(self):
+        delete_files_in_folder(self.temp_dir, filter_out=[".keepme"])
+
+    def copy_members(self):
+        "copy the members of the source zip and compress main.c into the new zip"
+        with zipfile.ZipFile(self.zip_file) as source_zip, open(
+            self.zip_file, "rb"
+        ) as open_file, zipfile.ZipFile(self.new_zip_file, "w") as open_zip:
+            for zip_info in source_zip.infolist():
+                zip_lib.copy_raw_member(open_file, zip_info, open_zip)
+            zip_info, compressed_file = zip_lib.compress_file(
+                "tests/test_data/main.c", "compressed.c"
+            )
+            with compressed_file:
+                compressed_file.seek(0)
+                zip_lib.write_raw_member(open_zip, zip_info, compressed_file)
+        with zipfile.ZipFile(self.new_zip_file) as open_zip:
+            self.assertIsNone(open_zip.testzip())
+            return [
+                (zip_info.filename, zip_info.compress_type, open_zip.read(zip_info))
+                for zip_info in open_zip.infolist()
+            ]
+
+    def test_write_raw_member(self):
+        self.assertEqual(
+            self.copy_members(),
+            [
+                ("deflated.c", zipfile.ZIP_DEFLATED, self.content),
+                ("stored.c", zipfile.ZIP_STORED, self.content),
+                ("compressed.c", zipfile.ZIP_DEFLATED, self.content),
+            ],
+        )
+
+    def test_raw_write_supported(self):
+        with zipfile.ZipFile(self.new_zip_file, "w") as open_zip:
+            self.assertTrue(zip_lib.raw_write_supported(open_zip))
+
+    @patch.object(zip_lib, "ZIPFILE_RAW_WRITE_ATTRIBUTES", ("_missing_attribute",))
+    def test_write_raw_member_fallback(self):
+        "members are written using ZipFile.open() if the ZipFile internals are missing"
+        with zipfile.ZipFile(self.new_zip_file, "w") as open_zip:
+            self.assertFalse(zip_lib.raw_write_supported(open_zip))
+        with patch.object(
+            zip_lib.shutil, "copyfileobj", wraps=zip_lib.shutil.copyfileobj
+        ) as mock_copyfileobj:
+            result = self.copy_members()
+        self.assertEqual(mock_copyfileobj.call_count, 3)
+        self.assertEqual(
+            result,
+            [
+                ("deflated.c", zipfile.ZIP_DEFLATED, self.content),
+                ("stored.c", zipfile.ZIP_STORED, self.content),
+                ("compressed.c", zipfile.ZIP_DEFLATED, self.content),
+            ],
+        )
+
+    @patch.object(zip_lib, "ZIPFILE_RAW_WRITE_ATTRIBUTES", ("_missing_attribute",))
+    def test_write_raw_member_fallback_lzma(self):
+        "any compression type supported by zipfile is copied by the fallback"
+        with zipfile.ZipFile(self.zip_file, "w") as open_zip:
+            open_zip.writestr("lzma.c", self.content, zipfile.ZIP_LZMA)
+            open_zip.writestr("bzip2.c", self.content, zipfile.ZIP_BZIP2)
+        self.assertEqual(
+            self.copy_members(),
+            [
+                ("lzma.c", zipfile.ZIP_LZMA, self.content),
+                ("bzip2.c", zipfile.ZIP_BZIP2, self.content),
+                ("compressed.c", zipfile.ZIP_DEFLATED, self.content),
+            ],
+        )